@@ -49,6 +49,28 @@ class Config(BaseSettings):
 
     GEOJSON_DIR: str = os.path.join('app/geojson_files')
 
+    # Layers
+    LAYER_CACHE_DIR: Optional[str] = None
+    TILE_CACHE_SIZE: int = 4096
+    # каталог PNG-тайлов; по умолчанию - tiles в каталоге кэша слоёв
+    RASTER_TILE_CACHE_DIR: Optional[str] = None
+    GEOJSON_STREAM_CHUNK_SIZE: int = 5000
+    # суммарный размер готовых ответов /visualize/* в памяти, байты (вместе со сжатыми вариантами)
+    RESPONSE_CACHE_BYTES: int = 256 * 1024 * 1024
+    LOOKUP_MAX_POINTS: int = 50000
+    LOOKUP_MAX_KEYS: int = 10000
+    OVERLAP_BUILD: bool = True
+    # процессы для тяжёлой геообработки: None - по числу ядер, 0 - без пула
+    GEO_WORKERS: Optional[int] = None
+    LAYER_WARMUP: bool = True
+    LAYER_WARMUP_WORKERS: int = 4
+    # период проверки исходников загруженных слоёв, секунды; 0 - без перезагрузки на лету
+    LAYER_WATCH_INTERVAL: float = 30
+    # слои только из собранного compile_layers.py кэша, без разбора shapefile при старте
+    LAYER_COMPILED_ONLY: bool = False
+    # сколько последних версий каждого слоя хранится для /layers/delta
+    LAYER_HISTORY_SIZE: int = 20
+
     SQLALCHEMY_DATABASE_URI: Union[Optional[AsyncPostgresDsn], Optional[str]] = None
 
     @field_validator("SQLALCHEMY_DATABASE_URI", mode="before")
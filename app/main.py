@@ -18,10 +18,15 @@ from app.routers.schedule import router as schedule_router
 from app.routers.manuals import router as manuals_router
 from app.routers.ai import router as ai_router
 from app.routers.solution import router as solution_router
-from app.routers.main_func import router as main_func_router
+from app.routers.main_func import router as main_func_router, load_shapefiles, layer_watcher
 from app.routers.shape_func import router as shape_func_router
 from app.routers.reports import router as reports_router
 from app.routers.calc import router as calc_router
+from app.routers.tiles import router as tiles_router
+from app.routers.lookup import router as lookup_router
+from app.routers.overlaps import router as overlaps_router, overlap_builder
+from app.routers.aggregation import router as aggregation_router
+from app.services.workers import geo_pool
 
 tags_metadata = [
     {"name": "Авторизация", "description": "Авторизация"},
@@ -39,6 +44,10 @@ tags_metadata = [
     {"name": "Работа с контурами решения", "description": "Работа с контурами решения"},
     {"name": "Отчёты", "description": "Работа с отчётами"},
     {"name": "Расчёт аренды", "description": "Решение задачи расчёта аренды"},
+    {"name": "Тайлы", "description": "Тайлы слоёв для картографического клиента"},
+    {"name": "Объекты в точке", "description": "Поиск объектов слоёв по координатам"},
+    {"name": "Пересечения участков", "description": "Предрасчитанные пересечения участков с зонами и территориями"},
+    {"name": "Агрегаты", "description": "Групповые показатели по атрибутам слоёв"},
     ]
 
 app = FastAPI(
@@ -197,6 +206,27 @@ app.include_router(main_func_router, tags=["Геообработка"])
 app.include_router(shape_func_router, tags=["Работа с контурами решения"])
 app.include_router(reports_router, tags=["Отчёты"])
 app.include_router(calc_router, tags=["Расчёт аренды"])
+app.include_router(tiles_router, tags=["Тайлы"])
+app.include_router(lookup_router, tags=["Объекты в точке"])
+app.include_router(overlaps_router, tags=["Пересечения участков"])
+app.include_router(aggregation_router, tags=["Агрегаты"])
+
+
+@app.on_event("startup")
+def warm_up_layers():
+    # слои грузятся в фоне, /ready отвечает 503, пока прогрев не закончится
+    if config.LAYER_WARMUP:
+        load_shapefiles()
+    if config.OVERLAP_BUILD:
+        # таблицы пересечений строятся в фоне после прогрева слоёв
+        overlap_builder.start()
+    layer_watcher.start()
+
+
+@app.on_event("shutdown")
+def stop_geo_pool():
+    layer_watcher.stop()
+    geo_pool.shutdown()
 
 
 print("app.main.py: app created.")
@@ -6,4 +6,7 @@ from .schedule import *
 from .geocode import *
 from .utils import *
 from .cadastral_manual import *
-from .shape import *
\ No newline at end of file
+from .shape import *
+from .lookup import *
+from .overlaps import *
+from .aggregation import *
\ No newline at end of file
@@ -0,0 +1,5 @@
+from enum import Enum
+
+class AggregateBy(str, Enum):
+    district = "district"
+    region = "region"
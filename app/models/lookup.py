@@ -0,0 +1,18 @@
+from enum import Enum
+from pydantic import BaseModel, Field
+from typing import List, Optional, Union
+
+class LookupRequest(BaseModel):
+    points: List[List[float]] = Field(..., description="Точки в WGS-84: [[lon, lat], ...]")
+    layers: Optional[List[str]] = Field(None, description="Слои: имена (ZU) или файлы (ЗУ.shp), по умолчанию - все")
+
+class KeyLookupMode(str, Enum):
+    exact = "exact"
+    prefix = "prefix"
+
+class KeyLookupRequest(BaseModel):
+    layer: str = Field(..., description="Слой: ZU, OKS, MKD или Cadastral")
+    column: str = Field(..., description="Ключевая колонка: cadastra2, cadastra3, unom или cadastra1")
+    keys: List[Union[str, int]] = Field(..., description="Значения ключа (номера или их префиксы)")
+    mode: KeyLookupMode = Field(KeyLookupMode.exact, description="exact - точное совпадение, prefix - по началу номера")
+    limit: Optional[int] = Field(None, ge=1, description="Максимум объектов на один ключ")
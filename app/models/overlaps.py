@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class OverlapRequest(BaseModel):
+    parcels: List[str] = Field([], description="Кадастровые номера участков ЗУ (cadastra2)")
+    ids: List[int] = Field([], description="Позиции участков в слое ЗУ")
+    layers: Optional[List[str]] = Field(None, description="Слои пересечений, по умолчанию - все")
@@ -0,0 +1,78 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response
+from starlette import status
+
+from app.models.aggregation import AggregateBy
+from app.config import config
+from app.routers.main_func import LAYER_SOURCES, LayerName, get_layer, resolve_layer
+from app.services.aggregation import aggregate, metric_areas, zone_positions
+from app.services.geojson import dumps_compact
+
+router = APIRouter(prefix=config.BACKEND_PREFIX)
+
+# слои зон для группировки и колонка с именем зоны
+AGGREGATE_ZONES = {
+    AggregateBy.district: LayerName.DISTRICTS,
+    AggregateBy.region: LayerName.REGION,
+}
+
+# мера по умолчанию - площадь объекта в м²; имя с подчёркиванием не совпадает с колонками слоёв
+# (имена полей dbf начинаются с буквы), поэтому колонку area тоже можно агрегировать
+AREA_MEASURE = "_area"
+
+
+def aggregate_layer(layer_name: str, column: str, by: Optional[AggregateBy], measure: str) -> bytes:
+    layer = resolve_layer(layer_name)
+    entry = get_layer(layer)
+    for name in (column,) + (() if measure == AREA_MEASURE else (measure,)):
+        if name not in entry.columns:
+            raise HTTPException(status_code=400, detail=f"Column '{name}' not found in the data")
+
+    zones = None
+    if by is not None:
+        zone_layer = AGGREGATE_ZONES[by]
+        zones = get_layer(zone_layer)
+
+    # ключ включает версию слоя зон: после его перезагрузки агрегаты пересчитываются
+    key = ("aggregate", column, measure, by, zones.file if zones else None, zones.version if zones else None)
+
+    def build() -> bytes:
+        if measure == AREA_MEASURE:
+            values = metric_areas(entry)
+        else:
+            values = entry.attributes[measure]
+            if not pd.api.types.is_numeric_dtype(values):
+                # числа в dbf бывают строками с десятичной запятой: "1,19"
+                values = values.astype(str).str.replace(",", ".", regex=False)
+            values = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+        grouping = None
+        if zones is not None:
+            names = zones.attributes[LAYER_SOURCES[AGGREGATE_ZONES[by]][2]].reset_index(drop=True)
+            grouping = (by.value, zone_positions(entry, zones), names)
+        result = aggregate(entry, column, values, grouping)
+        result = {"layer": layer.name, "column": column, "by": by.value if by else None, "measure": measure, **result}
+        return dumps_compact(result).encode("utf-8")
+
+    return entry.derived(key, build)
+
+
+@router.get(
+    "/aggregate",
+    response_description="Число объектов, сумма, среднее и перцентили меры по группам",
+    status_code=status.HTTP_200_OK,
+    description="Агрегаты слоя по значениям колонки и, при необходимости, по округам или районам. "
+                "Мера - площадь объекта в м² (_area) или числовая колонка слоя. "
+                "Результат считается один раз на версию слоя",
+    summary="Агрегаты по слою",
+)
+def get_aggregate(
+    layer: str = Query(..., description="Слой: имя (ZU) или файл (ЗУ.shp)"),
+    column: str = Query(..., description="Колонка для группировки, например ownershi8"),
+    by: Optional[AggregateBy] = Query(None, description="Дополнительная группировка: district - по округам, region - по районам"),
+    measure: str = Query(AREA_MEASURE, description="_area - площадь объекта в м², иначе имя числовой колонки, например shape_area или area"),
+):
+    return Response(content=aggregate_layer(layer, column, by, measure), media_type="application/json")
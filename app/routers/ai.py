@@ -130,11 +130,14 @@ from fastapi import APIRouter, HTTPException, Depends, Path
 from pydantic import BaseModel
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from langchain.schema import HumanMessage, SystemMessage
-from langchain.chat_models.gigachat import GigaChat
+from functools import lru_cache
 
-# Initialize GigaChat instance
-giga = GigaChat(credentials='ODA1Y2Q0NWUtNmNhYi00OWRkLWJhNTYtN2JmNDk3YWJjOWVmOmM3ZWRlZDEzLTk4NTgtNDI4YS1iMzdlLWViODM3NGQwODJlNg==', model='GigaChat', verify_ssl_certs=False, scope="GIGACHAT_API_PERS")
+# GigaChat client is created on first use, so langchain and gigachat are not imported at startup
+@lru_cache(maxsize=1)
+def get_giga():
+    from langchain.chat_models.gigachat import GigaChat
+
+    return GigaChat(credentials='ODA1Y2Q0NWUtNmNhYi00OWRkLWJhNTYtN2JmNDk3YWJjOWVmOmM3ZWRlZDEzLTk4NTgtNDI4YS1iMzdlLWViODM3NGQwODJlNg==', model='GigaChat', verify_ssl_certs=False, scope="GIGACHAT_API_PERS")
 
 # Define request and response models
 class MessageRequest(BaseModel):
@@ -150,9 +153,11 @@ async def chat_with_gigachat(message: MessageRequest):
 
 async def chat_with_gigachat_promt(message: str) -> str:
     try:
+        from langchain.schema import HumanMessage
+
         # Prepare message for GigaChat
         human_message = HumanMessage(content=message)
-        response = giga([human_message])
+        response = get_giga()([human_message])
         # Return the assistant's response
         return response.content
 
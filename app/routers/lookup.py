@@ -0,0 +1,220 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import shapely
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response
+from starlette import status
+
+from app.config import config
+from app.models.lookup import KeyLookupMode, KeyLookupRequest, LookupRequest
+from app.routers.main_func import ADDRESS_LAYERS, LAYER_KEYS, LAYER_SOURCES, LayerName, get_layer, resolve_layer
+from app.services.geojson import (COLLECTION_SUFFIX, GeoJSONResponse, collection_prefix, dump_feature_collection,
+                                  dumps_value, encode_features, encode_records)
+from app.services.layers import GeometryView
+
+router = APIRouter(prefix=config.BACKEND_PREFIX)
+
+
+def resolve_layers(names: Optional[List[str]]) -> List[LayerName]:
+    if not names:
+        return list(LAYER_SOURCES)
+    return [resolve_layer(name) for name in names]
+
+
+def layer_matches(layer: LayerName, points: np.ndarray) -> List[str]:
+    """
+    Для каждой точки - JSON-массив атрибутов объектов слоя, содержащих её.
+
+    Атрибуты каждого найденного объекта кодируются один раз, сколько бы точек в него ни попало.
+    """
+    entry = get_layer(layer)
+    point_index, positions = entry.locate(points)
+
+    unique, inverse = np.unique(positions, return_inverse=True)
+    attributes = entry.attributes.iloc[unique]
+    columns = [("id", unique)] + [(col, attributes[col]) for col in entry.columns]
+    records = encode_records(columns, len(unique))[inverse]
+
+    # пары отсортированы по точке: границы групп находятся бинарным поиском
+    bounds = np.searchsorted(point_index, np.arange(len(points) + 1)).tolist()
+    return ["[" + ",".join(records[start:stop].tolist()) + "]" for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def lookup(coords: np.ndarray, layers: List[LayerName], skip_unavailable: bool) -> bytes:
+    points = shapely.points(coords)
+    matched = {}
+    unavailable = []
+    for layer in layers:
+        try:
+            matched[layer.name] = layer_matches(layer, points)
+        except HTTPException:
+            # слой по умолчанию может отсутствовать на диске - это не повод ронять весь ответ
+            if not skip_unavailable:
+                raise
+            unavailable.append(layer.name)
+
+    names = [dumps_value(name) + ":" for name in matched]
+    results = []
+    for i, (lon, lat) in enumerate(coords.tolist()):
+        found = ",".join(name + values[i] for name, values in zip(names, matched.values()))
+        results.append('{"lon":' + dumps_value(lon) + ',"lat":' + dumps_value(lat) + ',"layers":{' + found + '}}')
+    return ('{"points":[' + ",".join(results) + '],"unavailable":' + dumps_value(unavailable) + '}').encode("utf-8")
+
+
+def parse_points(points: List[List[float]]) -> np.ndarray:
+    if len(points) > config.LOOKUP_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {config.LOOKUP_MAX_POINTS} points per request")
+    if any(len(point) != 2 for point in points):
+        raise HTTPException(status_code=400, detail="Each point must be [lon, lat]")
+    coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not np.isfinite(coords).all():
+        raise HTTPException(status_code=400, detail="Point coordinates must be finite numbers")
+    return coords
+
+
+@router.get(
+    "/lookup",
+    response_description="Объекты слоёв, в которые попадает точка",
+    status_code=status.HTTP_200_OK,
+    description="Что находится в точке: атрибуты объектов каждого слоя, содержащих точку",
+    summary="Объекты в точке",
+)
+def lookup_point(
+    lon: float = Query(..., ge=-180, le=180, description="Долгота, WGS-84"),
+    lat: float = Query(..., ge=-90, le=90, description="Широта, WGS-84"),
+    layers: Optional[str] = Query(None, description="Слои через запятую, по умолчанию - все"),
+):
+    names = [name.strip() for name in layers.split(",") if name.strip()] if layers else None
+    body = lookup(np.array([[lon, lat]]), resolve_layers(names), skip_unavailable=names is None)
+    return Response(content=body, media_type="application/json")
+
+
+@router.post(
+    "/lookup",
+    response_description="Объекты слоёв для каждой точки пакета",
+    status_code=status.HTTP_200_OK,
+    description="Пакетный вариант /lookup: один запрос к пространственному индексу слоя на все точки",
+    summary="Объекты в точках (пакет)",
+)
+def lookup_points(request: LookupRequest):
+    coords = parse_points(request.points)
+    body = lookup(coords, resolve_layers(request.layers), skip_unavailable=not request.layers)
+    return Response(content=body, media_type="application/json")
+
+
+def lookup_keys(layer_name: str, column: str, keys: List, mode: KeyLookupMode, limit: Optional[int]) -> bytes:
+    layer = resolve_layer(layer_name)
+    if column not in LAYER_KEYS.get(layer, ()):
+        allowed = ", ".join(LAYER_KEYS.get(layer, ())) or "none"
+        raise HTTPException(status_code=400, detail=f"Column '{column}' is not indexed for {layer.name} (indexed: {allowed})")
+    if len(keys) > config.LOOKUP_MAX_KEYS:
+        raise HTTPException(status_code=400, detail=f"At most {config.LOOKUP_MAX_KEYS} keys per request")
+
+    entry = get_layer(layer)
+    if column not in entry.columns:
+        raise HTTPException(status_code=400, detail=f"Column '{column}' not found in the data")
+    positions, key_index = entry.key_index(column).lookup(keys, prefix=mode == KeyLookupMode.prefix, limit=limit)
+
+    # в каждом объекте - ключ запроса, по которому он найден; ненайденные ключи - отдельным списком
+    found = np.zeros(len(keys), dtype=bool)
+    found[key_index] = True
+    missing = [key for key, hit in zip(keys, found.tolist()) if not hit]
+    return dump_feature_collection(
+        entry.attributes.iloc[positions],
+        extra={'key': pd.Series(np.array(keys, dtype=object)[key_index])},
+        geometries=GeometryView(entry, positions),
+        fields=entry.columns,
+        members={'missing': missing},
+    )
+
+
+@router.get(
+    "/lookup/keys",
+    response_description="Объекты слоя с заданным ключом",
+    status_code=status.HTTP_200_OK,
+    description="Поиск объектов по кадастровому номеру или UNOM через хэш-индекс слоя",
+    summary="Поиск по ключу",
+)
+def lookup_key(
+    layer: str = Query(..., description="Слой: ZU, OKS, MKD или Cadastral"),
+    column: str = Query(..., description="Ключевая колонка: cadastra2, cadastra3, unom или cadastra1"),
+    key: str = Query(..., description="Значение ключа или его префикс"),
+    mode: KeyLookupMode = Query(KeyLookupMode.exact, description="exact - точное совпадение, prefix - по началу номера"),
+    limit: Optional[int] = Query(None, ge=1, description="Максимум объектов"),
+):
+    return GeoJSONResponse(content=lookup_keys(layer, column, [key], mode, limit))
+
+
+@router.post(
+    "/lookup/keys",
+    response_description="Объекты слоя для пакета ключей",
+    status_code=status.HTTP_200_OK,
+    description="Пакетный поиск объектов по кадастровым номерам или UNOM: O(1) на ключ при точном поиске",
+    summary="Поиск по ключам (пакет)",
+)
+def lookup_keys_batch(request: KeyLookupRequest):
+    return GeoJSONResponse(content=lookup_keys(request.layer, request.column, request.keys, request.mode, request.limit))
+
+
+def search_addresses(query: str, layers: List[LayerName], limit: int) -> bytes:
+    scored = []
+    for layer in layers:
+        column = ADDRESS_LAYERS.get(layer)
+        if column is None:
+            raise HTTPException(status_code=400, detail=f"Layer {layer.name} has no address index")
+        try:
+            entry = get_layer(layer)
+        except HTTPException:
+            # слоя может не быть на диске - ищем по остальным
+            continue
+        if column not in entry.columns:
+            continue
+
+        index = entry.address_index(column)
+        positions, scores = [], []
+        for address_id, score in index.search(query, limit):
+            found = index.positions(address_id)
+            positions.extend(found.tolist())
+            scores.extend([score] * len(found))
+        if not positions:
+            continue
+
+        positions = np.asarray(positions[:limit], dtype=np.int64)
+        scores = scores[:limit]
+        # объект отдаётся точкой-центроидом, исходные атрибуты - в properties
+        features = encode_features(
+            entry.attributes.iloc[positions],
+            extra={
+                'layer': pd.Series([layer.name] * len(positions)),
+                'id': pd.Series(positions),
+                'score': pd.Series(scores),
+            },
+            geometries=shapely.centroid(entry.geometries(positions)),
+            fields=entry.columns,
+        )
+        scored.extend(zip(scores, features.tolist()))
+
+    # сортировка устойчивая: при равной оценке сохраняется порядок слоёв и выдачи индекса
+    scored.sort(key=lambda item: -item[0])
+    features = [feature for _, feature in scored[:limit]]
+    return (collection_prefix() + ",".join(features) + COLLECTION_SUFFIX).encode("utf-8")
+
+
+@router.get(
+    "/search/address",
+    response_description="Объекты с подходящими адресами, точками-центроидами",
+    status_code=status.HTTP_200_OK,
+    description="Поиск объектов ЗУ, ОКС и МКД по адресу без внешнего геокодера: "
+                "все слова запроса должны найтись в адресе целиком или по началу",
+    summary="Поиск по адресу",
+)
+def search_address(
+    q: str = Query(..., min_length=1, description="Адрес или его часть"),
+    layers: Optional[str] = Query(None, description="Слои через запятую, по умолчанию - ZU, OKS и MKD"),
+    limit: int = Query(20, ge=1, le=1000, description="Максимум объектов в ответе"),
+):
+    names = [name.strip() for name in layers.split(",") if name.strip()] if layers else None
+    selected = [resolve_layer(name) for name in names] if names else list(ADDRESS_LAYERS)
+    return GeoJSONResponse(content=search_addresses(q, selected, limit))
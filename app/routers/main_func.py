@@ -1,27 +1,35 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import JSONResponse
-from pyproj import Proj, transform
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from app.config import config
 from app.database.connection import get_session
+from app.services.colors import TABLEAU_COLORS, ColorMap
+from app.services.geojson import GeoJSONResponse, dump_feature_collection, encode_records, iter_feature_collection
+from app.services.layer_cache import SOURCE_SUFFIXES, LayerDiskCache
+from app.services.layer_history import LayerHistory
+from app.services.layers import GeometryView, LayerStore, StaleLayerError, zoom_level
+from app.services.response_cache import ResponseCache, make_etag
+from app.services.topojson import Topology
+from app.services.warmup import LayerWarmup
+from app.services.watcher import LayerWatcher
+from app.services.workers import geo_pool
 
-from shapely.geometry import Point, Polygon, LineString, MultiPoint, MultiLineString, MultiPolygon
 
 from functools import lru_cache
 
 router = APIRouter(prefix=config.BACKEND_PREFIX)
 
+import json
 import os
 from fastapi import APIRouter, HTTPException
 from enum import Enum
-import geopandas as gpd
-import fiona
+import numpy as np
+import pandas as pd
 from pydantic import BaseModel
-from typing import List, Type
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
+from typing import List, Optional, Type
 
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any
@@ -206,6 +214,8 @@ class FeatureCollection(BaseModel):
 
 data_dir = '/app/app/shapefiles'
 output_dir = '/app/app/geojson_files'
+# подготовленные слои в колоночном формате, пересобираются при изменении shapefile
+cache_dir = config.LAYER_CACHE_DIR or os.path.join(os.path.dirname(data_dir), 'layer_cache')
 
 if not os.path.exists(output_dir):
     os.makedirs(output_dir)
@@ -254,6 +264,84 @@ class LayerFolder(str, Enum):
     Cadastral = "_14_Кадастровое деление"
     MKD = "_15_МКД"
 
+# папка, кодировка атрибутов и колонка для раскраски по умолчанию для каждого слоя
+LAYER_SOURCES = {
+    LayerName.ZU: (LayerFolder.ZU, 'UTF8', 'ownershi8'),
+    LayerName.OKS: (LayerFolder.OKS, 'UTF8', 'hasbti'),
+    LayerName.ZOUIT: (LayerFolder.ZOUIT, 'UTF8', 'VID_ZOUIT'),
+    LayerName.spritzones: (LayerFolder.spritzones, 'UTF8', 'LineCode'),
+    LayerName.YDC_ROADS: (LayerFolder.YDC_ROADS, 'cp1251', 'VID_ROAD'),
+    LayerName.renovation_sites: (LayerFolder.renovation_sites, 'UTF8', 'vysota'),
+    LayerName.PPZ_ZONES_NEW: (LayerFolder.PPZ_ZONES, 'UTF8', 'TYPE'),
+    LayerName.PPZ_ZONES_OLD: (LayerFolder.PPZ_ZONES, 'UTF8', 'TYPE'),
+    LayerName.PPZ_PODZONES_NEW: (LayerFolder.PPZ_PODZONES, 'UTF8', 'PLOTNOST'),
+    LayerName.PPZ_PODZONES_OLD: (LayerFolder.PPZ_PODZONES, 'UTF8', 'PLOTNOST'),
+    LayerName.KRT: (LayerFolder.KRT, 'UTF8', 'type_krt'),
+    LayerName.DISTRICTS: (LayerFolder.DISTRICTS, 'cp1251', 'NAME'),
+    LayerName.REGION: (LayerFolder.region, 'cp1251', 'NAME'),
+    LayerName.SURVEY: (LayerFolder.SURVEY, 'cp1251', 'KLASS'),
+    LayerName.OOZT: (LayerFolder.OOZT, 'UTF8', 'status'),
+    LayerName.PPT_ALL: (LayerFolder.PPT, 'cp1251', None),
+    LayerName.tpu_rv_metro_polygon: (LayerFolder.PPT, 'cp1251', None),
+    LayerName.PPT_UDS: (LayerFolder.PPT, 'cp1251', None),
+    LayerName.PP_GAZ: (LayerFolder.PPT, 'cp1251', None),
+    LayerName.PP_METRO_ALL: (LayerFolder.PPT, 'cp1251', None),
+    LayerName.kvartal_region: (LayerFolder.PPT, 'cp1251', None),
+    LayerName.Cadastral: (LayerFolder.Cadastral, 'cp1251', 'cadastra1'),
+    LayerName.MKD: (LayerFolder.MKD, 'UTF8', 'hasbti'),
+}
+
+# ключевые колонки слоёв: по ним при загрузке строятся хэш-индексы для поиска объектов
+LAYER_KEYS = {
+    LayerName.ZU: ('cadastra2',),
+    LayerName.OKS: ('cadastra3', 'unom'),
+    LayerName.MKD: ('cadastra3', 'unom'),
+    LayerName.Cadastral: ('cadastra1',),
+}
+
+# естественные ключи объектов для синхронизации изменений; у остальных слоёв - objectid, если он есть
+LAYER_IDS = {
+    LayerName.ZU: 'cadastra2',
+    LayerName.OKS: 'unom',
+    LayerName.MKD: 'unom',
+    LayerName.PPZ_ZONES_NEW: 'ZONE_NUM',
+    LayerName.PPZ_ZONES_OLD: 'ZONE_NUM',
+    LayerName.PPZ_PODZONES_NEW: 'PODZONE_NU',
+    LayerName.PPZ_PODZONES_OLD: 'PODZONE_NU',
+    LayerName.PPT_ALL: 'REG_NUM',
+    LayerName.tpu_rv_metro_polygon: 'REG_NUM',
+    LayerName.PPT_UDS: 'REG_NUM',
+    LayerName.PP_GAZ: 'REG_NUM',
+    LayerName.PP_METRO_ALL: 'REG_NUM',
+}
+
+# слои с адресами: по колонке строится индекс для локального поиска адресов
+ADDRESS_LAYERS = {
+    LayerName.ZU: 'address',
+    LayerName.OKS: 'address',
+    LayerName.MKD: 'address',
+}
+
+def resolve_layer(name: str) -> LayerName:
+    # принимаем как имя члена (ZU), так и имя файла (ЗУ.shp)
+    if name in LayerName.__members__:
+        return LayerName[name]
+    try:
+        return LayerName(name)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Layer '{name}' not found")
+
+def layer_file(layer: LayerName) -> str:
+    folder, _, _ = LAYER_SOURCES[layer]
+    return f"{folder.value}/{layer.value}"
+
+def get_layer(layer: LayerName):
+    folder, encode, _ = LAYER_SOURCES[layer]
+    try:
+        return layer_store.get(f"{folder.value}/{layer.value}", encode)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
+
 class ZUColumnName(str, Enum):
     geometry = "geometry"
     cadastra2 = "cadastra2"
@@ -412,6 +500,58 @@ class MKDColumnName(str, Enum):
     mkd_flag = "mkd_flag"
     moddate = "moddate"
 
+def parse_bbox(bbox):
+    if bbox is None:
+        return None
+    try:
+        minx, miny, maxx, maxy = (float(v) for v in bbox.split(','))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be 'minx,miny,maxx,maxy'")
+    if minx > maxx or miny > maxy:
+        raise HTTPException(status_code=400, detail="bbox min values must not exceed max values")
+    return minx, miny, maxx, maxy
+
+class ColorOutput(str, Enum):
+    color = "color"
+    category = "category"
+
+class LayerFormat(str, Enum):
+    geojson = "geojson"
+    topojson = "topojson"
+
+class VisualizeParams:
+    def __init__(
+        self,
+        bbox: Optional[str] = Query(None, description="Область просмотра в WGS-84: minx,miny,maxx,maxy"),
+        limit: Optional[int] = Query(None, ge=1, description="Максимальное число объектов в ответе"),
+        zoom: Optional[int] = Query(None, ge=0, le=24, description="Зум карты: геометрии упрощаются под его уровень"),
+        stream: bool = Query(False, description="Отдавать FeatureCollection частями (chunked), не собирая ответ целиком"),
+        fields: Optional[str] = Query(None, description="Атрибуты в ответе через запятую, по умолчанию - все непустые"),
+        output: ColorOutput = Query(ColorOutput.color, description="color - цвет у каждого объекта, category - номер категории и легенда"),
+        format: LayerFormat = Query(LayerFormat.geojson, description="topojson - общие границы соседних объектов один раз, координаты квантованы"),
+        request: Request = None,
+    ):
+        # заголовки нужны для If-None-Match и Accept-Encoding
+        self.headers = request.headers if request is not None else {}
+        self.output = output
+        self.format = format
+        self.fields = [f.strip() for f in fields.split(',') if f.strip()] if fields is not None else None
+        self.bbox = parse_bbox(bbox)
+        self.limit = limit
+        self.zoom = zoom
+        self.stream = stream
+
+    def __getstate__(self):
+        # в процесс пула уходят только параметры, заголовки запроса там не нужны
+        state = self.__dict__.copy()
+        state['headers'] = {}
+        return state
+
+    def cache_key(self):
+        # всё, что влияет на тело ответа, кроме самого слоя и колонки
+        fields = tuple(self.fields) if self.fields is not None else None
+        return (self.bbox, self.limit, self.zoom, fields, self.output.value, self.format.value)
+
 @router.get(
     "/visualize/ZU", 
     response_model=FeatureCollection,
@@ -421,23 +561,9 @@ class MKDColumnName(str, Enum):
     summary="Земельные участки",
     # responses={},
         )
-def visualize_zu(layer: LayerName = LayerName.ZU, column: ZUColumnName = ZUColumnName.ownershi8):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.ZU.value}/{layer.value}", encode='UTF8')
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_zu(layer: LayerName = LayerName.ZU, column: ZUColumnName = ZUColumnName.ownershi8, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.ZU.value}/{layer.value}", column.value, params, encode='UTF8')
 
 @router.get(
     "/visualize/OKS", 
@@ -448,23 +574,9 @@ def visualize_zu(layer: LayerName = LayerName.ZU, column: ZUColumnName = ZUColum
     summary="Объекты капитального строительства",
     # responses={},
         )
-def visualize_oks(layer: LayerName = LayerName.OKS, column: OKSColumnName = OKSColumnName.hasbti):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.OKS.value}/{layer.value}", encode='UTF8')
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_oks(layer: LayerName = LayerName.OKS, column: OKSColumnName = OKSColumnName.hasbti, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.OKS.value}/{layer.value}", column.value, params, encode='UTF8')
 
 @router.get(
     "/visualize/ZOUIT", 
@@ -475,23 +587,9 @@ def visualize_oks(layer: LayerName = LayerName.OKS, column: OKSColumnName = OKSC
     summary="Зоны охраняемых уникальных историко-культурных территорий",
     # responses={},
         )
-def visualize_zouit(layer: LayerName = LayerName.ZOUIT, column: ZOUITColumnName = ZOUITColumnName.VID_ZOUIT):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.ZOUIT.value}/{layer.value}", encode='UTF8')
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_zouit(layer: LayerName = LayerName.ZOUIT, column: ZOUITColumnName = ZOUITColumnName.VID_ZOUIT, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.ZOUIT.value}/{layer.value}", column.value, params, encode='UTF8')
 
 @router.get(
     "/visualize/spritzones", 
@@ -502,23 +600,9 @@ def visualize_zouit(layer: LayerName = LayerName.ZOUIT, column: ZOUITColumnName
     summary="Зоны регулирования застройки и застройки",
     # responses={},
         )
-def visualize_spritzones(layer: LayerName = LayerName.spritzones, column: SpritzonesColumnName = SpritzonesColumnName.LineCode):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.spritzones.value}/{layer.value}", encode='UTF8')
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_spritzones(layer: LayerName = LayerName.spritzones, column: SpritzonesColumnName = SpritzonesColumnName.LineCode, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.spritzones.value}/{layer.value}", column.value, params, encode='UTF8')
 
 @router.get(
     "/visualize/YDC_ROADS", 
@@ -529,23 +613,9 @@ def visualize_spritzones(layer: LayerName = LayerName.spritzones, column: Spritz
     summary="Дороги",
     # responses={},
         )
-def visualize_ydc_roads(layer: LayerName = LayerName.YDC_ROADS, column: YDC_ROADSColumnName = YDC_ROADSColumnName.VID_ROAD):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.YDC_ROADS.value}/{layer.value}")
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_ydc_roads(layer: LayerName = LayerName.YDC_ROADS, column: YDC_ROADSColumnName = YDC_ROADSColumnName.VID_ROAD, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.YDC_ROADS.value}/{layer.value}", column.value, params)
 
 @router.get(
     "/visualize/renovation_sites", 
@@ -556,23 +626,9 @@ def visualize_ydc_roads(layer: LayerName = LayerName.YDC_ROADS, column: YDC_ROAD
     summary="Стартовые площадки реновации",
     # responses={},
         )
-def visualize_renovation_sites(layer: LayerName = LayerName.renovation_sites, column: RenovationSitesColumnName = RenovationSitesColumnName.vysota):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.renovation_sites.value}/{layer.value}", encode='UTF8')
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_renovation_sites(layer: LayerName = LayerName.renovation_sites, column: RenovationSitesColumnName = RenovationSitesColumnName.vysota, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.renovation_sites.value}/{layer.value}", column.value, params, encode='UTF8')
 
 @router.get(
     "/visualize/PPZ_ZONES", 
@@ -583,23 +639,9 @@ def visualize_renovation_sites(layer: LayerName = LayerName.renovation_sites, co
     summary="ПЗЗ (территориальные зоны)",
     # responses={},
         )
-def visualize_ppz_zones(layer: LayerName = LayerName.PPZ_ZONES_NEW, column: PPZ_ZONESColumnName = PPZ_ZONESColumnName.TYPE):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.PPZ_ZONES.value}/{layer.value}", encode='UTF8')
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_ppz_zones(layer: LayerName = LayerName.PPZ_ZONES_NEW, column: PPZ_ZONESColumnName = PPZ_ZONESColumnName.TYPE, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.PPZ_ZONES.value}/{layer.value}", column.value, params, encode='UTF8')
 
 @router.get(
     "/visualize/PPZ_PODZONES", 
@@ -610,23 +652,9 @@ def visualize_ppz_zones(layer: LayerName = LayerName.PPZ_ZONES_NEW, column: PPZ_
     summary="ПЗЗ (территориальные подзоны)",
     # responses={},
         )
-def visualize_ppz_podzones(layer: LayerName = LayerName.PPZ_PODZONES_NEW, column: PPZ_PODZONESColumnName = PPZ_PODZONESColumnName.PLOTNOST):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.PPZ_PODZONES.value}/{layer.value}", encode='UTF8')
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_ppz_podzones(layer: LayerName = LayerName.PPZ_PODZONES_NEW, column: PPZ_PODZONESColumnName = PPZ_PODZONESColumnName.PLOTNOST, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.PPZ_PODZONES.value}/{layer.value}", column.value, params, encode='UTF8')
 
 @router.get(
     "/visualize/KRT", 
@@ -637,23 +665,9 @@ def visualize_ppz_podzones(layer: LayerName = LayerName.PPZ_PODZONES_NEW, column
     summary="Капитальный ремонт территории",
     # responses={},
         )
-def visualize_krt(layer: LayerName = LayerName.KRT, column: KRTColumnName = KRTColumnName.type_krt):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.KRT.value}/{layer.value}", encode='UTF8')
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_krt(layer: LayerName = LayerName.KRT, column: KRTColumnName = KRTColumnName.type_krt, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.KRT.value}/{layer.value}", column.value, params, encode='UTF8')
 
 @router.get(
     "/visualize/Districts", 
@@ -664,23 +678,9 @@ def visualize_krt(layer: LayerName = LayerName.KRT, column: KRTColumnName = KRTC
     summary="Округа",
     # responses={},
         )
-def visualize_districts(layer: LayerName = LayerName.DISTRICTS, column: DistrictsColumnName = DistrictsColumnName.NAME):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.DISTRICTS.value}/{layer.value}")
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_districts(layer: LayerName = LayerName.DISTRICTS, column: DistrictsColumnName = DistrictsColumnName.NAME, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.DISTRICTS.value}/{layer.value}", column.value, params)
 
 @router.get(
     "/visualize/Region",
@@ -691,23 +691,9 @@ def visualize_districts(layer: LayerName = LayerName.DISTRICTS, column: District
     summary="Районы",
     # responses={},
         )
-def visualize_region(layer: LayerName = LayerName.REGION, column: RegionColumnName = RegionColumnName.NAME):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.region.value}/{layer.value}")
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_region(layer: LayerName = LayerName.REGION, column: RegionColumnName = RegionColumnName.NAME, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.region.value}/{layer.value}", column.value, params)
 
 @router.get(
     "/visualize/Survey", 
@@ -718,23 +704,9 @@ def visualize_region(layer: LayerName = LayerName.REGION, column: RegionColumnNa
     summary="Участки межевания жилых кварталов",
     # responses={},
         )
-def visualize_survey(layer: LayerName = LayerName.SURVEY, column: SurveyColumnName = SurveyColumnName.KLASS):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.SURVEY.value}/{layer.value}")
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_survey(layer: LayerName = LayerName.SURVEY, column: SurveyColumnName = SurveyColumnName.KLASS, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.SURVEY.value}/{layer.value}", column.value, params)
 
 @router.get(
     "/visualize/OOZT", 
@@ -745,23 +717,9 @@ def visualize_survey(layer: LayerName = LayerName.SURVEY, column: SurveyColumnNa
     summary="Объекты охраняемой зоны территории",
     # responses={},
         )
-def visualize_oozt(layer: LayerName = LayerName.OOZT, column: OOZTColumnName = OOZTColumnName.status):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.OOZT.value}/{layer.value}", encode='UTF8')
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_oozt(layer: LayerName = LayerName.OOZT, column: OOZTColumnName = OOZTColumnName.status, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.OOZT.value}/{layer.value}", column.value, params, encode='UTF8')
 
 @router.get(
     "/visualize/Cadastral", 
@@ -772,23 +730,9 @@ def visualize_oozt(layer: LayerName = LayerName.OOZT, column: OOZTColumnName = O
     summary="Кадастровое деление",
     # responses={},
         )
-def visualize_cadastral(layer: LayerName = LayerName.Cadastral, column: CadastralColumnName = CadastralColumnName.cadastra1):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.Cadastral.value}/{layer.value}")
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
-
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
-
-    return geojson
+def visualize_cadastral(layer: LayerName = LayerName.Cadastral, column: CadastralColumnName = CadastralColumnName.cadastra1, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.Cadastral.value}/{layer.value}", column.value, params)
 
 @router.get(
     "/visualize/MKD", 
@@ -799,91 +743,158 @@ def visualize_cadastral(layer: LayerName = LayerName.Cadastral, column: Cadastra
     summary="Многоквартирные дома",
     # responses={},
         )
-def visualize_mkd(layer: LayerName = LayerName.MKD, column: MKDColumnName = MKDColumnName.hasbti):
-    try:
-        # layer folder + layer name
-        gdf = read_shapefile(f"{LayerFolder.MKD.value}/{layer.value}", encode='UTF8')
-        gdf = gdf.to_crs("EPSG:4326")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
-    
-    if column.value not in gdf.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{column.value}' not found in the data")
+def visualize_mkd(layer: LayerName = LayerName.MKD, column: MKDColumnName = MKDColumnName.hasbti, params: VisualizeParams = Depends()):
+    # layer folder + layer name
+    return visualize_layer(f"{LayerFolder.MKD.value}/{layer.value}", column.value, params, encode='UTF8')
 
-    gdf = remove_empty_and_zero_columns(gdf)
-    gdf = add_color(gdf, column.value)
-    
-    geojson = gdf_to_geojson(gdf)
+def load_shapefile(file, encode='cp1251'):
+    # geopandas и fiona нужны только при разборе shapefile - не при старте сервера
+    import fiona
+    import geopandas as gpd
 
-    return geojson
-
-@lru_cache
-def read_shapefile(file, encode='cp1251'):
     with fiona.open(os.path.join(data_dir, file), encoding=encode) as src:
         gdf = gpd.GeoDataFrame.from_features(src, crs=src.crs)
         return gdf
-    
-def transform_geometry(transformer, target_crs, geom):
-    if isinstance(geom, Point):
-        return transform(transformer, target_crs, geom.x, geom.y)
-    elif isinstance(geom, LineString):
-        transformed_coords = [transform(transformer, target_crs, *point) for point in geom.coords]
-        return LineString(transformed_coords)
-    elif isinstance(geom, Polygon):
-        exterior = [transform(transformer, target_crs, *coord) for coord in geom.exterior.coords]
-        interiors = [[transform(transformer, target_crs, *coord) for coord in interior.coords] for interior in geom.interiors]
-        return Polygon(exterior, interiors)
-    elif isinstance(geom, MultiPoint):
-        return MultiPoint([transform(transformer, target_crs, point.x, point.y) for point in geom.geoms])
-    elif isinstance(geom, MultiLineString):
-        return MultiLineString([LineString([transform(transformer, target_crs, *point) for point in line.coords]) for line in geom.geoms])
-    elif isinstance(geom, MultiPolygon):
-        return MultiPolygon([Polygon([transform(transformer, target_crs, *coord) for coord in polygon.exterior.coords],
-                                     [[transform(transformer, target_crs, *coord) for coord in interior.coords] for interior in polygon.interiors])
-                            for polygon in geom.geoms])
-    else:
-        raise ValueError(f"Unsupported geometry type: {type(geom)}")
 
-@lru_cache
-def read_shapefile_trans(file, encode='cp1251'):
-    
+# слои в WGS-84 без пустых колонок, готовые к выдаче в /visualize/*
+# первая загрузка слоя ждёт, пока исходник не меняется хотя бы период проверки наблюдателя
+layer_store = LayerStore(load_shapefile, disk_cache=LayerDiskCache(data_dir, cache_dir),
+                         compiled_only=config.LAYER_COMPILED_ONLY, settle=max(config.LAYER_WATCH_INTERVAL, 0))
+
+# версии слоёв и снимки объектов для /layers/delta; переживают перезапуск и пересборку кэша слоёв
+layer_history = LayerHistory(os.path.join(cache_dir, 'history'), config.LAYER_HISTORY_SIZE)
+
+# готовые ответы /visualize/* и /columns/; увеличить при изменении формата ответа
+RESPONSE_FORMAT = 1
+response_cache = ResponseCache(maxbytes=config.RESPONSE_CACHE_BYTES)
+
+def layer_validator(file, encode):
+    # версия данных - подпись загруженного слоя (mtime и размер .shp/.dbf на момент загрузки), а не файлов
+    # на диске: изменённый исходник подхватывает LayerWatcher, когда файл перестанет меняться
+    entry = layer_store.peek(file)
+    if entry is None:
+        try:
+            entry = layer_store.get(file, encode)
+        except Exception:
+            return None, None
+    if entry.signature is None:
+        return None, None
+    last_modified = max(entry.signature[suffix][0] for suffix in SOURCE_SUFFIXES) / 1e9
+    return entry, last_modified
+
+def render_entry(entry, column, params) -> bytes:
+    # тело ответа строго той версии слоя, по которой посчитан ETag
+    try:
+        return geo_pool.call(render_layer, entry.file, column, params, entry.encode, entry.signature)
+    except StaleLayerError:
+        # в дисковом кэше уже новая версия, а процесс пула старую не держит - отвечаем из основного процесса
+        return layer_response(entry, column, params).body
+
+def visualize_layer(file, column, params=None, encode='cp1251'):
+    if params is not None and not params.stream:
+        entry, last_modified = layer_validator(file, encode)
+        if entry is not None:
+            etag = make_etag(RESPONSE_FORMAT, file, entry.signature, column, params.cache_key())
+            return response_cache.respond(
+                params.headers, etag,
+                lambda: render_entry(entry, column, params),
+                last_modified=last_modified,
+                media_type=GeoJSONResponse.media_type,
+                # выборки по области просмотра почти не повторяются - их не кэшируем (сжимаются по размеру)
+                store=params.bbox is None and params.limit is None,
+            )
+    if params is not None and params.stream:
+        return build_layer_response(file, column, params, encode)
+    return GeoJSONResponse(content=geo_pool.call(render_layer, file, column, params, encode))
 
-    with fiona.open(os.path.join(data_dir, file), encoding=encode) as src:
-        # Get the source CRS and create a transformer to WGS-84
-        src_crs = src.crs
-        transformer = Proj(projparams='+proj=tmerc +lat_0=55.667 +lon_0=37.4998 +k=1 +x_0=-19.1 +y_0=4.9 +ellps=krass +towgs84=23.92,-141.27,-80.9,-0,0.35,0.82,-0.12 +units=m +no_defs')
-        target_crs = Proj(init='epsg:4326')  # WGS-84 CRS
+def render_layer(file, column, params=None, encode='cp1251', signature=None) -> bytes:
+    # выполняется в процессе пула: слой берётся из layer_store этого процесса (через дисковый кэш);
+    # с подписью слоя основного процесса читается ровно его версия
+    return build_layer_response(file, column, params, encode, signature).body
 
-        # Read the shapefile into a GeoDataFrame
-        gdf = gpd.GeoDataFrame.from_features(src, crs=src_crs)
+def build_layer_response(file, column, params=None, encode='cp1251', signature=None):
+    try:
+        entry = layer_store.get(file, encode, signature)
+    except StaleLayerError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading the shapefile: {str(e)}")
+    return layer_response(entry, column, params)
+
+def layer_response(entry, column, params=None):
+    if column not in entry.columns:
+        raise HTTPException(status_code=400, detail=f"Column '{column}' not found in the data")
+
+    fields = params.fields if params is not None else None
+    if fields is not None:
+        # набор непустых колонок посчитан один раз при подготовке слоя
+        unknown = [f for f in fields if f not in entry.columns]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Fields {unknown} not found in the data")
+
+    positions = select_positions(entry, params)
+    # атрибуты берутся из памяти процесса, геометрии декодируются из общего mmap по мере выдачи
+    attributes = entry.attributes if positions is None else entry.attributes.iloc[positions]
+    color_map = get_color_map(entry, column)
+    if params is not None and params.output == ColorOutput.category:
+        # номер категории вместо цвета у объекта, легенда - один раз на весь ответ
+        extra = {'category': color_map.category_codes(positions)}
+        members = {'legend': {'column': column, 'categories': color_map.legend()}}
+    else:
+        extra = {'color': color_map.feature_colors(positions)}
+        members = None
+
+    if fields is None:
+        fields = entry.columns
+
+    if params is not None and params.format == LayerFormat.topojson:
+        # атрибуты кодируются как в GeoJSON, геометрии - ссылками на общие дуги слоя; stream не применяется
+        columns = [(col, attributes[col]) for col in fields] + list(extra.items())
+        name = os.path.splitext(os.path.basename(entry.file))[0]
+        body = get_topology(entry, params.zoom).encode(name, encode_records(columns, len(attributes)), positions, members)
+        return GeoJSONResponse(content=body)
+
+    geometries = entry.geometries_for_zoom(params.zoom if params is not None else None)
+    if geometries is None:
+        geometries = GeometryView(entry, positions)
+    elif positions is not None:
+        geometries = geometries[positions]
+
+    if params is not None and params.stream:
+        return StreamingResponse(
+            iter_feature_collection(attributes, extra, geometries, config.GEOJSON_STREAM_CHUNK_SIZE, fields, members),
+            media_type=GeoJSONResponse.media_type,
+        )
 
-        # Transform geometries to WGS-84
-        gdf['geometry'] = gdf['geometry'].apply(lambda geom: transform_geometry(transformer, target_crs, geom))
+    return gdf_to_geojson(attributes, extra=extra, geometries=geometries, fields=fields, members=members)
 
-        return gdf
+def select_positions(entry, params):
+    # None - весь слой; иначе позиции объектов в области просмотра через STRtree слоя
+    if params is None or (params.bbox is None and params.limit is None):
+        return None
+    if params.bbox is not None:
+        positions = entry.query(params.bbox)
+    else:
+        positions = np.arange(len(entry))
+    if params.limit is not None:
+        positions = positions[:params.limit]
+    return positions
+    
+def get_color_map(entry, column) -> ColorMap:
+    # палитра считается по всему слою один раз на версию, поэтому цвета не зависят от выборки
+    return entry.derived(('color_map', column), lambda: ColorMap(entry.attributes[column], TABLEAU_COLORS))
 
-def remove_empty_and_zero_columns(gdf):
-    non_empty_columns = [col for col in gdf.columns if gdf[col].notnull().any()]
-    non_zero_columns = [col for col in non_empty_columns if not ((gdf[col] == 0) | (gdf[col] == 0.0)).all()]
-    gdf = gdf[non_zero_columns]
-    return gdf
-
-def add_color(gdf, column):
-    unique_values = gdf[column].unique()
-    colors = list(mcolors.TABLEAU_COLORS.values())
-    color_map = {val: colors[i % len(colors)] for i, val in enumerate(unique_values)}
-    gdf['color'] = gdf[column].map(color_map)
-    return gdf
-
-def gdf_to_geojson(gdf) -> FeatureCollection:
-    features = []
-    for _, row in gdf.iterrows():
-        feature = Feature(
-            geometry=row['geometry'].__geo_interface__,
-            properties=row.drop('geometry').to_dict()
-        )
-        features.append(feature)
-    return FeatureCollection(features=features)
+def get_topology(entry, zoom) -> Topology:
+    # топология всего слоя строится один раз на уровень пирамиды и общая с геометриями пирамиды
+    return entry.topology(zoom_level(zoom))
+
+def get_colors(entry, column, positions=None):
+    # возвращаем колонку цветов, чтобы не менять закэшированный слой
+    return get_color_map(entry, column).feature_colors(positions)
+
+def gdf_to_geojson(gdf, extra=None, geometries=None, fields=None, members=None) -> GeoJSONResponse:
+    # сериализуем сразу в байты: FastAPI не валидирует Response через response_model
+    return GeoJSONResponse(content=dump_feature_collection(gdf, extra, geometries, fields, members))
 
 
 def change_src_crs_to_wgs84(gdf):
@@ -892,26 +903,61 @@ def change_src_crs_to_wgs84(gdf):
 
 
 
-@lru_cache
+def warmup_jobs():
+    # каждый слой со своей кодировкой; отсутствующие файлы попадут в статус прогрева как failed
+    return [(layer_file(layer), encode) for layer, (_, encode, _) in LAYER_SOURCES.items()]
+
+def warm_layer_indexes(file, entry):
+    # заодно считаем палитру колонки по умолчанию и индексы ключей и адресов, чтобы первые запросы не платили за них
+    layer = resolve_layer(os.path.basename(file))
+    column = LAYER_SOURCES[layer][2]
+    if column is not None and column in entry.columns:
+        get_color_map(entry, column)
+    for key in LAYER_KEYS.get(layer, ()):
+        if key in entry.columns:
+            entry.key_index(key)
+    address = ADDRESS_LAYERS.get(layer)
+    if address is not None and address in entry.columns:
+        entry.address_index(address)
+    # новая версия слоя фиксируется в истории до того, как её начнут запрашивать клиенты
+    layer_version(layer, entry)
+
+def layer_id_column(layer, entry):
+    for column in (LAYER_IDS.get(layer), 'objectid', 'OBJECTID'):
+        if column is not None and column in entry.columns:
+            return column
+    # без ключевой колонки объекты различаются только позицией в слое
+    return None
+
+def layer_version(layer, entry) -> int:
+    # номер версии из истории слоя: один раз на загруженную версию, объекты хэшируются только при изменении исходника
+    key = layer_id_column(layer, entry)
+    return entry.derived(('history', key), lambda: layer_history.record(entry, key))
+
+def build_layer_delta(layer, entry, version, since, column) -> bytes:
+    delta = layer_history.delta(entry, version, since)
+    positions = np.concatenate([delta.added, delta.changed])
+    change = np.repeat(np.array(['added', 'changed'], dtype=object), [len(delta.added), len(delta.changed)])
+    extra = {'change': pd.Series(change)}
+    if column is not None:
+        extra['color'] = get_color_map(entry, column).feature_colors(positions)
+    members = {
+        'version': delta.version,
+        'since': delta.since,
+        'reset': delta.reset,
+        'id': layer_id_column(layer, entry),
+        'removed': delta.removed,
+    }
+    return dump_feature_collection(entry.attributes.iloc[positions], extra, GeometryView(entry, positions), entry.columns, members)
+
+layer_warmup = LayerWarmup(layer_store, warmup_jobs, workers=config.LAYER_WARMUP_WORKERS, after_load=warm_layer_indexes)
+
 def load_shapefiles():
     # load all shapefiles into memory to speed up the visualization and avoid reading the files each time
-    # if ЗУ, ОКС, ЗОУИТ, СПРИТ, Реновация, ПЗЗ, КРТ, ООЗТ, МКД - encode='UTF8'
-    for layer, folder in LayerFolder.__members__.items():
-        for file in os.listdir(os.path.join(data_dir, folder.value)):
-            if file.endswith('.shp'):
-                if layer == LayerNameProps.ZU or layer == LayerNameProps.OKS or layer == LayerNameProps.ZOUIT or layer == LayerNameProps.spritzones or layer == LayerNameProps.renovation_sites or layer == LayerNameProps.PPZ_ZONES_NEW or layer == LayerNameProps.PPZ_ZONES_OLD or layer == LayerNameProps.PPZ_PODZONES_OLD or layer == LayerNameProps.PPZ_PODZONES_NEW or layer == LayerNameProps.KRT or layer == LayerNameProps.OOZT or layer == LayerNameProps.MKD:
-                    try:
-                        gdf = read_shapefile(f"{folder.value}/{file}", encode='UTF8')
-                    except Exception as e:
-                        print(f"Error reading the shapefile: {str(e)}")
-                else:
-                    try:
-                        gdf = read_shapefile(f"{folder.value}/{file}")
-                    except Exception as e:
-                        print(f"Error reading the shapefile: {str(e)}")
+    layer_warmup.start()
 
-    
-    print("All shapefiles loaded into memory")
+# изменившиеся слои перестраиваются в фоне вместе с индексами и палитрами и подменяются атомарно
+layer_watcher = LayerWatcher(layer_store, config.LAYER_WATCH_INTERVAL, prepare=warm_layer_indexes)
 
 from enum import Enum
 from pydantic import BaseModel
@@ -1232,7 +1278,17 @@ class LayerColumnsResponse(BaseModel):
     description="Список всех возможных колонок для каждого слоя",
     summary="Список всех возможных колонок для каждого слоя",
 )
-def get_columns() -> Dict[str, List[ColumnInfo]]:
+def get_columns(request: Request):
+    # список колонок задаётся моделями и не меняется, пока работает процесс
+    body = columns_body()
+    return response_cache.respond(request.headers, make_etag(RESPONSE_FORMAT, 'columns', body), lambda: body)
+
+@lru_cache
+def columns_body() -> bytes:
+    columns = jsonable_encoder(build_columns())
+    return json.dumps(columns, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def build_columns() -> Dict[str, List[ColumnInfo]]:
     columns: Dict[str, List[ColumnInfo]] = {}
     layer_models: Dict[str, Type[BaseModel]] = {
         "ZUProperties": ZUProperties,
@@ -1284,25 +1340,69 @@ def get_columns() -> Dict[str, List[ColumnInfo]]:
 
     return columns
 
-# load all shapefiles into memory to speed up the visualization and avoid reading the files each time
-# load_shapefiles()
-
-# save the shapefiles to a json file to avoid reading the files each time and save it to output folder
-def save_shapefiles_to_json():
-    for layer, folder in LayerFolder.__members__.items():
-        for file in os.listdir(os.path.join(data_dir, folder.value)):
-            if file.endswith('.shp'):
-                if layer == LayerName.ZU or layer == LayerName.OKS or layer == LayerName.ZOUIT or layer == LayerName.spritzones or layer == LayerName.renovation_sites or layer == LayerName.PPZ_ZONES_NEW or layer == LayerName.PPZ_ZONES_OLD or layer == LayerName.PPZ_PODZONES_OLD or layer == LayerName.PPZ_PODZONES_NEW or layer == LayerName.KRT or layer == LayerName.OOZT or layer == LayerName.MKD:
-                    try:
-                        gdf = read_shapefile(f"{folder.value}/{file}", encode='UTF8')
-                    except Exception as e:
-                        print(f"Error reading the shapefile: {str(e)}")
-                else:
-                    try:
-                        gdf = read_shapefile(f"{folder.value}/{file}")
-                    except Exception as e:
-                        print(f"Error reading the shapefile: {str(e)}")
-                gdf.to_file(f"output/{layer.value}.json", driver="GeoJSON")
-    
-    print("All shapefiles saved to json files")
+@router.get(
+    "/layers/stats",
+    response_description="Статистика кэша подготовленных слоёв",
+    status_code=status.HTTP_200_OK,
+    description="Счётчики попаданий и промахов кэша слоёв и версии загруженных слоёв",
+    summary="Статистика кэша слоёв",
+)
+def get_layer_stats():
+    stats = layer_store.stats()
+    stats["responses"] = response_cache.stats()
+    stats["watcher"] = layer_watcher.status()
+    return stats
+
+@router.post(
+    "/layers/reload",
+    response_description="Новая версия слоя",
+    status_code=status.HTTP_200_OK,
+    description="Перечитать слой из исходника без перезапуска: пока строится новая версия, запросы получают прежнюю",
+    summary="Перезагрузка слоя",
+)
+def reload_layer(layer: str):
+    layer = resolve_layer(layer)
+    _, encode, _ = LAYER_SOURCES[layer]
+    file = layer_file(layer)
+    if not layer_watcher.reload(file, encode):
+        raise HTTPException(status_code=500, detail=layer_watcher.reloads[file]["error"])
+    return layer_store.stats()["layers"][file]
+
+@router.get(
+    "/layers/delta",
+    response_description="Объекты слоя, добавленные и изменённые с версии клиента, и ключи удалённых",
+    status_code=status.HTTP_200_OK,
+    description=(
+        "Синхронизация слоя на клиенте: FeatureCollection только с объектами, добавленными (change=added) "
+        "или изменёнными (change=changed) после версии since, и ключи удалённых объектов в removed. "
+        "Объекты сопоставляются по колонке id. since=0 - весь слой; если версия since уже не хранится, "
+        "возвращается весь слой с reset=true и since=0. Номер текущей версии - в version"
+    ),
+    summary="Изменения слоя с версии",
+)
+def get_layer_delta(layer: str, since: int = Query(0, ge=0), column: Optional[str] = None):
+    layer = resolve_layer(layer)
+    entry = get_layer(layer)
+    column = column or LAYER_SOURCES[layer][2]
+    if column is not None and column not in entry.columns:
+        raise HTTPException(status_code=400, detail=f"Column '{column}' not found in the data")
+    version = layer_version(layer, entry)
+    # ответы кэшируются только для хранимых версий; любая другая since - один и тот же полный слой с reset
+    key = since if since == 0 or layer_history.stored(entry.file, since) else 'reset'
+    body = entry.derived(('delta', version, key, column), lambda: build_layer_delta(layer, entry, version, since, column))
+    return GeoJSONResponse(content=body)
+
+@router.get(
+    "/ready",
+    response_description="Готовность сервиса: 200 после прогрева слоёв, 503 до него",
+    status_code=status.HTTP_200_OK,
+    description="Проверка готовности для балансировщика: пока слои прогреваются, возвращает 503",
+    summary="Готовность слоёв",
+)
+def get_readiness():
+    state = layer_warmup.status()
+    if config.LAYER_WARMUP and not layer_warmup.ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=state)
+    return state
 
+# прогрев слоёв запускается из app.main при старте приложения (config.LAYER_WARMUP)
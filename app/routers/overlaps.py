@@ -0,0 +1,142 @@
+import json
+from functools import partial
+from typing import List, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response
+from starlette import status
+
+from app.config import config
+from app.models.overlaps import OverlapRequest
+from app.routers.main_func import (LAYER_KEYS, LAYER_SOURCES, LayerName, get_layer, layer_file, layer_warmup, layer_watcher,
+                                   resolve_layer)
+from app.services.overlaps import OverlapBuilder
+
+router = APIRouter(prefix=config.BACKEND_PREFIX)
+
+# базовый слой (участки) и слои, пересечения с которыми считаются заранее
+OVERLAP_BASE = LayerName.ZU
+OVERLAP_LAYERS = (
+    LayerName.ZOUIT,
+    LayerName.PPZ_ZONES_NEW,
+    LayerName.PPZ_PODZONES_NEW,
+    LayerName.KRT,
+    LayerName.OOZT,
+    LayerName.PPT_ALL,
+)
+
+overlap_builder = OverlapBuilder(
+    partial(get_layer, OVERLAP_BASE),
+    {layer.name: partial(get_layer, layer) for layer in OVERLAP_LAYERS},
+    # при включённом прогреве ждём его, чтобы слои читались один раз
+    wait=layer_warmup.wait if config.LAYER_WARMUP else None,
+)
+
+
+def on_layer_reload(file, entry):
+    # таблицы привязаны к версиям слоёв: после подмены любого из них устаревшие строятся заново
+    if file in {layer_file(layer) for layer in (OVERLAP_BASE,) + OVERLAP_LAYERS}:
+        overlap_builder.start()
+
+
+layer_watcher.subscribe(on_layer_reload)
+
+
+def resolve_overlap_layers(names: Optional[List[str]]) -> List[LayerName]:
+    if not names:
+        return list(OVERLAP_LAYERS)
+    layers = [resolve_layer(name) for name in names]
+    unknown = [layer.name for layer in layers if layer not in OVERLAP_LAYERS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"No overlap tables for {unknown}")
+    return layers
+
+
+def json_values(values) -> list:
+    # значения колонки без NaN, чтобы ответ оставался корректным JSON
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def parcel_overlaps(parcels: List[str], ids: List[int], layer_names: Optional[List[str]]) -> bytes:
+    layers = resolve_overlap_layers(layer_names)
+    base = get_layer(OVERLAP_BASE)
+    key = LAYER_KEYS[OVERLAP_BASE][0]
+
+    positions = [int(i) for i in ids if 0 <= i < len(base)]
+    missing = [i for i in ids if not 0 <= i < len(base)]
+    if parcels:
+        found, key_index = base.key_index(key).lookup(parcels)
+        positions.extend(found.tolist())
+        hit = np.zeros(len(parcels), dtype=bool)
+        hit[key_index] = True
+        missing.extend(parcel for parcel, ok in zip(parcels, hit.tolist()) if not ok)
+
+    tables = {}
+    for layer in layers:
+        other = get_layer(layer)
+        table = overlap_builder.table(layer.name, base, other)
+        if table is None:
+            overlap_builder.start()
+            raise HTTPException(status_code=503, detail=f"Overlap table for {layer.name} is being built")
+        tables[layer.name] = (other, table, LAYER_SOURCES[layer][2])
+
+    keys = json_values(base.attributes[key].iloc[positions]) if key in base.columns else [None] * len(positions)
+    result = []
+    for position, parcel in zip(positions, keys):
+        overlaps = {}
+        area = None
+        for name, (other, table, column) in tables.items():
+            area = float(table.base_areas[position])
+            found, areas = table.lookup(position)
+            values = json_values(other.attributes[column].iloc[found]) if column in other.columns else [None] * len(found)
+            overlaps[name] = [
+                {"id": int(i), "value": value, "area": round(float(a), 2), "share": round(float(a) / area, 4) if area else None}
+                for i, value, a in zip(found.tolist(), values, areas.tolist())
+            ]
+        result.append({"id": position, key: parcel, "area": round(area, 2) if area is not None else None, "overlaps": overlaps})
+    return json.dumps({"parcels": result, "missing": missing}, ensure_ascii=False).encode("utf-8")
+
+
+@router.get(
+    "/overlaps",
+    response_description="Пересечения участка с зонами и территориями других слоёв",
+    status_code=status.HTTP_200_OK,
+    description="Какие зоны ЗОУИТ, ПЗЗ, КРТ, ООЗТ и ППТ пересекают участок и на какой площади (м² и доля участка). "
+                "Ответ берётся из заранее построенных таблиц; пока они строятся - 503",
+    summary="Пересечения участка",
+)
+def get_parcel_overlaps(
+    parcel: Optional[str] = Query(None, description="Кадастровый номер участка (cadastra2)"),
+    id: Optional[int] = Query(None, ge=0, description="Позиция участка в слое ЗУ"),
+    layers: Optional[str] = Query(None, description="Слои через запятую, по умолчанию - все"),
+):
+    if parcel is None and id is None:
+        raise HTTPException(status_code=400, detail="Either parcel or id is required")
+    names = [name.strip() for name in layers.split(",") if name.strip()] if layers else None
+    body = parcel_overlaps([parcel] if parcel is not None else [], [id] if id is not None else [], names)
+    return Response(content=body, media_type="application/json")
+
+
+@router.post(
+    "/overlaps",
+    response_description="Пересечения для пакета участков",
+    status_code=status.HTTP_200_OK,
+    description="Пакетный вариант /overlaps по кадастровым номерам и/или позициям участков",
+    summary="Пересечения участков (пакет)",
+)
+def get_parcels_overlaps(request: OverlapRequest):
+    if len(request.parcels) + len(request.ids) > config.LOOKUP_MAX_KEYS:
+        raise HTTPException(status_code=400, detail=f"At most {config.LOOKUP_MAX_KEYS} parcels per request")
+    body = parcel_overlaps(request.parcels, request.ids, request.layers)
+    return Response(content=body, media_type="application/json")
+
+
+@router.get(
+    "/overlaps/status",
+    response_description="Состояние построения таблиц пересечений",
+    status_code=status.HTTP_200_OK,
+    summary="Статус таблиц пересечений",
+)
+def get_overlaps_status():
+    return overlap_builder.status()
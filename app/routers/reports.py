@@ -1,6 +1,4 @@
 from fastapi.responses import FileResponse
-from docx import Document
-from docx.shared import Inches
 from io import BytesIO
 import tempfile
 
@@ -20,6 +18,9 @@ router = APIRouter(prefix=config.BACKEND_PREFIX)
 
 # Assuming you have imported ShapeService and other necessary modules as in your original code
 def generate_docx_for_favorite_shapes(shapes: List[ShapeGet], filename) -> str:
+    # python-docx (с lxml) загружается при первом отчёте, а не при старте
+    from docx import Document
+
     doc = Document()
 
     # Adding a title
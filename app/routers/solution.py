@@ -1,19 +1,21 @@
-from typing import List
+from typing import TYPE_CHECKING, List
 from fastapi import APIRouter, FastAPI, UploadFile, File, HTTPException, Depends
 from fastapi.responses import JSONResponse, FileResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-import geopandas as gpd
 import os
 import io
-import fiona
 from app.database.tables import Shape
 from app.config import config
 from app.database.connection import AsyncSession
 from app.models import ShapeGet, ShapeCreate, ShapePatch
 from app.database.connection import get_session
+from app.services.workers import geo_pool
 from shapely.geometry import Point, Polygon, LineString, MultiPoint, MultiPolygon, MultiLineString
 
+if TYPE_CHECKING:
+    import geopandas as gpd
+
 router = APIRouter(prefix=f'{config.BACKEND_PREFIX}/solution')
 
 
@@ -26,6 +28,10 @@ uploaded_files = {}
 
 # Функция для чтения и преобразования координат с коррекцией
 def read_and_transform_shapefile_with_correction(file: io.BytesIO, encoding: str, target_crs='EPSG:4326', lat_correction=0.000405, lon_correction=-0.001721):
+    # geopandas и fiona загружаются при первом расчёте, а не при старте сервера
+    import fiona
+    import geopandas as gpd
+
     with fiona.BytesCollection(file.read()) as src:
         gdf = gpd.GeoDataFrame.from_features(src, crs=src.crs)
         if gdf.crs is None:
@@ -58,6 +64,8 @@ def read_and_transform_shapefile_with_correction(file: io.BytesIO, encoding: str
 
 # Функция для вычитания пересечений
 def subtract_intersections(base_gdf, intersecting_gdfs):
+    import geopandas as gpd
+
     remaining_gdf = base_gdf.copy()
     for gdf in intersecting_gdfs:
         try:
@@ -66,6 +74,23 @@ def subtract_intersections(base_gdf, intersecting_gdfs):
             print(f"Ошибка при вычитании слоя: {e}")
     return remaining_gdf
 
+# Функция расчёта контуров: база минус пересекающиеся слои, разбитая на отдельные полигоны
+def compute_small_parts(base: bytes, intersecting: List[bytes]) -> "gpd.GeoDataFrame":
+    import geopandas as gpd
+
+    base_gdf = read_and_transform_shapefile_with_correction(io.BytesIO(base), encoding='cp1251')
+    intersecting_gdfs = [read_and_transform_shapefile_with_correction(io.BytesIO(layer), encoding='cp1251') for layer in intersecting]
+
+    remaining_area = subtract_intersections(base_gdf, intersecting_gdfs)
+
+    remaining_area.to_file(os.path.join(output_dir, 'remaining_area.shp'), encoding='cp1251')
+
+    gdf_remain = read_and_transform_shapefile_with_correction(io.BytesIO(remaining_area.to_json().encode()), encoding='utf-8')
+    geom = gdf_remain.unary_union
+    geoms = [geom] if geom.geom_type == 'Polygon' else list(geom.geoms)
+
+    return gpd.GeoDataFrame(geometry=geoms, crs=gdf_remain.crs)
+
 # Функция для сохранения контуров в базу данных с версионированностью
 def save_shapes_to_db(gdf, version, db: Session):
     for _, row in gdf.iterrows():
@@ -90,25 +115,14 @@ async def process_geojson(db: Session = Depends(get_session)):
     if 'base_layer.shp' not in uploaded_files:
         raise HTTPException(status_code=400, detail="Base layer shapefile not uploaded.")
     
-    base_gdf = read_and_transform_shapefile_with_correction(uploaded_files['base_layer.shp'], encoding='cp1251')
-
     intersecting_layers = ['zpo_valid.shp', 'zouit.shp', 'spritzones.shp', 'oozt.shp', 'renovation_sites.shp', 'krt.shp', 'mkd.shp']
-    intersecting_gdfs = []
-    
-    for layer in intersecting_layers:
-        if layer in uploaded_files:
-            gdf = read_and_transform_shapefile_with_correction(uploaded_files[layer], encoding='cp1251')
-            intersecting_gdfs.append(gdf)
-
-    remaining_area = subtract_intersections(base_gdf, intersecting_gdfs)
 
-    remaining_area.to_file(os.path.join(output_dir, 'remaining_area.shp'), encoding='cp1251')
-
-    gdf_remain = read_and_transform_shapefile_with_correction(io.BytesIO(remaining_area.to_json().encode()), encoding='utf-8')
-    geom = gdf_remain.unary_union
-    geoms = [geom] if geom.geom_type == 'Polygon' else list(geom.geoms)
+    # overlay и объединение считаются в пуле процессов, чтобы не блокировать event loop
+    base = uploaded_files['base_layer.shp'].getvalue()
+    intersecting = [uploaded_files[layer].getvalue() for layer in intersecting_layers if layer in uploaded_files]
+    gdf_parts = await geo_pool.run(compute_small_parts, base, intersecting)
+    geoms = list(gdf_parts.geometry)
 
-    gdf_parts = gpd.GeoDataFrame(geometry=geoms, crs=gdf_remain.crs)
     version = db.query(Shape).count() // len(geoms) + 1
     save_shapes_to_db(gdf_parts, version, db)
 
@@ -160,6 +174,8 @@ async def upload_geojson_to_db(db: Session = Depends(get_session)):
     if not os.path.exists(geojson_path):
         raise HTTPException(status_code=404, detail="GeoJSON file not found")
     
+    import geopandas as gpd
+
     gdf = gpd.read_file(geojson_path)
     version = db.query(Shape).count() // len(gdf) + 1
     save_shapes_to_db(gdf, version, db)
@@ -0,0 +1,138 @@
+import os
+from typing import Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Path, Query
+from fastapi.responses import Response
+from starlette import status
+
+from app.config import config
+from app.routers.main_func import (LAYER_SOURCES, cache_dir, get_colors, get_layer, layer_file, layer_store,
+                                   layer_version, resolve_layer)
+from app.services.cache import LRUCache
+from app.services.layers import StaleLayerError
+from app.services.mvt import MVT_MEDIA_TYPE, encode_layer, prepare_geometries, tile_bounds
+from app.services.raster import BUFFER, DEFAULT_COLOR, TILE_SIZE, TileDiskCache, render_tile
+from app.services.workers import geo_pool
+
+router = APIRouter(prefix=config.BACKEND_PREFIX)
+
+# закодированные тайлы: (файл слоя, версия, колонка, z, x, y) -> bytes
+tile_cache = LRUCache(maxsize=config.TILE_CACHE_SIZE)
+
+# PNG-тайлы на диске по версии слоя из истории: переживают перезапуск, устаревают с изменением объектов
+raster_cache = TileDiskCache(config.RASTER_TILE_CACHE_DIR or os.path.join(cache_dir, 'tiles'))
+
+
+def tile_layer(layer_name: str, z: int, x: int, y: int, column: Optional[str]):
+    layer = resolve_layer(layer_name)
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=400, detail=f"Tile {z}/{x}/{y} is out of range")
+
+    entry = get_layer(layer)
+    column = column or LAYER_SOURCES[layer][2]
+    if column is not None and column not in entry.columns:
+        raise HTTPException(status_code=400, detail=f"Column '{column}' not found in the data")
+    return layer, entry, column
+
+
+def render_mvt(layer_name: str, z: int, x: int, y: int, column: Optional[str]) -> bytes:
+    layer, entry, column = tile_layer(layer_name, z, x, y, column)
+
+    key = (layer_file(layer), entry.version, column, z, x, y)
+    tile = tile_cache.get(key)
+    if tile is not None:
+        return tile
+
+    positions = entry.query(tile_bounds(z, x, y))
+
+    properties = {}
+    if column is not None and len(positions):
+        properties[column] = entry.attributes[column].iloc[positions].tolist()
+        properties["color"] = get_colors(entry, column, positions).tolist()
+
+    geometries = prepare_geometries(entry.geometries(positions), z, x, y)
+    tile = encode_layer(layer.name, geometries, properties, ids=positions.tolist())
+    tile_cache.put(key, tile)
+    return tile
+
+
+@router.get(
+    "/tiles/{layer}/{z}/{x}/{y}.mvt",
+    response_description="Векторный тайл слоя в формате Mapbox Vector Tile",
+    status_code=status.HTTP_200_OK,
+    description="Векторный тайл слоя: геометрии обрезаны, упрощены и квантованы под тайл, "
+                "в атрибутах выбранная колонка и цвет",
+    summary="Векторный тайл слоя",
+    response_class=Response,
+)
+def get_mvt_tile(
+    layer: str = Path(..., description="Слой: имя (ZU) или файл (ЗУ.shp)"),
+    z: int = Path(..., ge=0, le=24),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    column: Optional[str] = Query(None, description="Колонка для раскраски, по умолчанию - колонка слоя"),
+):
+    tile = render_mvt(layer, z, x, y, column)
+    return Response(content=tile, media_type=MVT_MEDIA_TYPE)
+
+
+def render_png(layer_name: str, z: int, x: int, y: int, column: Optional[str], signature: dict) -> bytes:
+    # выполняется в процессе пула: слой той же версии, что в основном процессе, matplotlib загружается только здесь
+    layer = resolve_layer(layer_name)
+    entry = layer_store.get(layer_file(layer), LAYER_SOURCES[layer][1], signature)
+    return draw_png(entry, z, x, y, column)
+
+
+def draw_png(entry, z: int, x: int, y: int, column: Optional[str]) -> bytes:
+    minx, miny, maxx, maxy = tile_bounds(z, x, y)
+    # объекты чуть за краем тайла тоже рисуются: их обводка попадает в тайл
+    pad_x, pad_y = (maxx - minx) * BUFFER / TILE_SIZE, (maxy - miny) * BUFFER / TILE_SIZE
+    positions = entry.query((minx - pad_x, miny - pad_y, maxx + pad_x, maxy + pad_y))
+
+    geometries = entry.geometries_for_zoom(z)
+    geometries = entry.geometries(positions) if geometries is None else geometries[positions]
+    if column is not None:
+        colors = get_colors(entry, column, positions).to_numpy()
+    else:
+        colors = np.full(len(positions), DEFAULT_COLOR, dtype=object)
+    return render_tile(geometries, colors, z, x, y)
+
+
+@router.get(
+    "/tiles/{layer}/{z}/{x}/{y}.png",
+    response_description="Растровый тайл слоя 256x256 в PNG",
+    status_code=status.HTTP_200_OK,
+    description="Растровый тайл слоя для плотных слоёв на мелких масштабах: объекты раскрашены "
+                "по колонке той же палитрой, что и в /visualize/*. Тайлы кэшируются на диске до изменения слоя",
+    summary="Растровый тайл слоя",
+    response_class=Response,
+)
+def get_png_tile(
+    layer: str = Path(..., description="Слой: имя (ZU) или файл (ЗУ.shp)"),
+    z: int = Path(..., ge=0, le=24),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    column: Optional[str] = Query(None, description="Колонка для раскраски, по умолчанию - колонка слоя"),
+):
+    layer, entry, column = tile_layer(layer, z, x, y, column)
+    file, version = layer_file(layer), layer_version(layer, entry)
+    tile = raster_cache.get(file, version, column, z, x, y)
+    if tile is None:
+        try:
+            tile = geo_pool.call(render_png, layer.name, z, x, y, column, entry.signature)
+        except StaleLayerError:
+            # тайл кэшируется по версии entry: рисуем его в основном процессе, если в пуле этой версии уже нет
+            tile = draw_png(entry, z, x, y, column)
+        raster_cache.put(file, version, column, z, x, y, tile)
+    return Response(content=tile, media_type="image/png")
+
+
+@router.get(
+    "/tiles/stats",
+    response_description="Статистика кэша тайлов",
+    status_code=status.HTTP_200_OK,
+    summary="Статистика кэша тайлов",
+)
+def get_tile_stats():
+    return tile_cache.stats()
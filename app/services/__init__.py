@@ -3,4 +3,5 @@ from .users import UsersService
 from .data_sources import DataSourcesService
 from .data_source_metas import DataSourceMetasService
 from .schedules import SchedulesService
-from .cadastral_manual import CadastralManualsService
\ No newline at end of file
+from .cadastral_manual import CadastralManualsService
+from .layers import LayerStore
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+Локальный поиск по адресам объектов слоя.
+
+Адреса нормализуются (нижний регистр, ё -> е, только буквы и цифры) и
+разбиваются на токены. Словарь токенов отсортирован, поэтому все токены
+с заданным префиксом занимают в нём непрерывный диапазон, а их списки
+адресов (postings) лежат подряд в одном массиве - поиск по префиксу
+сводится к двум бинарным поискам и срезу.
+"""
+from __future__ import annotations
+
+import re
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+_PREFIX_END = "\U0010ffff"
+
+
+def tokenize(text) -> List[str]:
+    return _TOKEN_RE.findall(str(text).lower().replace("ё", "е"))
+
+
+class AddressIndex:
+    def __init__(self, values: pd.Series):
+        codes, addresses = pd.factorize(values, use_na_sentinel=True)
+        self.addresses: List[str] = [str(address) for address in addresses.tolist()]
+
+        # позиции объектов по номеру адреса: один адрес может быть у нескольких объектов
+        present = np.flatnonzero(codes >= 0)
+        order = present[np.argsort(codes[present], kind="stable")]
+        self._feature_positions = order
+        self._feature_offsets = np.searchsorted(codes[order], np.arange(len(self.addresses) + 1))
+
+        tokens: List[str] = []
+        owners: List[int] = []
+        lengths = np.zeros(len(self.addresses), dtype=np.int64)
+        for i, address in enumerate(self.addresses):
+            address_tokens = set(tokenize(address))
+            lengths[i] = len(address_tokens)
+            tokens.extend(address_tokens)
+            owners.extend([i] * len(address_tokens))
+        self._lengths = lengths
+
+        vocabulary, token_codes = np.unique(np.array(tokens, dtype=object), return_inverse=True)
+        order = np.argsort(token_codes, kind="stable")
+        self._vocabulary = vocabulary
+        self._postings = np.asarray(owners, dtype=np.int64)[order]
+        self._offsets = np.searchsorted(token_codes[order], np.arange(len(vocabulary) + 1))
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def _token_matches(self, token: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Адреса с токеном, начинающимся на token, и признак точного совпадения токена."""
+        start = np.searchsorted(self._vocabulary, token, side="left")
+        stop = np.searchsorted(self._vocabulary, token + _PREFIX_END, side="left")
+        ids = np.unique(self._postings[self._offsets[start]:self._offsets[stop]])
+        exact = np.zeros(len(ids), dtype=bool)
+        if start < stop and self._vocabulary[start] == token:
+            exact = np.isin(ids, self._postings[self._offsets[start]:self._offsets[start + 1]])
+        return ids, exact
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[int, float]]:
+        """
+        Номера адресов и их оценки, лучшие первыми.
+
+        В адресе должны найтись все токены запроса (точно или по началу);
+        точное совпадение весит больше префиксного, короткие адреса выше длинных.
+        """
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens or not len(self._vocabulary):
+            return []
+
+        candidates = None
+        scores = None
+        for token in query_tokens:
+            ids, exact = self._token_matches(token)
+            weight = np.where(exact, 1.0, 0.5)
+            if candidates is None:
+                candidates, scores = ids, weight
+            else:
+                candidates, left, right = np.intersect1d(candidates, ids, assume_unique=True, return_indices=True)
+                scores = scores[left] + weight[right]
+            if not len(candidates):
+                return []
+
+        # доля токенов адреса, покрытых запросом, - чтобы "тверская 1" не уступала длинным адресам
+        scores = scores / len(query_tokens) + 0.1 * len(query_tokens) / np.maximum(self._lengths[candidates], 1)
+        best = np.lexsort((candidates, -scores))[:limit]
+        return list(zip(candidates[best].tolist(), scores[best].round(4).tolist()))
+
+    def positions(self, address_id: int) -> np.ndarray:
+        return self._feature_positions[self._feature_offsets[address_id]:self._feature_offsets[address_id + 1]]
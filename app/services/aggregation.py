@@ -0,0 +1,118 @@
+"""
+Групповые агрегаты по атрибутам слоя.
+
+Значения колонки и зоны (округа, районы) кодируются целыми числами, и все
+группы считаются одним groupby по составному коду: число объектов, сумма,
+среднее и перцентили меры. Мера по умолчанию - площадь объекта в м².
+Площади и принадлежность объектов к зонам считаются один раз на версию слоя.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from app.services.layers import LayerEntry
+from app.services.projections import to_metric
+
+PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+# объекты обрабатываются порциями, чтобы не декодировать весь слой из mmap разом
+CHUNK_SIZE = 20000
+
+
+def _chunks(entry: LayerEntry):
+    for start in range(0, len(entry), CHUNK_SIZE):
+        yield np.arange(start, min(start + CHUNK_SIZE, len(entry)))
+
+
+def metric_areas(entry: LayerEntry) -> np.ndarray:
+    """Площади объектов слоя в м²."""
+    def build():
+        areas = np.zeros(len(entry))
+        for chunk in _chunks(entry):
+            areas[chunk] = shapely.area(to_metric(entry.geometries(chunk)))
+        return areas
+
+    return entry.derived("metric_areas", build)
+
+
+def zone_positions(entry: LayerEntry, zones: LayerEntry) -> np.ndarray:
+    """
+    Для каждого объекта - позиция зоны, в которую попадает его точка на поверхности, или -1.
+
+    Точка на общей границе двух зон относится к первой из них.
+    """
+    def build():
+        result = np.full(len(entry), -1, dtype=np.int64)
+        for chunk in _chunks(entry):
+            points = shapely.point_on_surface(entry.geometries(chunk))
+            point_index, positions = zones.locate(points)
+            _, first = np.unique(point_index, return_index=True)
+            result[chunk[point_index[first]]] = positions[first]
+        return result
+
+    return entry.derived(("zones", zones.file, zones.version), build)
+
+
+def _json_number(value) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value), 2)
+
+
+def _group_stats(frame: pd.DataFrame) -> pd.DataFrame:
+    grouped = frame.groupby("group", sort=True)["value"]
+    stats = pd.DataFrame({"count": grouped.size(), "sum": grouped.sum(min_count=1), "mean": grouped.mean()})
+    quantiles = grouped.quantile(list(PERCENTILES)).unstack()
+    for q in PERCENTILES:
+        stats[f"p{int(q * 100)}"] = quantiles[q]
+    return stats
+
+
+def _records(stats: pd.DataFrame, keys: Dict[str, list]) -> List[dict]:
+    metrics = [column for column in stats.columns if column != "count"]
+    records = []
+    for i, row in enumerate(stats.itertuples(index=False)):
+        record = {name: values[i] for name, values in keys.items()}
+        record["count"] = int(row.count)
+        record.update({metric: _json_number(getattr(row, metric)) for metric in metrics})
+        records.append(record)
+    return records
+
+
+def aggregate(entry: LayerEntry, column: str, measure: np.ndarray,
+              zones: Optional[Tuple[str, np.ndarray, pd.Series]] = None) -> dict:
+    """
+    Агрегаты меры по значениям column и, если заданы, по зонам.
+
+    zones - (имя ключа в ответе, позиция зоны каждого объекта, имена зон по позициям).
+    Пустые значения колонки и объекты вне зон образуют отдельные группы с null.
+    """
+    codes, categories = pd.factorize(entry.attributes[column], sort=True, use_na_sentinel=True)
+    # пустые значения - последняя категория
+    codes = np.where(codes < 0, len(categories), codes)
+    labels = categories.astype(object).tolist() + [None]
+
+    group = codes.astype(np.int64)
+    zone_count = 0
+    if zones is not None:
+        _, positions, names = zones
+        zone_count = len(names) + 1
+        group = group * zone_count + positions + 1
+
+    if not len(group):
+        # пустой слой: групп нет, итог нулевой
+        total = {"count": 0, "sum": None, "mean": None}
+        total.update({f"p{int(q * 100)}": None for q in PERCENTILES})
+        return {"groups": [], "total": total}
+
+    frame = pd.DataFrame({"group": group, "value": measure})
+    stats = _group_stats(frame)
+    index = stats.index.to_numpy()
+    keys = {"value": [labels[i] for i in (index // zone_count if zones is not None else index)]}
+    if zones is not None:
+        zone_names = [None] + names.astype(object).where(names.notna(), None).tolist()
+        keys[zones[0]] = [zone_names[i] for i in index % zone_count]
+
+    total = _group_stats(frame.assign(group=0))
+    return {"groups": _records(stats, keys), "total": _records(total, {})[0]}
@@ -0,0 +1,82 @@
+"""
+Хэш-индексы по ключевым атрибутам слоёв (кадастровые номера, UNOM).
+
+Точный поиск - словарь ключ -> позиции объектов, O(1) на ключ.
+Поиск по префиксу - бинарный поиск по отсортированным уникальным ключам,
+O(log n) на ключ плюс размер результата.
+"""
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# верхняя граница диапазона ключей с заданным префиксом
+_PREFIX_END = "\U0010ffff"
+
+
+def normalize_key(value) -> Optional[str]:
+    """Ключ как строка без пробелов по краям; 12345.0 и 12345 дают один ключ."""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return str(int(value))
+    key = str(value).strip()
+    return key or None
+
+
+class KeyIndex:
+    def __init__(self, values: pd.Series):
+        keys = pd.Series([normalize_key(value) for value in values.tolist()], dtype=object)
+        present = keys.notna().to_numpy()
+        positions = np.arange(len(keys))[present]
+        groups = pd.Series(positions).groupby(keys[present].to_numpy(), sort=True).indices
+        # позиции объектов по ключу; индексы групп указывают в массив positions
+        self._groups: Dict[str, np.ndarray] = {key: positions[index] for key, index in groups.items()}
+        self._sorted = np.array(list(self._groups), dtype=object)
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def exact(self, key) -> np.ndarray:
+        key = normalize_key(key)
+        return self._groups.get(key, np.zeros(0, dtype=np.int64)) if key is not None else np.zeros(0, dtype=np.int64)
+
+    def prefix(self, prefix, limit: Optional[int] = None) -> np.ndarray:
+        prefix = normalize_key(prefix)
+        if prefix is None:
+            return np.zeros(0, dtype=np.int64)
+        start = np.searchsorted(self._sorted, prefix, side="left")
+        stop = np.searchsorted(self._sorted, prefix + _PREFIX_END, side="left")
+        found: List[np.ndarray] = []
+        total = 0
+        for key in self._sorted[start:stop].tolist():
+            found.append(self._groups[key])
+            total += len(self._groups[key])
+            if limit is not None and total >= limit:
+                break
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        positions = np.concatenate(found)
+        return positions[:limit] if limit is not None else positions
+
+    def lookup(self, keys: List, prefix: bool = False, limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Позиции найденных объектов и номер ключа запроса для каждой из них.
+
+        limit ограничивает число объектов на один ключ.
+        """
+        positions: List[np.ndarray] = []
+        key_index: List[np.ndarray] = []
+        for i, key in enumerate(keys):
+            found = self.prefix(key, limit) if prefix else self.exact(key)[:limit]
+            positions.append(found)
+            key_index.append(np.full(len(found), i, dtype=np.int64))
+        if not positions:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(positions), np.concatenate(key_index)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import math
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# палитра matplotlib.colors.TABLEAU_COLORS; своя копия, чтобы не импортировать matplotlib ради десяти цветов
+TABLEAU_COLORS = (
+    "#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
+    "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf",
+)
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class ColorMap:
+    """
+    Палитра колонки слоя: значение -> номер категории -> цвет.
+
+    Категории упорядочены по значению (пропуски - последними), поэтому цвета
+    не зависят от порядка строк и совпадают между процессами и перезапусками.
+    Номера категорий для всей колонки считаются один раз.
+    """
+
+    def __init__(self, values: pd.Series, palette: Sequence[str]):
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        uniques = uniques.tolist() if hasattr(uniques, "tolist") else list(uniques)
+
+        def sort_key(i):
+            value = uniques[i]
+            return (_is_missing(value), value if not _is_missing(value) else 0)
+
+        order = list(range(len(uniques)))
+        try:
+            order.sort(key=sort_key)
+        except TypeError:
+            # смешанные типы в колонке - сортируем по строковому представлению
+            order.sort(key=lambda i: (_is_missing(uniques[i]), str(uniques[i])))
+
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        self.values: List = [None if _is_missing(uniques[i]) else uniques[i] for i in order]
+        self.colors = np.array([palette[i % len(palette)] for i in range(len(order))], dtype=object)
+        self.codes = rank[codes] if len(codes) else np.zeros(0, dtype=np.int64)
+
+    def category_codes(self, positions: Optional[np.ndarray] = None) -> pd.Series:
+        codes = self.codes if positions is None else self.codes[positions]
+        return pd.Series(codes)
+
+    def feature_colors(self, positions: Optional[np.ndarray] = None) -> pd.Series:
+        codes = self.codes if positions is None else self.codes[positions]
+        return pd.Series(self.colors[codes])
+
+    def legend(self) -> List[dict]:
+        return [
+            {"category": i, "value": value, "color": color}
+            for i, (value, color) in enumerate(zip(self.values, self.colors.tolist()))
+        ]
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import json
+import math
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import shapely
+from fastapi.responses import Response
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+FEATURE_PREFIX = '{"type":"Feature","geometry":'
+COLLECTION_PREFIX = '{"type":"FeatureCollection","features":['
+COLLECTION_SUFFIX = ']}'
+
+
+def _default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+_encode_string = json.encoder.encode_basestring
+
+
+def dumps_value(value) -> str:
+    # частые типы кодируем напрямую, минуя json.dumps
+    if isinstance(value, str):
+        return _encode_string(value)
+    if isinstance(value, bool) or value is None:
+        return json.dumps(value)
+    if isinstance(value, float):
+        # NaN/inf сериализуются в null, как это делал pydantic
+        return float.__repr__(value) if math.isfinite(value) else "null"
+    if isinstance(value, int):
+        return int.__repr__(value)
+    return json.dumps(value, ensure_ascii=False, default=_default)
+
+
+def encode_column(values) -> np.ndarray:
+    """Кодирует колонку в JSON, сериализуя каждое уникальное значение один раз."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    # код -1 (пропуск) указывает на последний элемент - null
+    encoded = np.array([dumps_value(value) for value in uniques.tolist()] + ["null"], dtype=object)
+    return encoded[codes]
+
+
+# shapely type id -> тип GeoJSON; LinearRing и GeometryCollection идут через __geo_interface__
+GEOMETRY_TYPES = {
+    0: "Point",
+    1: "LineString",
+    3: "Polygon",
+    4: "MultiPoint",
+    5: "MultiLineString",
+    6: "MultiPolygon",
+}
+
+
+def _format_floats(values: np.ndarray) -> np.ndarray:
+    # repr даёт кратчайшую запись числа - ровно как json.dumps и pydantic
+    return np.array(list(map(float.__repr__, values.tolist())), dtype=object)
+
+
+def _encode_geometry_group(geometries: np.ndarray, type_name: str, include_z: bool) -> Optional[np.ndarray]:
+    """
+    Кодирует геометрии одного типа через плоский массив координат.
+
+    Каждая координата форматируется один раз, а скобки вложенности
+    расставляются по смещениям колец/частей из to_ragged_array.
+    Возвращает None, если в группе есть пустые части.
+    """
+    _, coords, offsets = shapely.to_ragged_array(geometries, include_z=include_z)
+    depth = len(offsets)
+
+    # для каждого уровня вложенности - границы последовательностей в индексах координат
+    bounds = []
+    for level in range(depth):
+        if np.any(np.diff(offsets[level]) == 0):
+            return None
+        positions = offsets[level]
+        for lower in reversed(range(level)):
+            positions = offsets[lower][positions]
+        bounds.append(positions)
+    geometry_bounds = bounds[-1] if depth else np.arange(len(coords) + 1)
+
+    closing = np.zeros(len(coords), dtype=np.intp)
+    for positions in bounds:
+        closing[positions[1:] - 1] += 1
+    separators = np.array(["]" * k + "," + "[" * k for k in range(depth)] + ["]" * depth], dtype=object)
+
+    tokens = "[" + _format_floats(coords[:, 0]) + "," + _format_floats(coords[:, 1])
+    if include_z:
+        tokens = tokens + "," + _format_floats(coords[:, 2])
+    tokens = tokens + "]" + separators[closing]
+
+    prefix = '{"type":"%s","coordinates":' % type_name + "[" * depth
+    starts = geometry_bounds[:-1].tolist()
+    ends = geometry_bounds[1:].tolist()
+    return np.array(
+        [prefix + "".join(tokens[start:end].tolist()) + "}" for start, end in zip(starts, ends)],
+        dtype=object,
+    )
+
+
+def _encode_geometry_fallback(geometries: np.ndarray) -> np.ndarray:
+    return np.array(
+        [json.dumps(geom.__geo_interface__, ensure_ascii=False, separators=(",", ":")) for geom in geometries],
+        dtype=object,
+    )
+
+
+def encode_geometries(geometries) -> np.ndarray:
+    """Кодирует геометрии в GeoJSON с тем же форматом чисел, что и __geo_interface__ + json."""
+    geometries = np.asarray(geometries, dtype=object)
+    encoded = np.full(len(geometries), "null", dtype=object)
+
+    missing = shapely.is_missing(geometries)
+    empty = ~missing & shapely.is_empty(geometries)
+    type_ids = shapely.get_type_id(geometries)
+    has_z = shapely.has_z(geometries)
+
+    if empty.any():
+        encoded[empty] = _encode_geometry_fallback(geometries[empty])
+
+    regular = ~missing & ~empty
+    for type_id in np.unique(type_ids[regular]).tolist():
+        for include_z in (False, True):
+            mask = regular & (type_ids == type_id) & (has_z == include_z)
+            if not mask.any():
+                continue
+            group = geometries[mask]
+            type_name = GEOMETRY_TYPES.get(type_id)
+            result = _encode_geometry_group(group, type_name, include_z) if type_name else None
+            encoded[mask] = result if result is not None else _encode_geometry_fallback(group)
+    return encoded
+
+
+def encode_features(gdf: gpd.GeoDataFrame, extra: Optional[Dict[str, pd.Series]] = None,
+                    geometries: Optional[np.ndarray] = None,
+                    fields: Optional[List[str]] = None) -> np.ndarray:
+    """
+    Возвращает массив строк GeoJSON Feature - по одной на строку GeoDataFrame.
+
+    Геометрия и атрибуты кодируются поколоночно, без iterrows и pydantic.
+    Колонки из extra дописываются в properties после колонок слоя,
+    geometries подменяет геометрию слоя (например, упрощённой),
+    fields ограничивает набор кодируемых колонок слоя.
+    """
+    if fields is None:
+        fields = [col for col in gdf.columns if col != gdf.geometry.name]
+    columns = [(col, gdf[col]) for col in fields]
+    if extra:
+        columns += list(extra.items())
+    if geometries is None:
+        geometries = gdf.geometry.values
+
+    return FEATURE_PREFIX + encode_geometries(geometries) + ',"properties":' + encode_records(columns, len(geometries)) + "}"
+
+
+def dumps_compact(value) -> str:
+    """Произвольное JSON-значение (словарь, список) с компактными разделителями, как и остальное тело ответа."""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default)
+
+
+def encode_records(columns: List[Tuple[str, pd.Series]], length: int) -> np.ndarray:
+    """JSON-объекты {"колонка": значение, ...} - по одному на строку, поколоночно."""
+    parts = np.full(length, "{", dtype=object)
+    for i, (col, values) in enumerate(columns):
+        key = ("," if i else "") + json.dumps(str(col), ensure_ascii=False) + ":"
+        parts = parts + key + encode_column(values)
+    return parts + "}"
+
+
+def collection_prefix(members: Optional[Dict[str, Any]] = None) -> str:
+    """Начало FeatureCollection; members - дополнительные поля верхнего уровня (например, легенда)."""
+    if not members:
+        return COLLECTION_PREFIX
+    encoded = "".join(json.dumps(key, ensure_ascii=False) + ":" + dumps_compact(value) + "," for key, value in members.items())
+    return '{"type":"FeatureCollection",' + encoded + '"features":['
+
+
+def dump_feature_collection(gdf: gpd.GeoDataFrame, extra: Optional[Dict[str, pd.Series]] = None,
+                            geometries: Optional[np.ndarray] = None,
+                            fields: Optional[List[str]] = None,
+                            members: Optional[Dict[str, Any]] = None) -> bytes:
+    prefix = collection_prefix(members)
+    if len(gdf) == 0:
+        return (prefix + COLLECTION_SUFFIX).encode("utf-8")
+    features = encode_features(gdf, extra, geometries, fields)
+    return (prefix + ",".join(features) + COLLECTION_SUFFIX).encode("utf-8")
+
+
+def iter_feature_collection(gdf: gpd.GeoDataFrame, extra: Optional[Dict[str, pd.Series]] = None,
+                            geometries: Optional[np.ndarray] = None,
+                            chunk_size: int = 5000,
+                            fields: Optional[List[str]] = None,
+                            members: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """
+    Отдаёт FeatureCollection частями по chunk_size объектов.
+
+    Одновременно в памяти держится только текущая часть, поэтому расход
+    памяти на запрос не зависит от размера слоя.
+    """
+    yield collection_prefix(members).encode("utf-8")
+    for start in range(0, len(gdf), chunk_size):
+        stop = start + chunk_size
+        chunk_extra = {key: values.iloc[start:stop] for key, values in extra.items()} if extra else None
+        chunk_geometries = geometries[start:stop] if geometries is not None else None
+        features = encode_features(gdf.iloc[start:stop], chunk_extra, chunk_geometries, fields)
+        yield (("," if start else "") + ",".join(features)).encode("utf-8")
+    yield COLLECTION_SUFFIX.encode("utf-8")
+
+
+class GeoJSONResponse(Response):
+    """Готовые байты FeatureCollection без повторной валидации через response_model."""
+
+    media_type = "application/json"
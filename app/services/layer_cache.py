@@ -0,0 +1,151 @@
+"""
+Колоночный дисковый кэш подготовленных слоёв.
+
+Для каждого слоя хранится каталог:
+    meta.json       - подпись исходника (mtime, размер, кодировка), CRS, порядок колонок
+    geometry.wkb    - геометрии в WKB подряд
+    offsets.npy     - смещения WKB каждой геометрии (int64, n + 1)
+    bounds.npy      - габариты геометрий (float64, n x 4)
+    attributes.pkl  - атрибуты без геометрии (pandas pickle, блоки колонок)
+
+Кэш пересобирается, только когда меняется mtime или размер .shp/.dbf.
+
+Геометрии, смещения и габариты открываются через mmap только для чтения:
+все процессы сервиса разделяют одни и те же страницы в page cache ОС,
+а в памяти процесса декодируются только нужные в запросе геометрии.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import TYPE_CHECKING, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import shapely
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+CACHE_FORMAT = 2
+SOURCE_SUFFIXES = (".shp", ".dbf")
+
+
+class MappedGeometries:
+    """Геометрии слоя в WKB, отображённые в память только для чтения."""
+
+    def __init__(self, path: str):
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.bounds = np.load(os.path.join(path, "bounds.npy"), mmap_mode="r")
+        size = int(self.offsets[-1])
+        if os.path.getsize(os.path.join(path, "geometry.wkb")) != size:
+            raise ValueError(f"Geometry file in {path} does not match its offsets")
+        # mmap нулевой длины не создаётся: слой без геометрий
+        self.blob = np.memmap(os.path.join(path, "geometry.wkb"), dtype=np.uint8, mode="r") if size else np.zeros(0, np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def take(self, positions: Optional[Sequence[int]] = None) -> np.ndarray:
+        """Декодирует геометрии по позициям (все, если positions=None) в массив shapely."""
+        if positions is None:
+            return decode_wkb(self.blob, self.offsets)
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = self.offsets[positions].tolist()
+        ends = self.offsets[positions + 1].tolist()
+        blob = self.blob
+        wkb = np.array([blob[a:b].tobytes() if b > a else None for a, b in zip(starts, ends)], dtype=object)
+        return shapely.from_wkb(wkb)
+
+    def wkb(self) -> np.ndarray:
+        """WKB каждой геометрии как bytes (None - отсутствующая), без декодирования."""
+        bounds = np.asarray(self.offsets).tolist()
+        blob = self.blob
+        return np.array([blob[a:b].tobytes() if b > a else None for a, b in zip(bounds[:-1], bounds[1:])], dtype=object)
+
+
+class LayerDiskCache:
+    def __init__(self, source_dir: str, cache_dir: str):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+
+    def path(self, file: str) -> str:
+        return os.path.join(self.cache_dir, os.path.splitext(file)[0])
+
+    def signature(self, file: str, encode: str) -> dict:
+        source = os.path.join(self.source_dir, file)
+        base = os.path.splitext(source)[0]
+        signature = {"format": CACHE_FORMAT, "encoding": encode}
+        for suffix in SOURCE_SUFFIXES:
+            stat = os.stat(base + suffix)
+            signature[suffix] = [stat.st_mtime_ns, stat.st_size]
+        return signature
+
+    def read(self, file: str, encode: str,
+             signature: Optional[dict] = None) -> Optional[Tuple[pd.DataFrame, MappedGeometries, Optional[str]]]:
+        """
+        Атрибуты, отображённые в память геометрии и CRS слоя или None, если кэш устарел.
+
+        signature - нужная версия исходника; по умолчанию - текущая подпись файлов.
+        """
+        path = self.path(file)
+        try:
+            with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("signature") != (signature if signature is not None else self.signature(file, encode)):
+            return None
+
+        geometries = MappedGeometries(path)
+        if len(geometries) != meta["rows"]:
+            return None
+
+        attributes = pd.read_pickle(os.path.join(path, "attributes.pkl"))
+        return attributes, geometries, meta["crs"]
+
+    def write(self, file: str, encode: str, gdf: gpd.GeoDataFrame, signature: dict) -> None:
+        """
+        Записывает подготовленный слой. signature - подпись исходника, снятая до его чтения:
+        если файл изменился во время загрузки, кэш сразу окажется устаревшим.
+        """
+        path = self.path(file)
+        os.makedirs(path, exist_ok=True)
+        # каждый файл пишется во временный и подменяется атомарно; meta.json - последним
+        suffix = f".tmp{os.getpid()}"
+
+        blob, offsets = encode_wkb(gdf.geometry.values)
+        with open(os.path.join(path, "geometry.wkb" + suffix), "wb") as f:
+            f.write(blob)
+        with open(os.path.join(path, "offsets.npy" + suffix), "wb") as f:
+            np.save(f, offsets)
+        with open(os.path.join(path, "bounds.npy" + suffix), "wb") as f:
+            np.save(f, shapely.bounds(np.asarray(gdf.geometry.values, dtype=object)))
+        gdf.drop(columns=gdf.geometry.name).to_pickle(os.path.join(path, "attributes.pkl" + suffix))
+
+        meta = {
+            "signature": signature,
+            "crs": gdf.crs.to_string() if gdf.crs is not None else None,
+            "columns": list(gdf.columns),
+            "rows": len(gdf),
+        }
+        with open(os.path.join(path, "meta.json" + suffix), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        for name in ("geometry.wkb", "offsets.npy", "bounds.npy", "attributes.pkl", "meta.json"):
+            os.replace(os.path.join(path, name + suffix), os.path.join(path, name))
+
+
+def encode_wkb(geometries):
+    wkb = shapely.to_wkb(np.asarray(geometries, dtype=object))
+    lengths = np.array([len(item) if item is not None else 0 for item in wkb], dtype=np.int64)
+    offsets = np.zeros(len(wkb) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return b"".join(item for item in wkb if item is not None), offsets
+
+
+def decode_wkb(blob, offsets: np.ndarray) -> np.ndarray:
+    bounds = np.asarray(offsets).tolist()
+    # пустой отрезок - отсутствующая геометрия
+    wkb = np.array([bytes(blob[a:b]) if b > a else None for a, b in zip(bounds[:-1], bounds[1:])], dtype=object)
+    return shapely.from_wkb(wkb)
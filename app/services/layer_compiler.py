@@ -0,0 +1,79 @@
+"""
+Сборка подготовленных слоёв на этапе сборки образа или деплоя.
+
+Каждый слой перечитывается из shapefile, перепроецируется в WGS-84,
+очищается от пустых колонок и записывается в дисковый кэш LayerStore
+(WKB, смещения, габариты для пространственного индекса, атрибуты).
+После сборки сервер при старте только отображает эти файлы в память.
+"""
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+import shapely
+from loguru import logger
+
+from app.services.layers import LayerStore
+
+
+def artifact_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file()) if os.path.isdir(path) else 0
+
+
+def compile_layer(store: LayerStore, file: str, encode: str, force: bool = False) -> dict:
+    """Собирает слой в дисковый кэш (если он устарел или force) и проверяет, что результат читается."""
+    cache = store.disk_cache
+    started = time.perf_counter()
+    # подпись снимается до чтения исходника, как в LayerStore.build
+    signature = store.source_signature(file, encode)
+    if signature is None:
+        return {"file": file, "status": "missing"}
+
+    status = "up-to-date"
+    if force or cache.read(file, encode) is None:
+        cache.write(file, encode, store.prepare(file, encode), signature)
+        status = "compiled"
+
+    layer = cache.read(file, encode)
+    if layer is None:
+        raise ValueError(f"Compiled layer {file} does not match its source")
+    attributes, geometries, _ = layer
+    decoded = geometries.take()
+    missing = shapely.is_missing(decoded)
+    bounds = np.asarray(geometries.bounds)
+    bounds = bounds[np.isfinite(bounds).all(axis=1)]
+    extent = None
+    if len(bounds):
+        extent = np.concatenate([bounds[:, :2].min(axis=0), bounds[:, 2:].max(axis=0)]).round(6).tolist()
+    return {
+        "file": file,
+        "status": status,
+        "features": len(attributes),
+        "columns": len(attributes.columns),
+        # невалидные геометрии не исправляются, чтобы не менять выдачу, - только учитываются
+        "invalid": int((~shapely.is_valid(decoded) & ~missing).sum()),
+        "empty": int((missing | shapely.is_empty(decoded)).sum()),
+        "extent": extent,
+        "bytes": artifact_size(cache.path(file)),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def compile_layers(store: LayerStore, jobs: List[Tuple[str, str]], force: bool = False, workers: int = 1) -> List[dict]:
+    def run(job):
+        file, encode = job
+        try:
+            report = compile_layer(store, file, encode, force)
+        except Exception as e:
+            logger.error(f"Layer {file} failed to compile: {e}")
+            return {"file": file, "status": "failed", "error": str(e)}
+        logger.info(f"Layer {file}: {report['status']}")
+        return report
+
+    # чтение shapefile и кодирование WKB в основном отпускают GIL - как и при прогреве, хватает потоков
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        return list(executor.map(run, jobs))
@@ -0,0 +1,185 @@
+"""
+Версии слоёв и изменения между ними по объектам.
+
+Объект слоя определяется естественным ключом (кадастровый номер, unom,
+objectid), его содержимое - 64-битным хэшем атрибутов и WKB геометрии.
+Для каждого слоя хранится каталог:
+    history.json    - номер версии, подпись исходника, ключ, сохранённые версии
+    <version>.pkl   - снимок версии: хэши объектов с ключом в индексе (pandas pickle)
+
+Номер версии растёт, только когда меняется хотя бы один объект, и не
+сбрасывается при перезапуске и пересборке кэша слоёв. Изменения с версии
+клиента считаются сравнением двух снимков; если версия клиента уже не
+хранится, клиент получает слой целиком.
+"""
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from app.services.layers import LayerEntry
+
+HISTORY_FORMAT = 1
+# множитель для смешивания хэша атрибутов и хэша геометрии (переполнение uint64 ожидаемо)
+MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def feature_ids(entry: LayerEntry, key: Optional[str]) -> pd.Index:
+    """
+    Ключи объектов в порядке позиций слоя.
+
+    Без ключевой колонки ключ - позиция объекта. Повторы ключа получают
+    суффикс #2, #3... в порядке позиций, чтобы каждый объект оставался адресуемым.
+    """
+    if key is None:
+        return pd.Index(np.arange(len(entry)).astype(str))
+    ids = entry.attributes[key].astype(object).where(entry.attributes[key].notna(), "").astype(str)
+    ids = ids.reset_index(drop=True)
+    repeat = ids.groupby(ids).cumcount()
+    duplicated = repeat > 0
+    if duplicated.any():
+        ids[duplicated] = ids[duplicated] + "#" + (repeat[duplicated] + 1).astype(str)
+    return pd.Index(ids)
+
+
+def feature_hashes(entry: LayerEntry) -> np.ndarray:
+    """Хэш каждого объекта: значения и имена атрибутов плюс WKB геометрии."""
+    attributes = pd.util.hash_pandas_object(entry.attributes, index=False).to_numpy()
+    # переименование или удаление колонки меняет все объекты слоя
+    schema = pd.util.hash_array(np.array(["\x00".join(map(str, entry.attributes.columns))], dtype=object))[0]
+    geometries = pd.util.hash_pandas_object(pd.Series(entry.wkb(), dtype=object), index=False).to_numpy()
+    return (attributes ^ schema) * MIX + geometries
+
+
+def snapshot(entry: LayerEntry, key: Optional[str]) -> pd.Series:
+    return pd.Series(feature_hashes(entry), index=feature_ids(entry, key), name="hash")
+
+
+@dataclass
+class LayerDelta:
+    """Изменения слоя с версии since до version; reset - клиенту нужен весь слой."""
+
+    version: int
+    since: int
+    reset: bool
+    added: np.ndarray
+    changed: np.ndarray
+    removed: list
+
+
+class LayerHistory:
+    """
+    Версии слоёв на диске.
+
+    Запись защищена блокировкой файла, поэтому одну историю могут вести
+    несколько процессов сервиса. Хранится не больше size последних снимков.
+    """
+
+    def __init__(self, root: str, size: int = 20):
+        self.root = root
+        self.size = size
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def path(self, file: str) -> str:
+        return os.path.join(self.root, os.path.splitext(file)[0])
+
+    @contextmanager
+    def _locked(self, file: str):
+        with self._locks_guard:
+            lock = self._locks.setdefault(file, threading.Lock())
+        path = self.path(file)
+        os.makedirs(path, exist_ok=True)
+        with lock, open(os.path.join(path, "history.lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield path
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def state(self, file: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.path(file), "history.json"), encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return state if state.get("format") == HISTORY_FORMAT else None
+
+    def load(self, file: str, version: int) -> Optional[pd.Series]:
+        try:
+            return pd.read_pickle(os.path.join(self.path(file), f"{version}.pkl"))
+        except (OSError, ValueError, EOFError):
+            return None
+
+    def record(self, entry: LayerEntry, key: Optional[str]) -> int:
+        """
+        Номер версии данных entry.
+
+        Новая версия записывается, только если объекты отличаются от последнего снимка;
+        для уже учтённой подписи исходника объекты не перечитываются.
+        """
+        with self._locked(entry.file) as path:
+            state = self.state(entry.file)
+            if state is not None and state["key"] == key and state["signature"] == entry.signature:
+                return state["version"]
+
+            current = snapshot(entry, key)
+            if state is not None and state["key"] == key:
+                latest = self.load(entry.file, state["version"])
+                if latest is not None and latest.index.equals(current.index) and np.array_equal(latest.values, current.values):
+                    state["signature"] = entry.signature
+                    self._write_state(path, state)
+                    return state["version"]
+
+            version = state["version"] + 1 if state is not None else 1
+            # со сменой ключа старые снимки несравнимы с новыми - остаётся только номер версии
+            versions = state["versions"] if state is not None and state["key"] == key else []
+            versions = versions + [version]
+            current.to_pickle(os.path.join(path, f"{version}.pkl.tmp{os.getpid()}"))
+            os.replace(os.path.join(path, f"{version}.pkl.tmp{os.getpid()}"), os.path.join(path, f"{version}.pkl"))
+            self._write_state(path, {"format": HISTORY_FORMAT, "version": version, "signature": entry.signature,
+                                     "key": key, "versions": versions[-self.size:]})
+            for old in versions[:-self.size]:
+                try:
+                    os.remove(os.path.join(path, f"{old}.pkl"))
+                except OSError:
+                    pass
+            return version
+
+    def _write_state(self, path: str, state: dict) -> None:
+        target = os.path.join(path, "history.json")
+        with open(target + f".tmp{os.getpid()}", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(target + f".tmp{os.getpid()}", target)
+
+    def stored(self, file: str, version: int) -> bool:
+        """Хранится ли снимок версии: с неё можно отдать изменения, а не весь слой."""
+        state = self.state(file)
+        return state is not None and version in state["versions"]
+
+    def delta(self, entry: LayerEntry, version: int, since: int) -> LayerDelta:
+        """Позиции добавленных и изменённых объектов entry (версии version) и ключи удалённых с версии since."""
+        current = self.load(entry.file, version)
+        previous = self.load(entry.file, since) if 0 < since < version else None
+        if current is None or len(current) != len(entry) or (since != version and previous is None):
+            # версия клиента неизвестна или уже удалена: отдаём слой целиком, как для since=0
+            return LayerDelta(version, 0, since != 0, np.arange(len(entry)), np.zeros(0, np.int64), [])
+        if since == version:
+            return LayerDelta(version, since, False, np.zeros(0, np.int64), np.zeros(0, np.int64), [])
+
+        matched = previous.index.get_indexer(current.index)
+        known = matched >= 0
+        added = np.flatnonzero(~known)
+        changed = np.flatnonzero(known)
+        changed = changed[previous.values[matched[changed]] != current.values[changed]]
+        removed = previous.index[~previous.index.isin(current.index)].tolist()
+        return LayerDelta(version, since, False, added, changed, removed)
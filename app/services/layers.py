@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from loguru import logger
+
+from app.services.address_index import AddressIndex
+from app.services.attribute_index import KeyIndex
+from app.services.layer_cache import SOURCE_SUFFIXES
+from app.services.topojson import FULL_PRECISION, Topology
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+    from app.services.layer_cache import LayerDiskCache, MappedGeometries
+
+TARGET_CRS = "EPSG:4326"
+# сколько раз первая загрузка ждёт, пока исходник перестанет меняться
+STABLE_ATTEMPTS = 5
+
+# уровни пирамиды упрощённых геометрий; при зуме выше последнего отдаётся исходная точность
+ZOOM_LEVELS = (6, 8, 10, 12, 14)
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """Допуск упрощения в градусах - половина пикселя тайла 256px на заданном зуме."""
+    return 360.0 / (256 * 2 ** zoom) / 2
+
+
+def zoom_level(zoom: Optional[int]) -> Optional[int]:
+    """Уровень пирамиды для зума карты; None - нужна исходная точность."""
+    if zoom is None:
+        return None
+    return next((level for level in ZOOM_LEVELS if zoom <= level), None)
+
+
+def remove_empty_and_zero_columns(gdf):
+    non_empty_columns = [col for col in gdf.columns if gdf[col].notnull().any()]
+    non_zero_columns = [col for col in non_empty_columns if not ((gdf[col] == 0) | (gdf[col] == 0.0)).all()]
+    gdf = gdf[non_zero_columns]
+    return gdf
+
+
+class GeometryView:
+    """Ленивая выборка геометрий слоя: срезы декодируются по мере обращения."""
+
+    def __init__(self, entry: LayerEntry, positions: Optional[np.ndarray] = None):
+        self.entry = entry
+        self.positions = positions
+
+    def __len__(self) -> int:
+        return len(self.entry) if self.positions is None else len(self.positions)
+
+    def __getitem__(self, key: slice) -> np.ndarray:
+        if self.positions is not None:
+            return self.entry.geometries(self.positions[key])
+        return self.entry.geometries(np.arange(len(self.entry))[key])
+
+    def __array__(self, dtype=None, copy=None):
+        return self.entry.geometries(self.positions)
+
+
+class LayerEntry:
+    """
+    Слой, подготовленный для выдачи: уже в WGS-84 и без пустых колонок.
+
+    Атрибуты хранятся в памяти процесса, геометрии - либо массивом shapely,
+    либо в отображённом в память файле дискового кэша (MappedGeometries),
+    общем для всех процессов сервиса.
+    """
+
+    def __init__(self, file: str, attributes: pd.DataFrame, geometries: Union[np.ndarray, MappedGeometries],
+                 version: int, crs: Optional[str] = None, source: str = "shapefile", load_seconds: float = 0.0,
+                 encode: str = 'cp1251', signature: Optional[dict] = None):
+        self.file = file
+        self.encode = encode
+        # подпись исходника (mtime и размер .shp/.dbf), из которого построена версия
+        self.signature = signature
+        self.attributes = attributes
+        self._geometries = geometries
+        self.crs = crs
+        self.version = version
+        # откуда прочитан слой (shapefile или cache) и сколько заняла загрузка
+        self.source = source
+        self.load_seconds = load_seconds
+        self.columns: List[str] = list(attributes.columns)
+        self.loaded_at = time.time()
+        # производные данные (карты цветов, индексы), живут столько же, сколько версия слоя
+        self._derived: Dict[Hashable, Any] = {}
+        # RLock: производное значение может строиться из других производных того же слоя
+        self._derived_lock = threading.RLock()
+        # пространственный индекс строится один раз вместе со слоем - по габаритам,
+        # чтобы не держать в памяти все геометрии ради индекса
+        bounds = np.asarray(self.bounds)
+        boxes = shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+        boxes[np.isnan(bounds).any(axis=1)] = None
+        self.tree = shapely.STRtree(boxes)
+
+    def __len__(self) -> int:
+        return len(self.attributes)
+
+    @property
+    def mapped(self) -> bool:
+        return not isinstance(self._geometries, np.ndarray)
+
+    @property
+    def bounds(self) -> np.ndarray:
+        if self.mapped:
+            return self._geometries.bounds
+        return self.derived("bounds", lambda: shapely.bounds(self._geometries))
+
+    def geometries(self, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Геометрии по позициям (все, если positions=None); из mmap декодируются на лету."""
+        if self.mapped:
+            return self._geometries.take(positions)
+        return self._geometries if positions is None else self._geometries[positions]
+
+    def wkb(self) -> np.ndarray:
+        """WKB всех геометрий; отображённый слой отдаёт байты из кэша без декодирования."""
+        if self.mapped:
+            return self._geometries.wkb()
+        return shapely.to_wkb(self._geometries)
+
+    def query(self, bbox: Tuple[float, float, float, float]) -> np.ndarray:
+        """Позиции объектов, пересекающих bbox (minx, miny, maxx, maxy), по возрастанию."""
+        box = shapely.box(*bbox)
+        candidates = self.tree.query(box)
+        candidates.sort()
+        # индекс по габаритам даёт кандидатов, точная проверка - по самим геометриям
+        return candidates[shapely.intersects(self.geometries(candidates), box)]
+
+    def locate(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Пары (индекс точки, позиция объекта) для объектов, содержащих точки.
+
+        Один запрос к индексу на весь массив точек; геометрии-кандидаты
+        декодируются и подготавливаются один раз, даже если попали под много точек.
+        Пары упорядочены по точке, затем по позиции объекта.
+        """
+        point_index, candidates = self.tree.query(points)
+        if not len(candidates):
+            return point_index, candidates
+        unique, inverse = np.unique(candidates, return_inverse=True)
+        geometries = self.geometries(unique)
+        shapely.prepare(geometries)
+        keep = shapely.intersects(geometries[inverse], points[point_index])
+        point_index, candidates = point_index[keep], candidates[keep]
+        order = np.lexsort((candidates, point_index))
+        return point_index[order], candidates[order]
+
+    def key_index(self, column: str) -> KeyIndex:
+        """Хэш-индекс по ключевой колонке, строится один раз на версию слоя."""
+        return self.derived(("key_index", column), lambda: KeyIndex(self.attributes[column]))
+
+    def address_index(self, column: str) -> AddressIndex:
+        """Токенный индекс адресов; при перезагрузке слоя строится заново только для него."""
+        return self.derived(("address_index", column), lambda: AddressIndex(self.attributes[column]))
+
+    def topology(self, level: Optional[int]) -> Topology:
+        """
+        Топология слоя для уровня пирамиды: сетка и упрощение дуг - полпикселя уровня;
+        None - без упрощения, на сетке FULL_PRECISION. Строится один раз на уровень.
+        """
+        if level is None:
+            return self.derived(("topology", None), lambda: Topology.build(self.geometries(), FULL_PRECISION))
+        return self.derived(("topology", level), lambda: Topology.build(
+            self.geometries(), zoom_tolerance(level), tolerance=1
+        ))
+
+    def geometries_for_zoom(self, zoom: Optional[int]) -> Optional[np.ndarray]:
+        """
+        Геометрии уровня пирамиды для зума или None, если нужна исходная точность.
+
+        Уровень строится при первом обращении и живёт вместе с версией слоя.
+        Геометрии собираются из упрощённых дуг топологии уровня, поэтому общие
+        границы смежных объектов (зоны, подзоны, кварталы) упрощаются одинаково.
+        Объекты, которые в топологии выродились, упрощаются по отдельности.
+        """
+        level = zoom_level(zoom)
+        if level is None:
+            return None
+        return self.derived(("pyramid", level), lambda: self.topology(level).shapes(
+            lambda positions: shapely.simplify(self.geometries(positions), zoom_tolerance(level), preserve_topology=True)
+        ))
+
+    def derived(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        value = self._derived.get(key)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = factory()
+                    self._derived[key] = value
+        return value
+
+
+class StaleLayerError(LookupError):
+    """Запрошенной версии слоя нет ни в памяти процесса, ни в дисковом кэше - её уже заменила новая."""
+
+
+class LayerStore:
+    """
+    Хранилище подготовленных слоёв.
+
+    Слой читается, перепроецируется и очищается один раз на версию,
+    после чего запросы получают готовый GeoDataFrame без пересчётов.
+
+    Новая версия слоя строится рядом со старой и подменяет её одной записью
+    в словаре: запросы, уже получившие LayerEntry, дорабатывают со своей версией.
+    """
+
+    def __init__(self, loader: Callable[[str, str], gpd.GeoDataFrame], disk_cache: Optional[LayerDiskCache] = None,
+                 compiled_only: bool = False, settle: float = 0.0):
+        self._loader = loader
+        self.disk_cache = disk_cache
+        # сколько секунд исходник не должен меняться, прежде чем его читать (как две проверки LayerWatcher)
+        self.settle = settle
+        # только собранные заранее слои (compile_layers.py): shapefile в процессе сервера не разбирается
+        self.compiled_only = compiled_only and disk_cache is not None
+        self._entries: Dict[str, LayerEntry] = {}
+        self._versions: Dict[str, int] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, hit: bool) -> None:
+        # счётчики меняют потоки всех запросов, без блокировки инкременты теряются
+        with self._guard:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _lock_for(self, file: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(file, threading.Lock())
+
+    def prepare(self, file: str, encode: str) -> gpd.GeoDataFrame:
+        gdf = self._loader(file, encode)
+        gdf = gdf.to_crs(TARGET_CRS)
+        return remove_empty_and_zero_columns(gdf)
+
+    def source_signature(self, file: str, encode: str) -> Optional[dict]:
+        if self.disk_cache is None:
+            return None
+        try:
+            return self.disk_cache.signature(file, encode)
+        except OSError:
+            return None
+
+    def stable_signature(self, file: str, encode: str) -> Optional[dict]:
+        """
+        Подпись исходника, который не менялся хотя бы settle секунд.
+
+        Первая загрузка слоя ждёт так же, как LayerWatcher ждёт двух одинаковых
+        проверок, поэтому не читает файл, который ещё копируется.
+        """
+        signature = self.source_signature(file, encode)
+        for _ in range(STABLE_ATTEMPTS):
+            if signature is None:
+                return None
+            age = time.time() - max(signature[suffix][0] for suffix in SOURCE_SUFFIXES) / 1e9
+            if age >= self.settle:
+                return signature
+            time.sleep(min(self.settle - age, self.settle))
+            signature = self.source_signature(file, encode)
+        raise ValueError(f"Source of layer {file} keeps changing")
+
+    def build(self, file: str, encode: str, signature: Optional[dict] = None) -> LayerEntry:
+        """
+        Новая версия слоя из дискового кэша или исходника.
+
+        С signature строится ровно эта версия и только из дискового кэша;
+        если кэш уже содержит другую, выбрасывается StaleLayerError.
+        """
+        started = time.perf_counter()
+        exact = signature is not None
+        if not exact:
+            # подпись снимается до чтения: если файл изменится во время загрузки, версия окажется устаревшей
+            signature = self.stable_signature(file, encode)
+        layer = None
+        source = "cache"
+        if self.disk_cache is not None:
+            try:
+                layer = self.disk_cache.read(file, encode, signature)
+            except Exception as e:
+                logger.warning(f"Layer cache for {file} is unreadable, rebuilding: {e}")
+        if layer is None and exact:
+            raise StaleLayerError(f"Layer {file} of the requested version is not in the disk cache")
+        if layer is None and self.compiled_only:
+            raise ValueError(f"Layer {file} is not compiled or its cache is stale, run compile_layers.py")
+        if layer is None:
+            source = "shapefile"
+            gdf = self.prepare(file, encode)
+            if self.source_signature(file, encode) != signature:
+                # прочитана смесь старого и нового файла - такую версию не отдаём и не кэшируем
+                raise ValueError(f"Source of layer {file} changed while loading")
+            if self.disk_cache is not None:
+                try:
+                    self.disk_cache.write(file, encode, gdf, signature)
+                    # сразу переходим на отображённый файл, чтобы не держать свою копию геометрий
+                    layer = self.disk_cache.read(file, encode)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not write layer cache for {file}: {e}")
+            if layer is None:
+                attributes = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+                crs = gdf.crs.to_string() if gdf.crs is not None else None
+                layer = attributes, np.asarray(gdf.geometry.values, dtype=object), crs
+        attributes, geometries, crs = layer
+        load_seconds = time.perf_counter() - started
+        logger.info(f"Layer {file} loaded from {source} in {load_seconds:.2f} s")
+        version = self._versions.get(file, 0) + 1
+        return LayerEntry(file, attributes, geometries, version, crs=crs, source=source, load_seconds=load_seconds,
+                          encode=encode, signature=signature)
+
+    def _swap(self, entry: LayerEntry) -> None:
+        self._versions[entry.file] = entry.version
+        self._entries[entry.file] = entry
+
+    def get(self, file: str, encode: str = 'cp1251', signature: Optional[dict] = None) -> LayerEntry:
+        """
+        Готовый слой. Загруженный слой с исходником не сверяется - новые версии загружает
+        LayerWatcher; первая загрузка ждёт, пока исходник перестанет меняться (stable_signature).
+
+        signature - подпись слоя, по которой основной процесс посчитал ETag ответа.
+        Процесс пула с другой версией (или ещё без слоя) читает ровно эту версию
+        из дискового кэша, а если её там уже нет - выбрасывает StaleLayerError.
+        """
+        entry = self._entries.get(file)
+        if entry is not None and (signature is None or entry.signature == signature):
+            self._count(True)
+            return entry
+
+        # один поток строит слой, остальные ждут готовый результат
+        with self._lock_for(file):
+            entry = self._entries.get(file)
+            if entry is not None and (signature is None or entry.signature == signature):
+                self._count(True)
+                return entry
+            self._count(False)
+            entry = self.build(file, encode, signature)
+            self._swap(entry)
+            return entry
+
+    def reload(self, file: str, encode: str, prepare: Optional[Callable[[str, LayerEntry], None]] = None) -> LayerEntry:
+        """
+        Строит новую версию слоя и подменяет ею текущую.
+
+        Пока версия строится (вместе с индексами и палитрами из prepare),
+        запросы получают прежнюю, поэтому простоя и одновременной сборки
+        слоя многими запросами не бывает.
+        """
+        with self._lock_for(file):
+            entry = self.build(file, encode)
+            if prepare is not None:
+                prepare(file, entry)
+            self._swap(entry)
+            return entry
+
+    def peek(self, file: str) -> Optional[LayerEntry]:
+        return self._entries.get(file)
+
+    def loaded(self) -> Dict[str, LayerEntry]:
+        return dict(self._entries)
+
+    def invalidate(self, file: Optional[str] = None) -> None:
+        with self._guard:
+            if file is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(file, None)
+
+    def stats(self) -> dict:
+        with self._guard:
+            hits, misses = self.hits, self.misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "layers": {
+                file: {
+                    "version": entry.version,
+                    "features": len(entry),
+                    "mapped": entry.mapped,
+                    "loaded_at": entry.loaded_at,
+                    "source": entry.source,
+                    "load_seconds": round(entry.load_seconds, 3),
+                }
+                for file, entry in self._entries.items()
+            },
+        }
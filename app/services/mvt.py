@@ -0,0 +1,239 @@
+"""
+Кодирование слоёв в Mapbox Vector Tile (спецификация 2.1).
+
+Геометрии переводятся в координаты тайла, обрезаются по его границе с
+буфером, упрощаются и квантуются на сетку extent x extent. Protobuf
+собирается вручную: в тайле один слой, поэтому отдельная зависимость не нужна.
+"""
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry.polygon import orient
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+EXTENT = 4096
+BUFFER = 64
+# допуск упрощения в единицах тайла: четверть пикселя для тайла 256px
+SIMPLIFY_TOLERANCE = 4.0
+
+MAX_LATITUDE = 85.0511287798
+
+GEOM_POINT = 1
+GEOM_LINESTRING = 2
+GEOM_POLYGON = 3
+
+CMD_MOVE_TO = 1
+CMD_LINE_TO = 2
+CMD_CLOSE_PATH = 7
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Границы тайла XYZ в градусах: (minx, miny, maxx, maxy)."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def to_tile_coords(geometries: np.ndarray, z: int, x: int, y: int, extent: int = EXTENT) -> np.ndarray:
+    n = 2 ** z
+
+    def project(coords):
+        lon = coords[:, 0]
+        lat = np.radians(np.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE))
+        tx = ((lon + 180.0) / 360.0 * n - x) * extent
+        ty = ((1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * n - y) * extent
+        return np.column_stack([tx, ty])
+
+    return shapely.transform(geometries, project)
+
+
+def prepare_geometries(geometries: np.ndarray, z: int, x: int, y: int,
+                       extent: int = EXTENT, buffer: int = BUFFER,
+                       tolerance: float = SIMPLIFY_TOLERANCE) -> np.ndarray:
+    """Проекция, обрезка, упрощение и квантование. Пустые результаты становятся None."""
+    geometries = to_tile_coords(geometries, z, x, y, extent)
+    geometries = shapely.clip_by_rect(geometries, -buffer, -buffer, extent + buffer, extent + buffer)
+    geometries = shapely.simplify(geometries, tolerance, preserve_topology=True)
+    # квантование округлением: вырожденные после него кольца отбрасываются при кодировании
+    geometries = shapely.transform(geometries, np.round)
+    geometries[shapely.is_empty(geometries)] = None
+    return geometries
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        bits = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    return _varint((number << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _field_varint(number: int, value: int) -> bytes:
+    return _varint(number << 3) + _varint(value)
+
+
+def _packed(number: int, values: Sequence[int]) -> bytes:
+    return _field(number, b"".join(_varint(v) for v in values))
+
+
+def _command(command_id: int, count: int) -> int:
+    return (command_id & 0x7) | (count << 3)
+
+
+def _encode_value(value) -> bytes:
+    if isinstance(value, bool):
+        return _field_varint(7, int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _field_varint(5, value)
+        return _field_varint(6, _zigzag(value))
+    if isinstance(value, float):
+        return _varint((3 << 3) | 1) + np.float64(value).tobytes()
+    return _field(1, str(value).encode("utf-8"))
+
+
+class _Cursor:
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.commands: List[int] = []
+
+    def path(self, coords: np.ndarray, closed: bool) -> bool:
+        """Добавляет линию или кольцо; False, если после квантования от них ничего не осталось."""
+        coords = coords.astype(np.int64)
+        # дубликаты соседних точек после квантования не несут информации
+        keep = np.ones(len(coords), dtype=bool)
+        keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+        coords = coords[keep]
+        if closed:
+            if len(coords) > 1 and (coords[0] == coords[-1]).all():
+                coords = coords[:-1]
+            if len(coords) < 3:
+                return False
+        elif len(coords) < 2:
+            return False
+
+        first = True
+        for px, py in coords.tolist():
+            if first:
+                self.commands.append(_command(CMD_MOVE_TO, 1))
+            dx, dy = px - self.x, py - self.y
+            self.x, self.y = px, py
+            self.commands.extend((_zigzag(dx), _zigzag(dy)))
+            if first:
+                if len(coords) > 1:
+                    self.commands.append(_command(CMD_LINE_TO, len(coords) - 1))
+                first = False
+        if closed:
+            self.commands.append(_command(CMD_CLOSE_PATH, 1))
+        return True
+
+    def points(self, coords: np.ndarray) -> None:
+        coords = coords.astype(np.int64)
+        self.commands.append(_command(CMD_MOVE_TO, len(coords)))
+        for px, py in coords.tolist():
+            dx, dy = px - self.x, py - self.y
+            self.x, self.y = px, py
+            self.commands.extend((_zigzag(dx), _zigzag(dy)))
+
+
+def encode_geometry(geom) -> Tuple[int, List[int]]:
+    cursor = _Cursor()
+    kind = geom.geom_type
+    if kind in ("Point", "MultiPoint"):
+        cursor.points(shapely.get_coordinates(geom))
+        return GEOM_POINT, cursor.commands
+    if kind in ("LineString", "MultiLineString"):
+        for part in shapely.get_parts(geom):
+            cursor.path(shapely.get_coordinates(part), closed=False)
+        return GEOM_LINESTRING, cursor.commands
+    if kind in ("Polygon", "MultiPolygon"):
+        for part in shapely.get_parts(geom):
+            # внешнее кольцо с положительной площадью, дырки - с отрицательной
+            part = orient(part, sign=1.0)
+            if not cursor.path(np.asarray(part.exterior.coords), closed=True):
+                # без внешнего кольца дырки прицепились бы к предыдущему полигону
+                continue
+            for interior in part.interiors:
+                cursor.path(np.asarray(interior.coords), closed=True)
+        return GEOM_POLYGON, cursor.commands
+    if kind == "GeometryCollection":
+        # в MVT у объекта один тип: берём полигоны, если они есть
+        parts = shapely.get_parts(geom)
+        polygons = [p for p in parts if p.geom_type in ("Polygon", "MultiPolygon")]
+        if polygons:
+            return encode_geometry(shapely.multipolygons(shapely.get_parts(polygons)))
+        lines = [p for p in parts if p.geom_type in ("LineString", "MultiLineString")]
+        if lines:
+            return encode_geometry(shapely.multilinestrings(shapely.get_parts(lines)))
+        return encode_geometry(shapely.multipoints(shapely.get_parts(parts)))
+    return 0, []
+
+
+def encode_layer(name: str, geometries: np.ndarray, properties: Dict[str, Sequence],
+                 ids: Optional[Sequence[int]] = None, extent: int = EXTENT) -> bytes:
+    """
+    Собирает тайл из одного слоя.
+
+    geometries - уже подготовленные prepare_geometries координаты тайла,
+    properties - колонки атрибутов той же длины, ids - идентификаторы объектов.
+    """
+    keys = list(properties)
+    values_index: Dict[Tuple[type, object], int] = {}
+    values: List[bytes] = []
+    columns = [list(column) for column in properties.values()]
+
+    features = []
+    for i, geom in enumerate(geometries):
+        if geom is None:
+            continue
+        geom_type, commands = encode_geometry(geom)
+        if not commands:
+            continue
+
+        tags = []
+        for key_index, column in enumerate(columns):
+            value = column[i]
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            value_key = (type(value), value)
+            if value_key not in values_index:
+                values_index[value_key] = len(values)
+                values.append(_encode_value(value))
+            tags.extend((key_index, values_index[value_key]))
+
+        feature = _field_varint(1, int(ids[i]) if ids is not None else i)
+        if tags:
+            feature += _packed(2, tags)
+        feature += _field_varint(3, geom_type) + _packed(4, commands)
+        features.append(_field(2, feature))
+
+    if not features:
+        return b""
+
+    layer = _field_varint(15, 2) + _field(1, name.encode("utf-8"))
+    layer += b"".join(features)
+    layer += b"".join(_field(3, key.encode("utf-8")) for key in keys)
+    layer += b"".join(_field(4, value) for value in values)
+    layer += _field_varint(5, extent)
+    return _field(3, layer)
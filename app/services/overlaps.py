@@ -0,0 +1,178 @@
+"""
+Предрасчитанные таблицы пересечений слоёв.
+
+Для каждого объекта базового слоя (участка ЗУ) хранится список пересекающих
+его объектов другого слоя и площадь пересечения в м² - в виде CSR: offsets
+(n + 1) и плоские массивы позиций и площадей. Таблица строится один раз на
+пару версий слоёв пакетным пространственным соединением, после чего запрос
+по участку - это срез массивов, а не overlay.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import shapely
+from loguru import logger
+
+from app.services.layers import LayerEntry
+from app.services.projections import to_metric
+
+
+class OverlapTable:
+    def __init__(self, offsets: np.ndarray, positions: np.ndarray, areas: np.ndarray, base_areas: np.ndarray):
+        self.offsets = offsets
+        self.positions = positions
+        self.areas = areas
+        self.base_areas = base_areas
+
+    @classmethod
+    def build(cls, base: LayerEntry, other: LayerEntry, chunk_size: int = 20000) -> OverlapTable:
+        base_index: List[np.ndarray] = []
+        other_index: List[np.ndarray] = []
+        areas: List[np.ndarray] = []
+        base_areas = np.zeros(len(base), dtype=np.float32)
+
+        for start in range(0, len(base), chunk_size):
+            chunk = np.arange(start, min(start + chunk_size, len(base)))
+            geometries = base.geometries(chunk)
+            metric = to_metric(geometries)
+            base_areas[chunk] = shapely.area(metric)
+
+            # кандидаты по габаритам другого слоя, затем точная площадь пересечения в метрах
+            left, right = other.tree.query(geometries)
+            if not len(left):
+                continue
+            unique, inverse = np.unique(right, return_inverse=True)
+            other_metric = to_metric(other.geometries(unique))
+            intersection = shapely.intersection(metric[left], other_metric[inverse])
+            area = shapely.area(intersection)
+            keep = area > 0
+            base_index.append(chunk[left[keep]])
+            other_index.append(right[keep])
+            areas.append(area[keep])
+
+        if base_index:
+            base_all = np.concatenate(base_index)
+            other_all = np.concatenate(other_index)
+            area_all = np.concatenate(areas)
+        else:
+            base_all = other_all = np.zeros(0, dtype=np.int64)
+            area_all = np.zeros(0)
+
+        # внутри участка - по убыванию площади пересечения
+        order = np.lexsort((-area_all, base_all))
+        offsets = np.searchsorted(base_all[order], np.arange(len(base) + 1)).astype(np.int64)
+        return cls(offsets, other_all[order].astype(np.int32), area_all[order].astype(np.float32), base_areas)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.positions.nbytes + self.areas.nbytes + self.base_areas.nbytes
+
+    def lookup(self, base_position: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Позиции пересекающих объектов и площади пересечения (м²) для объекта базового слоя."""
+        start, stop = self.offsets[base_position], self.offsets[base_position + 1]
+        return self.positions[start:stop], self.areas[start:stop]
+
+
+class OverlapBuilder:
+    """
+    Фоновое построение таблиц пересечений базового слоя со списком слоёв.
+
+    Таблица привязана к версиям обоих слоёв; после перезагрузки любого
+    из них она считается устаревшей и строится заново при следующем запуске.
+    """
+
+    def __init__(self, base: Callable[[], LayerEntry], others: Dict[str, Callable[[], LayerEntry]],
+                 wait: Optional[Callable[[], None]] = None):
+        self._base = base
+        self._others = others
+        self._wait = wait
+        self._tables: Dict[str, Tuple[Tuple, OverlapTable]] = {}
+        self._thread: Optional[threading.Thread] = None
+        # флаг повторного прохода и признак работающего потока меняются только вместе под _lock:
+        # иначе запуск между последней проверкой флага и выходом потока терялся бы
+        self._lock = threading.Lock()
+        self._again = False
+        self._running = False
+        self.layers: Dict[str, dict] = {}
+
+    @staticmethod
+    def _versions(base: LayerEntry, other: LayerEntry) -> Tuple:
+        return base.file, base.version, other.file, other.version
+
+    def start(self) -> None:
+        with self._lock:
+            # запуск во время построения - ещё один проход после текущего: слой мог смениться посреди него
+            self._again = True
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self.run, name="overlap-build", daemon=True)
+            self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def run(self) -> None:
+        try:
+            if self._wait is not None:
+                # сначала дожидаемся прогрева, чтобы не читать слои второй раз
+                self._wait()
+            while True:
+                with self._lock:
+                    if not self._again:
+                        self._running = False
+                        return
+                    self._again = False
+                self._build()
+        except BaseException:
+            with self._lock:
+                self._running = False
+            raise
+
+    def _build(self) -> None:
+        try:
+            base = self._base()
+        except Exception as e:
+            logger.error(f"Overlap build skipped, base layer is unavailable: {e}")
+            self.layers = {name: {"status": "failed", "error": str(e)} for name in self._others}
+            return
+
+        for name, get_other in self._others.items():
+            started = time.perf_counter()
+            self.layers[name] = {"status": "building"}
+            try:
+                other = get_other()
+                versions = self._versions(base, other)
+                current = self._tables.get(name)
+                if current is None or current[0] != versions:
+                    self._tables[name] = (versions, OverlapTable.build(base, other))
+                table = self._tables[name][1]
+                self.layers[name] = {
+                    "status": "ready",
+                    "pairs": len(table),
+                    "bytes": table.nbytes,
+                    "seconds": round(time.perf_counter() - started, 3),
+                }
+            except Exception as e:
+                logger.error(f"Overlap build failed for {name}: {e}")
+                self.layers[name] = {"status": "failed", "error": str(e)}
+        summary = ", ".join(f"{name}={layer['status']}" for name, layer in self.layers.items())
+        logger.info(f"Overlap tables built: {summary}")
+
+    def table(self, name: str, base: LayerEntry, other: LayerEntry) -> Optional[OverlapTable]:
+        """Готовая таблица для текущих версий слоёв или None, если её ещё нет."""
+        current = self._tables.get(name)
+        if current is None or current[0] != self._versions(base, other):
+            return None
+        return current[1]
+
+    def status(self) -> dict:
+        return {"running": self.running, "layers": self.layers}
@@ -0,0 +1,74 @@
+"""
+Реестр преобразований координат.
+
+Transformer из pyproj создаётся один раз на пару (источник, цель) и
+переиспользуется; координаты слоя пересчитываются одним векторным вызовом
+на весь массив вершин, а не по точке.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Dict, Tuple, Union
+
+import numpy as np
+import shapely
+from pyproj import CRS, Transformer
+
+from app.services.layers import TARGET_CRS
+
+# UTM 37N: метрическая проекция для площадей в пределах Москвы
+METRIC_CRS = "EPSG:32637"
+
+CRSLike = Union[str, CRS]
+
+_transformers: Dict[Tuple[str, str], Transformer] = {}
+_lock = threading.Lock()
+
+
+def _key(crs: CRSLike) -> str:
+    return crs.to_wkt() if isinstance(crs, CRS) else str(crs)
+
+
+def get_transformer(source: CRSLike, target: CRSLike = TARGET_CRS) -> Transformer:
+    """Transformer для пары CRS; порядок осей всегда x, y (долгота, широта)."""
+    key = (_key(source), _key(target))
+    transformer = _transformers.get(key)
+    if transformer is None:
+        with _lock:
+            transformer = _transformers.get(key)
+            if transformer is None:
+                transformer = Transformer.from_crs(CRS.from_user_input(source), CRS.from_user_input(target), always_xy=True)
+                _transformers[key] = transformer
+    return transformer
+
+
+def transform_geometries(geometries, source: CRSLike, target: CRSLike = TARGET_CRS) -> np.ndarray:
+    """Пересчитывает массив геометрий из source в target; Z сохраняется, если он есть."""
+    transformer = get_transformer(source, target)
+    geometries = np.asarray(geometries, dtype=object)
+
+    def transform_xy(coords):
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([x, y])
+
+    def transform_xyz(coords):
+        x, y, z = transformer.transform(coords[:, 0], coords[:, 1], coords[:, 2])
+        return np.column_stack([x, y, z])
+
+    result = geometries.copy()
+    has_z = shapely.has_z(geometries)
+    flat = ~has_z & ~shapely.is_missing(geometries)
+    if flat.any():
+        result[flat] = shapely.transform(geometries[flat], transform_xy)
+    if has_z.any():
+        result[has_z] = shapely.transform(geometries[has_z], transform_xyz, include_z=True)
+    return result
+
+
+def to_metric(geometries) -> np.ndarray:
+    """Геометрии из WGS-84 в METRIC_CRS; невалидные исправляются, чтобы площади и пересечения считались."""
+    geometries = transform_geometries(geometries, TARGET_CRS, METRIC_CRS)
+    invalid = ~shapely.is_valid(geometries) & ~shapely.is_missing(geometries)
+    if invalid.any():
+        geometries[invalid] = shapely.make_valid(geometries[invalid])
+    return geometries
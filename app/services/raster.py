@@ -0,0 +1,191 @@
+"""
+Растровые PNG-тайлы слоёв для плотных слоёв на мелких масштабах.
+
+Геометрии переводятся в пиксели тайла, обрезаются с запасом под обводку,
+и все объекты тайла рисуются одной коллекцией путей matplotlib (Agg):
+полигоны с дырками - составными путями, линии и точки - своими коллекциями.
+Готовые тайлы хранятся на диске по версии слоя:
+    <слой>/v<версия>.<формат>/<колонка>/<z>/<x>/<y>.png
+С новой версией слоя каталоги прежних версий удаляются.
+"""
+from __future__ import annotations
+
+import io
+import os
+import shutil
+import threading
+from typing import Optional, Set
+from urllib.parse import quote
+
+import numpy as np
+import shapely
+
+from app.services.mvt import to_tile_coords
+
+# увеличить при изменении отрисовки: тайлы прежнего формата перестанут использоваться
+RASTER_FORMAT = 1
+TILE_SIZE = 256
+# запас обрезки в пикселях, чтобы обводка на краю тайла не обрывалась
+BUFFER = 4
+# допуск упрощения - полпикселя
+SIMPLIFY_TOLERANCE = 0.5
+FILL_ALPHA = 0.6
+LINE_WIDTH = 0.75
+POINT_SIZE = 3.0
+DEFAULT_COLOR = "#1f77b4"
+
+# тайл размером 1 дюйм: пиксель в пунктах matplotlib
+_PIXEL = 72.0 / TILE_SIZE
+
+# коды вершин matplotlib.path.Path
+_MOVETO = 1
+_LINETO = 2
+_CLOSEPOLY = 79
+
+_POLYGONS = (3,)
+_LINES = (1, 2)
+_POINTS = (0,)
+
+
+def _polygon_paths(parts: np.ndarray):
+    """Составной путь на каждую непустую часть: внешнее кольцо и дырки с противоположным обходом."""
+    from matplotlib.path import Path
+
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    coords, ring_index = shapely.get_coordinates(rings, return_index=True)
+    if not len(coords):
+        return []
+    counts = np.bincount(ring_index, minlength=len(rings))
+    ends = np.cumsum(counts)
+    starts = ends - counts
+
+    # знак площади кольца по формуле шнурования; кольца замкнуты, соседние пары внутри кольца
+    same = ring_index[:-1] == ring_index[1:]
+    cross = coords[:-1, 0] * coords[1:, 1] - coords[1:, 0] * coords[:-1, 1]
+    area = np.bincount(ring_index[:-1][same], weights=cross[same], minlength=len(rings))
+    exterior = np.ones(len(rings), dtype=bool)
+    exterior[1:] = ring_part[1:] != ring_part[:-1]
+    flip = (area > 0) != exterior
+    # заливка по правилу ненулевого индекса: дырки обходятся в обратную сторону
+    order = np.arange(len(coords))
+    order = np.where(flip[ring_index], starts[ring_index] + ends[ring_index] - 1 - order, order)
+    coords = coords[order]
+
+    codes = np.full(len(coords), _LINETO, dtype=np.uint8)
+    codes[starts] = _MOVETO
+    codes[ends - 1] = _CLOSEPOLY
+
+    # у каждой непустой части есть внешнее кольцо - с него начинается её путь
+    splits = starts[np.flatnonzero(exterior)[1:]]
+    return [Path(v, c) for v, c in zip(np.split(coords, splits), np.split(codes, splits))]
+
+
+def render_tile(geometries: np.ndarray, colors: np.ndarray, z: int, x: int, y: int) -> bytes:
+    """
+    PNG-тайл TILE_SIZE x TILE_SIZE с прозрачным фоном.
+
+    geometries - геометрии в WGS-84, colors - цвет каждой геометрии в hex.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection, PathCollection
+    from matplotlib.colors import to_rgba
+    from matplotlib.figure import Figure
+
+    geometries = to_tile_coords(np.asarray(geometries, dtype=object), z, x, y, TILE_SIZE)
+    geometries = shapely.clip_by_rect(geometries, -BUFFER, -BUFFER, TILE_SIZE + BUFFER, TILE_SIZE + BUFFER)
+    geometries = shapely.simplify(geometries, SIMPLIFY_TOLERANCE, preserve_topology=True)
+    parts, feature = shapely.get_parts(geometries, return_index=True)
+    # вложенные коллекции раскрываются до простых геометрий
+    kinds = shapely.get_type_id(parts)
+    while (kinds >= 4).any():
+        nested = kinds >= 4
+        inner, index = shapely.get_parts(parts[nested], return_index=True)
+        parts = np.concatenate([parts[~nested], inner])
+        feature = np.concatenate([feature[~nested], feature[nested][index]])
+        kinds = shapely.get_type_id(parts)
+    keep = ~shapely.is_empty(parts)
+    parts, feature, kinds = parts[keep], feature[keep], kinds[keep]
+    colors = np.asarray(colors, dtype=object)
+
+    figure = Figure(figsize=(1, 1), dpi=TILE_SIZE)
+    FigureCanvasAgg(figure)
+    figure.patch.set_alpha(0)
+    axes = figure.add_axes((0, 0, 1, 1))
+    axes.set_axis_off()
+    axes.set_xlim(0, TILE_SIZE)
+    axes.set_ylim(TILE_SIZE, 0)
+
+    polygons = np.isin(kinds, _POLYGONS)
+    if polygons.any():
+        part_colors = colors[feature[polygons]].tolist()
+        # заливка полупрозрачная, обводка - непрозрачная
+        axes.add_collection(PathCollection(
+            _polygon_paths(parts[polygons]), facecolors=[to_rgba(c, FILL_ALPHA) for c in part_colors],
+            edgecolors=part_colors, linewidths=LINE_WIDTH * _PIXEL,
+        ))
+
+    lines = np.isin(kinds, _LINES)
+    if lines.any():
+        coords, index = shapely.get_coordinates(parts[lines], return_index=True)
+        splits = np.flatnonzero(np.diff(index)) + 1
+        axes.add_collection(LineCollection(
+            np.split(coords, splits), colors=colors[feature[lines][np.unique(index)]].tolist(),
+            linewidths=LINE_WIDTH * 2 * _PIXEL,
+        ))
+
+    points = np.isin(kinds, _POINTS)
+    if points.any():
+        coords = shapely.get_coordinates(parts[points])
+        axes.scatter(coords[:, 0], coords[:, 1], s=(POINT_SIZE * _PIXEL * 2) ** 2,
+                     c=colors[feature[points]].tolist(), linewidths=0)
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png", dpi=TILE_SIZE, transparent=True)
+    return buffer.getvalue()
+
+
+class TileDiskCache:
+    """PNG-тайлы на диске; запись атомарная, прежние версии слоя удаляются при появлении новой."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._versions: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def layer_path(self, file: str) -> str:
+        return os.path.join(self.root, os.path.splitext(file)[0])
+
+    def path(self, file: str, version: int, column: Optional[str], z: int, x: int, y: int) -> str:
+        column = quote(column, safe="") if column is not None else "_"
+        return os.path.join(self.layer_path(file), f"v{version}.{RASTER_FORMAT}", column, str(z), str(x), f"{y}.png")
+
+    def get(self, file: str, version: int, column: Optional[str], z: int, x: int, y: int) -> Optional[bytes]:
+        try:
+            with open(self.path(file, version, column, z, x, y), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, file: str, version: int, column: Optional[str], z: int, x: int, y: int, tile: bytes) -> None:
+        self.prune(file, version)
+        path = self.path(file, version, column, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + f".tmp{os.getpid()}", "wb") as f:
+            f.write(tile)
+        os.replace(path + f".tmp{os.getpid()}", path)
+
+    def prune(self, file: str, version: int) -> None:
+        """Удаляет тайлы всех версий слоя, кроме version (один раз на версию)."""
+        current = f"v{version}.{RASTER_FORMAT}"
+        key = os.path.join(file, current)
+        if key in self._versions:
+            return
+        with self._lock:
+            if key in self._versions:
+                return
+            layer_path = self.layer_path(file)
+            if os.path.isdir(layer_path):
+                for name in os.listdir(layer_path):
+                    if name != current:
+                        shutil.rmtree(os.path.join(layer_path, name), ignore_errors=True)
+            self._versions.add(key)
@@ -0,0 +1,269 @@
+"""
+Кэш готовых HTTP-ответов слоёв с условными запросами.
+
+Тело ответа хранится вместе со сжатыми вариантами (gzip и br, если установлен
+пакет brotli; сжимаются при первом запросе с этой кодировкой), ключом служит
+ETag, объём кэша ограничен суммарным размером тел. ETag вычисляется из подписи
+загруженной версии слоя и параметров запроса: слой для этого берётся из памяти
+(при первом запросе - загружается), но на If-None-Match 304 отвечает без
+выборки и сериализации объектов, а одинаковые данные дают одинаковый ETag на всех подах.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость, без неё отдаём gzip
+    brotli = None
+
+# маленькие ответы сжимать не выгодно
+MIN_COMPRESS_SIZE = 1024
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def accepted_encodings(header: Optional[str]) -> Dict[str, float]:
+    """Разбор Accept-Encoding: кодировка -> q."""
+    result: Dict[str, float] = {}
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        result[name.strip().lower()] = q
+    return result
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # сравнение слабое: W/"x" совпадает с "x"
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in tags
+
+
+class CachedBody:
+    """
+    Тело ответа и его сжатые варианты.
+
+    Сжатие выполняется при первом запросе клиента с этой кодировкой, а не при
+    построении ответа: за gzip/br не платят клиенты без сжатия. Сжимается любое
+    тело от MIN_COMPRESS_SIZE, в том числе разовое - выборка по bbox тоже бывает в мегабайты.
+    """
+
+    def __init__(self, etag: str, body: bytes, last_modified: Optional[float] = None):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.encodings: Dict[str, bytes] = {"identity": body}
+        self.compress = len(body) >= MIN_COMPRESS_SIZE
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.encodings.values())
+
+    def choose(self, accept_encoding: Optional[str]) -> str:
+        if not self.compress:
+            return "identity"
+        accepted = accepted_encodings(accept_encoding)
+        for name in ("br", "gzip"):
+            if name == "br" and brotli is None:
+                continue
+            if accepted.get(name, accepted.get("*", 0.0)) > 0:
+                return name
+        return "identity"
+
+    def encode(self, name: str) -> Tuple[bytes, int]:
+        """Тело в кодировке name и сколько байт добавилось в кэш (0, если вариант уже был)."""
+        body = self.encodings.get(name)
+        if body is not None:
+            return body, 0
+        with self._lock:
+            body = self.encodings.get(name)
+            if body is not None:
+                return body, 0
+            identity = self.encodings["identity"]
+            body = gzip.compress(identity, compresslevel=6) if name == "gzip" else brotli.compress(identity, quality=5)
+            self.encodings[name] = body
+            return body, len(body)
+
+
+class _Flight:
+    """Ответ, который сейчас строит другой запрос с тем же ETag."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[CachedBody] = None
+        self.error: Optional[BaseException] = None
+
+
+class ResponseCache:
+    """
+    LRU по ETag с ограничением суммарного размера тел (вместе со сжатыми вариантами).
+
+    При промахе тело строит только один запрос, остальные запросы с тем же
+    ETag ждут его результата.
+    """
+
+    def __init__(self, maxbytes: int = 256 * 1024 * 1024):
+        self.maxbytes = maxbytes
+        # тело и учтённый в _bytes размер
+        self._data: "OrderedDict[str, Tuple[CachedBody, int]]" = OrderedDict()
+        self._bytes = 0
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.not_modified = 0
+
+    def _get(self, etag: str) -> Optional[CachedBody]:
+        with self._lock:
+            item = self._data.get(etag)
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(etag)
+            self.hits += 1
+            return item[0]
+
+    def _put(self, cached: CachedBody) -> None:
+        size = cached.size
+        if size > self.maxbytes:
+            return
+        with self._lock:
+            previous = self._data.pop(cached.etag, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._data[cached.etag] = (cached, size)
+            self._bytes += size
+            self._evict()
+
+    def _grow(self, cached: CachedBody, added: int) -> None:
+        # сжатый вариант появился у тела, которое уже учтено в кэше
+        with self._lock:
+            item = self._data.get(cached.etag)
+            if item is not None and item[0] is cached:
+                self._data[cached.etag] = (cached, item[1] + added)
+                self._bytes += added
+                self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.maxbytes and self._data:
+            _, (_, size) = self._data.popitem(last=False)
+            self._bytes -= size
+
+    def _build(self, etag: str, build: Callable[[], bytes], last_modified: Optional[float], store: bool) -> CachedBody:
+        with self._lock:
+            flight = self._flights.get(etag)
+            leader = flight is None
+            if leader:
+                flight = self._flights[etag] = _Flight()
+            else:
+                self.shared += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            cached = CachedBody(etag, build(), last_modified)
+            if store:
+                self._put(cached)
+            flight.result = cached
+            return cached
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(etag, None)
+            flight.done.set()
+
+    def headers(self, etag: str, last_modified: Optional[float]) -> Dict[str, str]:
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if last_modified is not None:
+            headers["Last-Modified"] = http_date(last_modified)
+        return headers
+
+    def is_not_modified(self, request_headers: Mapping[str, str], etag: str, last_modified: Optional[float]) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag_matches(if_none_match, etag)
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since and last_modified is not None:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= int(last_modified)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def respond(self, request_headers: Mapping[str, str], etag: str, build: Callable[[], bytes],
+                last_modified: Optional[float] = None, media_type: str = "application/json",
+                store: bool = True) -> Response:
+        """
+        Ответ по ETag: 304, если клиент уже имеет эту версию, иначе тело из кэша.
+
+        build вызывается только при промахе кэша и один раз на ETag для одновременных
+        запросов. store=False - разовый ответ (выборка по bbox, limit): он не кэшируется,
+        но сжимается по размеру, и ETag и 304 работают как обычно.
+        """
+        headers = self.headers(etag, last_modified)
+        if self.is_not_modified(request_headers, etag, last_modified):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        cached = self._get(etag) if store else None
+        if cached is None:
+            cached = self._build(etag, build, last_modified, store)
+
+        encoding = cached.choose(request_headers.get("accept-encoding"))
+        content, added = cached.encode(encoding)
+        if added:
+            self._grow(cached, added)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=content, media_type=media_type, headers=headers)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "not_modified": self.not_modified,
+                "size": len(self._data),
+                "bytes": self._bytes,
+                "maxbytes": self.maxbytes,
+                "brotli": brotli is not None,
+            }
@@ -0,0 +1,383 @@
+"""
+TopoJSON для слоёв со смежными границами (кадастровые кварталы, зоны ПЗЗ, округа).
+
+Координаты квантуются на целочисленную сетку, линии и кольца режутся
+на дуги в узлах (точках, где сходятся разные границы), одинаковые дуги
+хранятся один раз - общая граница двух полигонов записывается одной дугой,
+второй полигон ссылается на неё в обратном направлении (~индекс).
+Дуги кодируются приращениями от предыдущей точки.
+
+Топология строится для всего слоя один раз на уровень зума; выборка по bbox
+только перенумеровывает использованные дуги.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import shapely
+
+from app.services.geojson import dumps_compact, dumps_value
+
+# шаг сетки без зума, в градусах (~10 см)
+FULL_PRECISION = 1e-6
+
+# объект TopoJSON: (тип, дуги или координаты); None - пустая геометрия
+TopoGeometry = Optional[Tuple[str, Any]]
+
+
+def _arc_tokens(coords: np.ndarray) -> np.ndarray:
+    return "[" + coords[:, 0].astype(str).astype(object) + "," + coords[:, 1].astype(str).astype(object) + "]"
+
+
+class Topology:
+    def __init__(self, step: float, translate: Tuple[float, float], arcs: np.ndarray, geometries: List[TopoGeometry],
+                 points: Optional[List[np.ndarray]] = None):
+        self.step = step
+        self.translate = translate
+        # JSON каждой дуги с уже закодированными приращениями
+        self.arcs = arcs
+        self.geometries = geometries
+        # точки каждой дуги на сетке (после упрощения) - для сборки геометрий из топологии
+        self.points = points if points is not None else []
+
+    @classmethod
+    def build(cls, geometries: np.ndarray, step: float, tolerance: float = 0.0) -> Topology:
+        """
+        geometries - геометрии слоя в WGS-84, step - шаг сетки в градусах,
+        tolerance - допуск упрощения дуг в шагах сетки (0 - без упрощения).
+        """
+        geometries = np.asarray(geometries, dtype=object)
+        bounds = shapely.bounds(geometries)
+        finite = np.isfinite(bounds).all(axis=1)
+        translate = (float(bounds[finite, 0].min()), float(bounds[finite, 1].min())) if finite.any() else (0.0, 0.0)
+        return _TopologyBuilder(geometries, step, translate, tolerance).build()
+
+    def __len__(self) -> int:
+        return len(self.geometries)
+
+    def encode(self, name: str, properties: np.ndarray, positions: Optional[np.ndarray] = None,
+               members: Optional[Dict[str, Any]] = None) -> bytes:
+        """
+        Документ Topology с одним объектом name - GeometryCollection выбранных объектов.
+
+        properties - JSON-объекты атрибутов для выбранных объектов, в порядке positions.
+        """
+        selected = self.geometries if positions is None else [self.geometries[i] for i in positions.tolist()]
+
+        # перенумеровываем только использованные дуги, сохраняя их порядок в слое
+        remap: Dict[int, int] = {}
+        if positions is None:
+            remap = {i: i for i in range(len(self.arcs))}
+        else:
+            used = set()
+            for geometry in selected:
+                if geometry is not None and geometry[0] not in ("Point", "MultiPoint"):
+                    _collect(geometry[1], used)
+            remap = {arc: i for i, arc in enumerate(sorted(used))}
+        arcs = self.arcs[sorted(remap)] if positions is not None else self.arcs
+
+        encoded = []
+        for geometry, props in zip(selected, properties.tolist()):
+            if geometry is None:
+                encoded.append('{"type":null,"properties":' + props + '}')
+                continue
+            kind, value = geometry
+            if kind in ("Point", "MultiPoint"):
+                encoded.append('{"type":"%s","coordinates":%s,"properties":%s}' % (kind, _dump(value), props))
+            else:
+                encoded.append('{"type":"%s","arcs":%s,"properties":%s}' % (kind, _dump(_renumber(value, remap)), props))
+
+        head = '{"type":"Topology","transform":{"scale":[%s,%s],"translate":[%s,%s]},' % (
+            dumps_value(self.step), dumps_value(self.step), dumps_value(self.translate[0]), dumps_value(self.translate[1])
+        )
+        if members:
+            head += "".join(dumps_value(key) + ":" + dumps_compact(value) + "," for key, value in members.items())
+        body = (head + '"objects":{' + dumps_value(name) + ':{"type":"GeometryCollection","geometries":['
+                + ",".join(encoded) + ']}},"arcs":[' + ",".join(arcs.tolist()) + "]}")
+        return body.encode("utf-8")
+
+    def shapes(self, fallback: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """
+        Геометрии объектов, собранные из дуг топологии, в координатах слоя.
+
+        Соседние объекты ссылаются на одни и те же упрощённые дуги, поэтому их общие
+        границы совпадают и между ними не появляется щелей. Узкие части полигонов
+        после привязки к сетке могут касаться себя - такие полигоны исправляются
+        make_valid, от результата остаётся полигональная часть. Объекты, выродившиеся
+        на сетке или не выражаемые дугами (смешанные коллекции), берутся из
+        fallback(позиции) - он получает только их позиции.
+        """
+        result = np.empty(len(self.geometries), dtype=object)
+        for i, geometry in enumerate(self.geometries):
+            if geometry is not None:
+                result[i] = self._shape(geometry)
+
+        invalid = np.flatnonzero(~shapely.is_missing(result) & ~shapely.is_valid(result))
+        if len(invalid):
+            result[invalid] = _polygonal(shapely.make_valid(result[invalid]))
+        missing = np.flatnonzero(shapely.is_missing(result) | shapely.is_empty(result))
+        if len(missing):
+            result[missing] = fallback(missing)
+        return result
+
+    def _line(self, arcs: List[int]) -> np.ndarray:
+        pieces = [self.points[arc] if arc >= 0 else self.points[~arc][::-1] for arc in arcs]
+        # соседние дуги делят конечную точку
+        coords = np.concatenate([pieces[0]] + [piece[1:] for piece in pieces[1:]])
+        return coords * self.step + np.asarray(self.translate)
+
+    def _polygon(self, rings: List[List[int]]):
+        shell = self._line(rings[0])
+        # кольцо из дуг, упрощённых до отрезков, может выродиться; без внешнего кольца - отказ
+        if len(np.unique(shell, axis=0)) < 3:
+            return None
+        holes = [hole for hole in map(self._line, rings[1:]) if len(np.unique(hole, axis=0)) >= 3]
+        return shapely.Polygon(shell, holes)
+
+    def _shape(self, geometry: Tuple[str, Any]):
+        kind, value = geometry
+        if kind == "Point":
+            return shapely.Point(np.asarray(value) * self.step + np.asarray(self.translate))
+        if kind == "MultiPoint":
+            return shapely.MultiPoint(np.asarray(value) * self.step + np.asarray(self.translate))
+        if kind == "LineString":
+            return shapely.LineString(self._line(value))
+        if kind == "MultiLineString":
+            return shapely.MultiLineString([self._line(line) for line in value])
+        if kind == "Polygon":
+            return self._polygon(value)
+        polygons = [self._polygon(rings) for rings in value]
+        if any(polygon is None for polygon in polygons):
+            return None
+        return shapely.MultiPolygon(polygons)
+
+
+def _polygonal(geometries: np.ndarray) -> np.ndarray:
+    """Полигональная часть каждой геометрии (make_valid может добавить линии и точки); пустая - None."""
+    result = geometries.copy()
+    types = shapely.get_type_id(geometries)
+    # схлопнувшийся полигон make_valid превращает в линии
+    result[~np.isin(types, (3, 6, 7))] = None
+    collections = np.flatnonzero(types == 7)
+    if len(collections):
+        parts, index = shapely.get_parts(geometries[collections], return_index=True)
+        polygons = np.isin(shapely.get_type_id(parts), (3, 6))
+        result[collections] = None
+        for position in np.unique(index[polygons]).tolist():
+            pieces = shapely.get_parts(parts[polygons & (index == position)])
+            result[collections[position]] = pieces[0] if len(pieces) == 1 else shapely.MultiPolygon(list(pieces))
+    return result
+
+
+def _collect(value, used: set) -> None:
+    for item in value:
+        if isinstance(item, list):
+            _collect(item, used)
+        else:
+            used.add(item if item >= 0 else ~item)
+
+
+def _renumber(value, remap: Dict[int, int]) -> list:
+    return [_renumber(item, remap) if isinstance(item, list) else (remap[item] if item >= 0 else ~remap[~item])
+            for item in value]
+
+
+def _dump(value) -> str:
+    if isinstance(value, list):
+        return "[" + ",".join(_dump(item) for item in value) + "]"
+    return int.__repr__(value)
+
+
+class _TopologyBuilder:
+    def __init__(self, geometries: np.ndarray, step: float, translate: Tuple[float, float], tolerance: float):
+        self.geometries = geometries
+        self.step = step
+        self.translate = translate
+        self.tolerance = tolerance
+        self.arc_index: Dict[bytes, int] = {}
+        self.arc_coords: List[np.ndarray] = []
+
+    def quantize(self, coords: np.ndarray) -> np.ndarray:
+        return np.round((coords - np.asarray(self.translate)) / self.step).astype(np.int64)
+
+    def build(self) -> Topology:
+        geometries = self.geometries
+        present = ~shapely.is_missing(geometries) & ~shapely.is_empty(geometries)
+        parts, part_feature = shapely.get_parts(geometries[present], return_index=True)
+        part_feature = np.flatnonzero(present)[part_feature]
+        part_types = shapely.get_type_id(parts)
+
+        # все линейные элементы: кольца полигонов (внешнее первым) и линии
+        polygon_parts = np.flatnonzero(part_types == 3)
+        rings, ring_part = shapely.get_rings(parts[polygon_parts], return_index=True)
+        ring_part = polygon_parts[ring_part]
+        line_parts = np.flatnonzero((part_types == 1) | (part_types == 2))
+        linear = np.concatenate([rings, parts[line_parts]])
+        linear_part = np.concatenate([ring_part, line_parts])
+        closed = np.concatenate([np.ones(len(rings), dtype=bool), part_types[line_parts] == 2])
+
+        coords, owner = shapely.get_coordinates(linear, return_index=True)
+        quantized = self.quantize(coords)
+        lines = self.split_lines(quantized, owner, len(linear))
+        junctions = self.junctions(lines, closed)
+        line_arcs = [self.cut(line, is_closed, junctions) if line is not None else None
+                     for line, is_closed in zip(lines, closed.tolist())]
+
+        # точки: квантованные координаты без дуг
+        point_parts = np.flatnonzero(part_types == 0)
+        point_coords = {}
+        if len(point_parts):
+            quantized_points = self.quantize(shapely.get_coordinates(parts[point_parts]))
+            point_coords = dict(zip(point_parts.tolist(), quantized_points.tolist()))
+
+        part_value: Dict[int, Any] = {}
+        dropped = set()
+        for arcs, part in zip(line_arcs, linear_part.tolist()):
+            if part_types[part] != 3:
+                if arcs is not None:
+                    part_value[part] = arcs
+            elif part not in part_value and part not in dropped:
+                # первое кольцо полигона - внешнее; если оно выродилось при квантовании, полигон не выводится
+                if arcs is None:
+                    dropped.add(part)
+                else:
+                    part_value[part] = [arcs]
+            elif part in part_value and arcs is not None:
+                part_value[part].append(arcs)
+        part_value.update(point_coords)
+
+        feature_parts: Dict[int, List[Tuple[int, Any]]] = {}
+        for part, feature in enumerate(part_feature.tolist()):
+            if part in part_value:
+                feature_parts.setdefault(feature, []).append((int(part_types[part]), part_value[part]))
+
+        topo_geometries: List[TopoGeometry] = []
+        multi = {0: ("Point", "MultiPoint"), 1: ("LineString", "MultiLineString"), 2: ("LineString", "MultiLineString"),
+                 3: ("Polygon", "MultiPolygon")}
+        geometry_types = shapely.get_type_id(geometries)
+        for feature in range(len(geometries)):
+            items = feature_parts.get(feature)
+            # смешанные коллекции в TopoJSON одним объектом не выражаются
+            if not items or len({multi[kind] for kind, _ in items}) > 1:
+                topo_geometries.append(None)
+                continue
+            single, many = multi[items[0][0]]
+            is_multi = geometry_types[feature] in (4, 5, 6, 7) or len(items) > 1
+            values = [value for _, value in items]
+            topo_geometries.append((many, values) if is_multi else (single, values[0]))
+
+        points = self.simplify_arcs()
+        return Topology(self.step, self.translate, self.encode_arcs(points), topo_geometries, points)
+
+    @staticmethod
+    def split_lines(quantized: np.ndarray, owner: np.ndarray, count: int) -> List[Optional[np.ndarray]]:
+        """Координаты каждого элемента без подряд идущих повторов (они появляются после квантования)."""
+        keep = np.ones(len(quantized), dtype=bool)
+        keep[1:] = (quantized[1:] != quantized[:-1]).any(axis=1) | (owner[1:] != owner[:-1])
+        quantized, owner = quantized[keep], owner[keep]
+        offsets = np.searchsorted(owner, np.arange(count + 1))
+        lines: List[Optional[np.ndarray]] = []
+        for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+            lines.append(quantized[start:stop] if stop - start >= 2 else None)
+        return lines
+
+    @staticmethod
+    def junctions(lines: List[Optional[np.ndarray]], closed: np.ndarray) -> set:
+        """
+        Узлы: точки, в которых у вершины встречаются разные пары соседей
+        (там расходятся границы), и концы незамкнутых линий.
+        """
+        keys, left, right, ends = [], [], [], []
+        for line, is_closed in zip(lines, closed.tolist()):
+            if line is None:
+                continue
+            point_keys = (line[:, 0] << 32) | line[:, 1]
+            if is_closed:
+                if len(line) < 4:
+                    continue
+                ring = point_keys[:-1]
+                keys.append(ring)
+                left.append(np.roll(ring, 1))
+                right.append(np.roll(ring, -1))
+            else:
+                ends.append(point_keys[[0, -1]])
+                keys.append(point_keys[1:-1])
+                left.append(point_keys[:-2])
+                right.append(point_keys[2:])
+        if not keys:
+            return set()
+        keys = np.concatenate(keys)
+        left = np.concatenate(left)
+        right = np.concatenate(right)
+        pairs = np.unique(np.column_stack([keys, np.minimum(left, right), np.maximum(left, right)]), axis=0)
+        point_keys, counts = np.unique(pairs[:, 0], return_counts=True)
+        result = set(point_keys[counts > 1].tolist())
+        if ends:
+            result.update(np.concatenate(ends).tolist())
+        return result
+
+    def cut(self, line: np.ndarray, is_closed: bool, junctions: set) -> Optional[List[int]]:
+        point_keys = ((line[:, 0] << 32) | line[:, 1]).tolist()
+        if is_closed:
+            if len(line) < 4:
+                return None
+            ring = line[:-1]
+            cuts = [i for i, key in enumerate(point_keys[:-1]) if key in junctions]
+            if not cuts:
+                # кольцо без узлов - одна замкнутая дуга; начало в наименьшей точке,
+                # чтобы совпадающие кольца (дырка и остров) дали одну дугу
+                start = int(np.lexsort((ring[:, 1], ring[:, 0]))[0])
+                rotated = np.roll(ring, -start, axis=0)
+                return [self.add_arc(np.vstack([rotated, rotated[:1]]))]
+            rotated = np.roll(ring, -cuts[0], axis=0)
+            rotated = np.vstack([rotated, rotated[:1]])
+            bounds = [i - cuts[0] for i in cuts] + [len(ring)]
+        else:
+            rotated = line
+            bounds = [0] + [i for i, key in enumerate(point_keys[1:-1], 1) if key in junctions] + [len(line) - 1]
+        return [self.add_arc(rotated[start:stop + 1]) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def add_arc(self, coords: np.ndarray) -> int:
+        key = coords.tobytes()
+        index = self.arc_index.get(key)
+        if index is not None:
+            return index
+        index = self.arc_index.get(coords[::-1].tobytes())
+        if index is not None:
+            return ~index
+        index = len(self.arc_coords)
+        self.arc_index[key] = index
+        self.arc_coords.append(coords)
+        return index
+
+    def simplify_arcs(self) -> List[np.ndarray]:
+        arcs = self.arc_coords
+        if arcs and self.tolerance > 0:
+            # упрощаются дуги, а не полигоны: общая граница остаётся общей у обоих соседей
+            simplified = shapely.simplify(shapely.linestrings(np.concatenate(arcs), indices=np.repeat(
+                np.arange(len(arcs)), [len(arc) for arc in arcs])), self.tolerance)
+            coords, index = shapely.get_coordinates(simplified, return_index=True)
+            offsets = np.searchsorted(index, np.arange(len(arcs) + 1))
+            result = []
+            for arc, start, stop in zip(arcs, offsets[:-1].tolist(), offsets[1:].tolist()):
+                closed_ring = (arc[0] == arc[-1]).all()
+                # замкнутая дуга не должна схлопнуться меньше чем в треугольник
+                result.append(arc if closed_ring and stop - start < 4 else coords[start:stop].astype(np.int64))
+            arcs = result
+        return arcs
+
+    @staticmethod
+    def encode_arcs(arcs: List[np.ndarray]) -> np.ndarray:
+        if not arcs:
+            return np.zeros(0, dtype=object)
+        lengths = np.array([len(arc) for arc in arcs])
+        flat = np.concatenate(arcs)
+        deltas = flat.copy()
+        deltas[1:] -= flat[:-1]
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        deltas[starts] = flat[starts]
+        tokens = _arc_tokens(deltas)
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+        return np.array(["[" + ",".join(tokens[a:b].tolist()) + "]" for a, b in zip(offsets[:-1], offsets[1:])],
+                        dtype=object)
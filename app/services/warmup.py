@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.services.layers import LayerEntry, LayerStore
+
+
+class LayerWarmup:
+    """
+    Прогрев слоёв при старте: все слои читаются, перепроецируются и индексируются
+    параллельно в пуле потоков, пока приложение уже принимает запросы.
+
+    Чтение shapefile и построение геометрий в основном отпускают GIL, поэтому
+    потоков достаточно, а готовые слои сразу попадают в общий LayerStore
+    без копирования между процессами.
+    """
+
+    def __init__(self, store: LayerStore, jobs: Callable[[], List[Tuple[str, str]]],
+                 workers: int = 4, after_load: Optional[Callable[[str, LayerEntry], None]] = None):
+        self.store = store
+        # список (файл, кодировка) вычисляется при запуске, чтобы учитывать текущий data_dir
+        self._jobs = jobs
+        self.workers = workers
+        self._after_load = after_load
+        self._thread: Optional[threading.Thread] = None
+        self._done = threading.Event()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.layers: Dict[str, dict] = {}
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def start(self) -> None:
+        """Запускает прогрев в фоне; повторный вызов ничего не делает."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.run, name="layer-warmup", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def _load(self, file: str, encode: str) -> None:
+        started = time.perf_counter()
+        entry = self.store.get(file, encode)
+        if self._after_load is not None:
+            self._after_load(file, entry)
+        self.layers[file] = {
+            "status": "ready",
+            "features": len(entry),
+            "source": entry.source,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def run(self) -> None:
+        self.started_at = time.time()
+        jobs = self._jobs()
+        self.layers = {file: {"status": "loading"} for file, _ in jobs}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="layer-warmup") as pool:
+                futures = {pool.submit(self._load, file, encode): file for file, encode in jobs}
+                for future in as_completed(futures):
+                    file = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        # отсутствующий или битый слой не должен навсегда держать сервис неготовым
+                        logger.error(f"Layer warm-up failed for {file}: {e}")
+                        self.layers[file] = {"status": "failed", "error": str(e)}
+        finally:
+            self.finished_at = time.time()
+            self._done.set()
+            failed = sum(1 for layer in self.layers.values() if layer["status"] == "failed")
+            logger.info(f"Layer warm-up finished in {self.finished_at - self.started_at:.2f} s, "
+                        f"{len(self.layers) - failed} loaded, {failed} failed")
+
+    def status(self) -> dict:
+        if not self.started:
+            state = "idle"
+        elif self.ready:
+            state = "ready"
+        else:
+            state = "warming"
+        finished = self.finished_at or time.time()
+        return {
+            "status": state,
+            "workers": self.workers,
+            "seconds": round(finished - self.started_at, 3) if self.started_at else None,
+            "layers": self.layers,
+        }
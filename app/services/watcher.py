@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+from app.services.layers import LayerEntry, LayerStore
+
+
+class LayerWatcher:
+    """
+    Слежение за исходниками загруженных слоёв.
+
+    Раз в interval секунд сравнивает подпись .shp/.dbf каждого загруженного
+    слоя с подписью его версии. Изменившийся слой перестраивается в фоне
+    и подменяет старую версию в LayerStore; подписчики узнают о новой версии
+    после подмены. Перезагрузка начинается, только когда подпись не меняется
+    между двумя проверками, чтобы не читать файл, который ещё копируется.
+    """
+
+    def __init__(self, store: LayerStore, interval: float,
+                 prepare: Optional[Callable[[str, LayerEntry], None]] = None):
+        self.store = store
+        self.interval = interval
+        self._prepare = prepare
+        self._subscribers: List[Callable[[str, LayerEntry], None]] = []
+        self._pending: Dict[str, dict] = {}
+        self._failed: Dict[str, dict] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reloads: Dict[str, dict] = {}
+
+    def subscribe(self, callback: Callable[[str, LayerEntry], None]) -> None:
+        self._subscribers.append(callback)
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="layer-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Layer watcher poll failed: {e}")
+
+    def poll(self) -> List[str]:
+        """Одна проверка всех загруженных слоёв; возвращает перезагруженные файлы."""
+        reloaded = []
+        for file, entry in self.store.loaded().items():
+            signature = self.store.source_signature(file, entry.encode)
+            if signature is None or signature == entry.signature:
+                self._pending.pop(file, None)
+                continue
+            if self._pending.get(file) != signature:
+                self._pending[file] = signature
+                continue
+            if self._failed.get(file) == signature:
+                # эту версию файла уже не удалось прочитать - ждём следующую
+                continue
+            if self.reload(file, entry.encode, signature):
+                reloaded.append(file)
+        return reloaded
+
+    def reload(self, file: str, encode: str, signature: Optional[dict] = None) -> bool:
+        started = time.perf_counter()
+        try:
+            entry = self.store.reload(file, encode, self._prepare)
+        except Exception as e:
+            logger.error(f"Reload of layer {file} failed, keeping the previous version: {e}")
+            if signature is not None:
+                self._failed[file] = signature
+            self.reloads[file] = {"status": "failed", "error": str(e), "at": time.time()}
+            return False
+
+        self._pending.pop(file, None)
+        self._failed.pop(file, None)
+        seconds = time.perf_counter() - started
+        self.reloads[file] = {"status": "reloaded", "version": entry.version, "seconds": round(seconds, 3), "at": time.time()}
+        logger.info(f"Layer {file} reloaded as version {entry.version} in {seconds:.2f} s")
+        for callback in self._subscribers:
+            try:
+                callback(file, entry)
+            except Exception as e:
+                logger.error(f"Layer reload callback failed for {file}: {e}")
+        return True
+
+    def status(self) -> dict:
+        return {"interval": self.interval, "running": self._thread is not None and not self._stop.is_set(), "reloads": self.reloads}
@@ -0,0 +1,100 @@
+"""
+Пул процессов для тяжёлой геообработки.
+
+GeoPandas и shapely держат GIL на заметных участках работы, поэтому
+сериализация больших слоёв и overlay в общем пуле потоков Starlette тормозят
+все остальные запросы воркера. Такие задачи выполняются в отдельных процессах.
+
+Слои в процессы не передаются: каждый процесс держит свой LayerStore и читает
+подготовленный слой из дискового кэша один раз, по сети между процессами
+ходят только параметры запроса и готовые байты ответа.
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+from loguru import logger
+
+from app.config import config
+
+
+def _invoke(fn: Callable, args: tuple) -> tuple:
+    # HTTPException не восстанавливается из pickle, поэтому передаём её как данные
+    try:
+        return True, fn(*args)
+    except HTTPException as e:
+        return False, (e.status_code, e.detail)
+
+
+def _unwrap(result: tuple) -> Any:
+    ok, value = result
+    if not ok:
+        status_code, detail = value
+        raise HTTPException(status_code=status_code, detail=detail)
+    return value
+
+
+class ProcessPool:
+    """
+    Ленивый пул процессов. workers=None - по числу ядер, workers=0 - без пула,
+    задачи выполняются в вызывающем потоке (удобно для разработки и отладки).
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: процессы не наследуют потоки и блокировки родителя (прогрев, пул Starlette)
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                    logger.info(f"Geoprocessing pool started with {self.workers} workers")
+        return self._executor
+
+    def _submit(self, fn: Callable, args: tuple):
+        try:
+            return self.executor.submit(_invoke, fn, args)
+        except BrokenProcessPool:
+            # упавший процесс ломает весь пул; пересоздаём его один раз
+            logger.warning("Geoprocessing pool is broken, restarting")
+            self.shutdown()
+            return self.executor.submit(_invoke, fn, args)
+
+    def call(self, fn: Callable, *args) -> Any:
+        """Синхронный вызов для обычных def-обработчиков."""
+        if not self.enabled:
+            return fn(*args)
+        return _unwrap(self._submit(fn, args).result())
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Вызов из async-обработчиков без блокировки event loop."""
+        if not self.enabled:
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        return _unwrap(await asyncio.wrap_future(self._submit(fn, args)))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# общий пул для main_func и solution; размер - GEO_WORKERS
+geo_pool = ProcessPool(config.GEO_WORKERS)
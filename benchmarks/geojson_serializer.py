@@ -0,0 +1,89 @@
+"""
+Сравнение сериализации слоя в GeoJSON: старый путь (iterrows + pydantic)
+против поколоночного сериализатора из app.services.geojson.
+
+Запуск из корня репозитория (или файлом: python benchmarks/geojson_serializer.py ...):
+    python -m benchmarks.geojson_serializer [--features 200000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# запуск файлом (python benchmarks/...py), а не модулем: корень репозитория не в sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from app.routers.main_func import Feature, FeatureCollection
+from app.services.geojson import dump_feature_collection
+
+
+def make_layer(n: int, seed: int = 0) -> gpd.GeoDataFrame:
+    """Синтетический слой, похожий на ЗУ: мелкие полигоны вокруг Москвы и типичные атрибуты."""
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(37.3, 37.9, n)
+    y = rng.uniform(55.5, 55.9, n)
+    size = rng.uniform(0.0002, 0.002, n)
+    geometry = shapely.box(x, y, x + size, y + size)
+    return gpd.GeoDataFrame(
+        {
+            "cadastra2": [f"77:{i % 17:02d}:{i:07d}:{i % 1000}" for i in range(n)],
+            "address": rng.choice(["г. Москва, ул. Ленина, д. 1", "г. Москва, Тверская ул., д. 7", "Москва"], n),
+            "hasvalid5": rng.choice(["0", "1"], n),
+            "ownershi8": rng.choice([1.0, 2.0, 3.0, 5.0, np.nan], n),
+            "Area": rng.uniform(10, 10000, n),
+        },
+        geometry=geometry,
+        crs="EPSG:4326",
+    )
+
+
+def legacy_gdf_to_geojson(gdf) -> FeatureCollection:
+    features = []
+    for _, row in gdf.iterrows():
+        feature = Feature(
+            geometry=row['geometry'].__geo_interface__,
+            properties=row.drop('geometry').to_dict()
+        )
+        features.append(feature)
+    return FeatureCollection(features=features)
+
+
+def legacy_response(gdf, colors) -> bytes:
+    # повторная валидация response_model и рендер JSONResponse, как в FastAPI
+    collection = legacy_gdf_to_geojson(gdf.assign(color=colors))
+    collection = FeatureCollection.model_validate(collection.model_dump())
+    content = collection.model_dump(mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--features", type=int, default=200_000)
+    args = parser.parse_args()
+
+    gdf = make_layer(args.features)
+    colors = gdf["hasvalid5"].map({"0": "#1f77b4", "1": "#ff7f0e"})
+
+    new, new_time = timed(dump_feature_collection, gdf, {"color": colors})
+    old, old_time = timed(legacy_response, gdf, colors)
+
+    print(f"features:        {args.features}")
+    print(f"legacy:          {old_time:8.2f} s")
+    print(f"vectorized:      {new_time:8.2f} s  (x{old_time / new_time:.1f})")
+    print(f"payload:         {len(new) / 1e6:8.1f} MB")
+    print(f"identical bytes: {new == old}")
+
+
+if __name__ == "__main__":
+    main()
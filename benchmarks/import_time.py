@@ -0,0 +1,83 @@
+"""
+Профиль времени импорта приложения: сколько стоит import app.main в чистом
+процессе и какие пакеты тянут больше всего. Тяжёлые зависимости, которые
+должны загружаться только при первом использовании, проверяются отдельно -
+если какая-то из них импортируется при старте, код выхода 1.
+
+Запуск из корня репозитория:
+    python -m benchmarks.import_time [--module app.main] [--top 20]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# загружаются лениво: графики, shapefile, отчёты и чат не нужны до первого запроса
+LAZY_MODULES = ("matplotlib", "geopandas", "fiona", "docx", "langchain", "langchain_community", "gigachat")
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile(module: str) -> List[Tuple[int, int, int, str]]:
+    """(глубина, собственное время, накопленное время в мкс, модуль) для каждого импорта."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=ROOT, env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        timing, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, int(timing), int(cumulative), name.strip()))
+    return rows
+
+
+def lazy_loaded(rows: List[Tuple[int, int, int, str]]) -> List[str]:
+    """Пакеты из LAZY_MODULES, которые загрузились при импорте."""
+    return sorted({name.split(".")[0] for _, _, _, name in rows} & set(LAZY_MODULES))
+
+
+def report(module: str, rows: List[Tuple[int, int, int, str]], top: int = 20) -> List[str]:
+    """Строки отчёта: общее время импорта и самые дорогие пакеты верхнего уровня."""
+    total = next(cumulative for _, _, cumulative, name in reversed(rows) if name == module)
+
+    # время по пакетам верхнего уровня: собственное время всех их модулей
+    packages: Dict[str, int] = {}
+    for _, timing, _, name in rows:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + timing
+
+    lines = [f"import {module}: {total / 1e6:.3f} s, {len(rows)} modules", "", f"{'package':<32} {'self, s':>8}"]
+    for package, timing in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"{package:<32} {timing / 1e6:>8.3f}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    try:
+        rows = profile(args.module)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    print("\n".join(report(args.module, rows, args.top)))
+
+    loaded = lazy_loaded(rows)
+    if loaded:
+        print(f"\nloaded at import time, expected to be lazy: {', '.join(loaded)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Время холодной загрузки каждого слоя: из shapefile (fiona + перепроекция)
+и из колоночного дискового кэша (открытие mmap и полное декодирование геометрий).
+
+Запуск из корня репозитория (или файлом: python benchmarks/layer_cold_load.py ...):
+    python -m benchmarks.layer_cold_load [--data-dir app/shapefiles]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# запуск файлом (python benchmarks/...py), а не модулем: корень репозитория не в sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shapely
+
+from app.routers import main_func
+from app.services.layer_cache import LayerDiskCache
+from app.services.layers import LayerStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=main_func.data_dir)
+    args = parser.parse_args()
+    main_func.data_dir = args.data_dir
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        disk_cache = LayerDiskCache(args.data_dir, cache_dir)
+        store = LayerStore(main_func.load_shapefile)
+
+        print(f"{'layer':<40} {'features':>9} {'shapefile, s':>13} {'cache, s':>9}")
+        for layer, (folder, encode, _) in main_func.LAYER_SOURCES.items():
+            file = f"{folder.value}/{layer.value}"
+            if not os.path.exists(os.path.join(args.data_dir, file)):
+                print(f"{file:<40} {'missing':>9}")
+                continue
+
+            signature = disk_cache.signature(file, encode)
+            started = time.perf_counter()
+            gdf = store.prepare(file, encode)
+            shapefile_time = time.perf_counter() - started
+            disk_cache.write(file, encode, gdf, signature)
+
+            started = time.perf_counter()
+            cached = disk_cache.read(file, encode)
+            assert cached is not None
+            attributes, geometries, _ = cached
+            decoded = geometries.take()
+            cache_time = time.perf_counter() - started
+            assert shapely.equals_exact(decoded, gdf.geometry.values, 0).all()
+
+            print(f"{file:<40} {len(gdf):>9} {shapefile_time:>13.3f} {cache_time:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Сборка подготовленных слоёв в дисковый кэш до запуска сервера.
+
+    python compile_layers.py [--force] [--layers ZU,OKS] [--workers 4]
+
+Запускается при сборке образа или на шаге деплоя; сервер затем при старте
+только отображает собранные файлы в память. Код выхода 1 - если хотя бы
+один существующий слой не собрался.
+"""
+import argparse
+import json
+import sys
+
+from app.config import config
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile shapefile layers into the runtime layer cache")
+    parser.add_argument("--layers", help="Слои через запятую (ZU или ЗУ.shp), по умолчанию - все")
+    parser.add_argument("--force", action="store_true", help="Пересобрать даже актуальные слои")
+    parser.add_argument("--workers", type=int, default=config.LAYER_WARMUP_WORKERS, help="Число потоков сборки")
+    args = parser.parse_args()
+
+    from app.routers.main_func import LAYER_SOURCES, layer_file, layer_store, resolve_layer
+    from app.services.layer_compiler import compile_layers
+
+    layers = [resolve_layer(name.strip()) for name in args.layers.split(",")] if args.layers else list(LAYER_SOURCES)
+    jobs = [(layer_file(layer), LAYER_SOURCES[layer][1]) for layer in layers]
+    reports = compile_layers(layer_store, jobs, force=args.force, workers=args.workers)
+    print(json.dumps(reports, ensure_ascii=False, indent=2))
+    sys.exit(1 if any(report["status"] == "failed" for report in reports) else 0)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.layers import LayerEntry
+
+# строки отчётов, которые тесты выводят в итог прогона (профиль импорта и т.п.)
+REPORTS = pytest.StashKey[list]()
+
+
+@pytest.fixture
+def report(request):
+    """Добавляет строки в раздел отчётов в конце вывода pytest - он виден и без -s."""
+    reports = request.config.stash.setdefault(REPORTS, [])
+    return reports.extend
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    reports = config.stash.get(REPORTS, [])
+    if reports:
+        terminalreporter.section("reports")
+        for line in reports:
+            terminalreporter.write_line(line)
+
+
+@pytest.fixture
+def make_entry():
+    """Слой в памяти из атрибутов и массива геометрий shapely, как после загрузки в LayerStore."""
+    def make(attributes: dict, geometries, file: str = "test.shp", version: int = 1, signature=None) -> LayerEntry:
+        geometries = np.asarray(geometries, dtype=object)
+        return LayerEntry(file, pd.DataFrame(attributes), geometries, version, crs="EPSG:4326", signature=signature)
+    return make
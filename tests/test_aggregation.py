@@ -0,0 +1,62 @@
+"""Групповые агрегаты /aggregate: группы по колонке и зонам, сумма, среднее и перцентили."""
+import numpy as np
+import pytest
+import shapely
+
+from app.services.aggregation import aggregate, metric_areas, zone_positions
+
+
+@pytest.fixture
+def entry(make_entry):
+    points = [shapely.Point(0.5, 0.5), shapely.Point(0.6, 0.5), shapely.Point(1.5, 0.5),
+              shapely.Point(1.6, 0.5), shapely.Point(5, 5), shapely.Point(1.7, 0.5)]
+    return make_entry({"kind": ["b", "a", "a", "b", "a", None]}, points)
+
+
+def group(result, **key):
+    return next(g for g in result["groups"] if all(g[k] == v for k, v in key.items()))
+
+
+def test_groups_and_percentiles(entry):
+    result = aggregate(entry, "kind", np.array([1.0, 2.0, 3.0, 4.0, 10.0, 7.0]))
+    assert [g["value"] for g in result["groups"]] == ["a", "b", None]
+    # a: 2, 3, 10 - перцентили с линейной интерполяцией, как в pandas
+    assert group(result, value="a") == {"value": "a", "count": 3, "sum": 15.0, "mean": 5.0,
+                                        "p25": 2.5, "p50": 3.0, "p75": 6.5, "p90": 8.6}
+    assert group(result, value="b")["sum"] == 5.0
+    # пустые значения колонки - отдельная группа с null
+    assert group(result, value=None)["count"] == 1
+    assert result["total"]["count"] == 6
+    assert result["total"]["sum"] == 27.0
+    assert result["total"]["p50"] == 3.5
+
+
+def test_missing_measure_values(entry):
+    result = aggregate(entry, "kind", np.array([np.nan, np.nan, 3.0, np.nan, np.nan, np.nan]))
+    # в группе без значений меры - только число объектов
+    assert group(result, value="b") == {"value": "b", "count": 2, "sum": None, "mean": None,
+                                        "p25": None, "p50": None, "p75": None, "p90": None}
+    assert group(result, value="a")["mean"] == 3.0
+
+
+def test_groups_by_zone(entry, make_entry):
+    zones = make_entry({"name": ["west", "east"]}, [shapely.box(0, 0, 1, 1), shapely.box(1, 0, 2, 1)], file="zones.shp")
+    positions = zone_positions(entry, zones)
+    assert positions.tolist() == [0, 0, 1, 1, -1, 1]
+
+    result = aggregate(entry, "kind", np.ones(6), ("district", positions, zones.attributes["name"]))
+    keys = {(g["value"], g["district"]): g["count"] for g in result["groups"]}
+    # объект вне зон - группа с district = null
+    assert keys == {("a", "west"): 1, ("a", "east"): 1, ("a", None): 1,
+                    ("b", "west"): 1, ("b", "east"): 1, (None, "east"): 1}
+
+
+def test_empty_layer(make_entry):
+    result = aggregate(make_entry({"kind": []}, []), "kind", np.zeros(0))
+    assert result == {"groups": [], "total": {"count": 0, "sum": None, "mean": None,
+                                              "p25": None, "p50": None, "p75": None, "p90": None}}
+
+
+def test_metric_areas(make_entry):
+    entry = make_entry({"kind": ["a"]}, [shapely.box(37.6, 55.7, 37.601, 55.701)])
+    assert metric_areas(entry)[0] == pytest.approx(63 * 111, rel=0.02)
@@ -0,0 +1,73 @@
+"""
+Поколоночный сериализатор GeoJSON должен давать те же байты, что и прежний
+путь через iterrows и pydantic-модели Feature/FeatureCollection.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+gpd = pytest.importorskip("geopandas")
+
+from app.services.geojson import collection_prefix, dump_feature_collection, iter_feature_collection  # noqa: E402
+from benchmarks.geojson_serializer import legacy_response  # noqa: E402
+
+
+@pytest.fixture
+def layer():
+    geometries = [
+        shapely.Polygon([(0, 0, 1), (1, 0, 2), (1, 1, 3), (0, 0, 1)]),
+        shapely.Polygon([(0, 0), (4, 0), (4, 4), (0, 4)], [[(1, 1), (2, 1), (2, 2), (1, 1)]]),
+        shapely.MultiPolygon([
+            shapely.box(0, 0, 1, 1),
+            shapely.Polygon([(2, 2), (5, 2), (5, 5), (2, 2)], [[(3, 2.5), (4, 2.5), (4, 3), (3, 2.5)]]),
+        ]),
+        shapely.Point(37.5, 55.7, 150.25),
+        shapely.LineString([(0, 0), (1, 1.5)]),
+        shapely.MultiPoint([(0, 0), (1, 1)]),
+        shapely.MultiLineString([[(0, 0), (1, 1)], [(2, 2), (3, 3.25)]]),
+        shapely.Polygon(),
+        shapely.LineString(),
+        shapely.Point(0.1 + 0.2, 1e-7),
+    ]
+    return gpd.GeoDataFrame(
+        {
+            "name": ["a", 'б "q"', None, "x\n", "", "z", "w", "e", "r", "t"],
+            "value": [1.5, np.nan, 3.0, 1e20, -0.0, 2.5, np.nan, 7.0, 8.1, 0.1],
+            "count": list(range(10)),
+            "flag": [True, False] * 5,
+            "when": pd.to_datetime(["2024-01-02", "2024-06-30 12:30:00", "2019-05-05", "2020-02-29", "2021-01-01",
+                                    "2022-01-01", "2023-01-01", "2024-01-01", "2025-01-01", "2026-01-01"], format="ISO8601"),
+        },
+        geometry=geometries,
+        crs="EPSG:4326",
+    )
+
+
+def test_matches_legacy_serializer(layer):
+    colors = pd.Series(["#1f77b4", "#ff7f0e"] * 5)
+    assert dump_feature_collection(layer, {"color": colors}) == legacy_response(layer, colors)
+
+
+def test_stream_matches_whole_body(layer):
+    colors = pd.Series(["#1f77b4"] * len(layer))
+    chunks = list(iter_feature_collection(layer, {"color": colors}, chunk_size=3))
+    assert b"".join(chunks) == dump_feature_collection(layer, {"color": colors})
+
+
+def test_missing_geometry_and_timestamp():
+    # прежний путь на них падал, поэтому сравниваем с ожидаемым JSON
+    layer = gpd.GeoDataFrame({"when": pd.to_datetime(["2024-01-02", None]), "name": [None, "a"]},
+                             geometry=[None, shapely.Point(1, 2)])
+    features = json.loads(dump_feature_collection(layer))["features"]
+    assert features[0] == {"type": "Feature", "geometry": None, "properties": {"when": "2024-01-02T00:00:00", "name": None}}
+    assert features[1]["geometry"] == {"type": "Point", "coordinates": [1.0, 2.0]}
+    assert features[1]["properties"] == {"when": None, "name": "a"}
+
+
+def test_collection_members_are_compact():
+    assert collection_prefix({"legend": {"column": "a", "categories": [1, 2]}}) == (
+        '{"type":"FeatureCollection","legend":{"column":"a","categories":[1,2]},"features":['
+    )
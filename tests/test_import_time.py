@@ -0,0 +1,30 @@
+"""
+Тяжёлые зависимости (matplotlib, geopandas, docx, langchain...) должны
+загружаться при первом использовании, а не при импорте приложения.
+Импорт профилируется (-X importtime) в чистом процессе, чтобы не зависеть
+от других тестов; общее время и самые дорогие пакеты попадают в отчёт прогона.
+"""
+import pytest
+
+from benchmarks.import_time import lazy_loaded, profile
+from benchmarks.import_time import report as import_report
+
+TOP = 10
+
+
+def check_import(module: str, report) -> None:
+    rows = profile(module)
+    report(import_report(module, rows, TOP) + [""])
+    assert lazy_loaded(rows) == []
+
+
+@pytest.mark.parametrize("module", ["app.routers.main_func", "app.routers.tiles"])
+def test_routers_import_without_heavy_dependencies(module, report):
+    check_import(module, report)
+
+
+def test_app_imports_without_heavy_dependencies(report):
+    # зависимости самого приложения, без которых app.main не импортируется
+    pytest.importorskip("fastapi_utils")
+    pytest.importorskip("multipart")
+    check_import("app.main", report)
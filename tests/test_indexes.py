@@ -0,0 +1,88 @@
+"""Хэш-индекс ключевых атрибутов (KeyIndex) и поиск по адресам (AddressIndex)."""
+import numpy as np
+import pandas as pd
+
+from app.services.address_index import AddressIndex
+from app.services.attribute_index import KeyIndex
+
+
+def test_key_index_exact():
+    index = KeyIndex(pd.Series(["77:01:0001001:1", " 77:01:0001001:2 ", None, "77:01:0001001:1", np.nan, ""]))
+    assert len(index) == 2
+    assert index.exact("77:01:0001001:1").tolist() == [0, 3]
+    # ключ запроса нормализуется так же, как значения слоя
+    assert index.exact(" 77:01:0001001:2").tolist() == [1]
+    assert index.exact("77:01:0001001").tolist() == []
+    assert index.exact(None).tolist() == []
+
+
+def test_key_index_numeric_keys():
+    # UNOM из dbf бывает float: 12345.0 и 12345 - один ключ
+    index = KeyIndex(pd.Series([12345.0, 678.0, np.nan, 12345]))
+    assert index.exact(12345).tolist() == [0, 3]
+    assert index.exact("678").tolist() == [1]
+
+
+def test_key_index_prefix():
+    index = KeyIndex(pd.Series(["77:01:01", "77:01:02", "77:02:01", "77:01:02", "78:01:01"]))
+    assert sorted(index.prefix("77:01:").tolist()) == [0, 1, 3]
+    assert sorted(index.prefix("77").tolist()) == [0, 1, 2, 3]
+    assert index.prefix("79").tolist() == []
+    assert len(index.prefix("77", limit=2)) == 2
+
+
+def test_key_index_lookup():
+    index = KeyIndex(pd.Series(["a", "b", "a"]))
+    positions, keys = index.lookup(["a", "x", "b"])
+    assert positions.tolist() == [0, 2, 1]
+    assert keys.tolist() == [0, 0, 2]
+
+
+ADDRESSES = pd.Series([
+    "г. Москва, Тверская ул., д. 1",
+    "г. Москва, Тверская ул., д. 12, стр. 3, корп. 2, подъезд 4",
+    "г. Москва, Тверской бульвар, д. 1",
+    "г. Москва, ул. Ленина, д. 1",
+    "г. Москва, Тверская ул., д. 1",
+    None,
+    "Москва, Фёдоровская ул., д. 5",
+])
+
+
+def test_address_all_tokens_required():
+    index = AddressIndex(ADDRESSES)
+    found = [index.addresses[i] for i, _ in index.search("ленина 1")]
+    assert found == ["г. Москва, ул. Ленина, д. 1"]
+    assert index.search("ленина 2") == []
+    assert index.search("") == []
+
+
+def test_address_ranking():
+    index = AddressIndex(ADDRESSES)
+    found = [index.addresses[i] for i, _ in index.search("тверская 1")]
+    # точное совпадение обоих токенов - первым, затем префиксное (1 -> 12); "тверской" по началу не подходит
+    assert found == ["г. Москва, Тверская ул., д. 1", "г. Москва, Тверская ул., д. 12, стр. 3, корп. 2, подъезд 4"]
+
+    scores = [score for _, score in index.search("тверск 1")]
+    assert scores == sorted(scores, reverse=True)
+    found = {index.addresses[i] for i, _ in index.search("тверск 1")}
+    assert "г. Москва, Тверской бульвар, д. 1" in found
+
+
+def test_address_shorter_ranks_higher():
+    index = AddressIndex(pd.Series(["Москва, Тверская ул., д. 12, стр. 3, корп. 2", "Москва, Тверская ул., д. 12"]))
+    assert [index.addresses[i] for i, _ in index.search("тверская 12")] == [
+        "Москва, Тверская ул., д. 12", "Москва, Тверская ул., д. 12, стр. 3, корп. 2",
+    ]
+
+
+def test_address_normalization_and_positions():
+    index = AddressIndex(ADDRESSES)
+    # регистр и ё не влияют на поиск
+    (address_id, _), = index.search("ФЕДОРОВСКАЯ")
+    assert index.positions(address_id).tolist() == [6]
+    # одинаковые адреса - один номер, позиции всех объектов
+    address_id = index.search("тверская ул д 1 москва г")[0][0]
+    assert index.addresses[address_id] == "г. Москва, Тверская ул., д. 1"
+    assert index.positions(address_id).tolist() == [0, 4]
+    assert index.search("тверская", limit=1)[0][0] == address_id
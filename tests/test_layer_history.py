@@ -0,0 +1,87 @@
+"""Версии слоя и изменения между ними (LayerHistory.record и delta)."""
+import pytest
+import shapely
+
+from app.services.layer_history import LayerHistory
+
+
+@pytest.fixture
+def history(tmp_path):
+    return LayerHistory(str(tmp_path), size=2)
+
+
+@pytest.fixture
+def layer(make_entry):
+    def make(rows, mtime):
+        keys, values = zip(*rows) if rows else ((), ())
+        # геометрия привязана к объекту, а не к позиции
+        geometries = [shapely.Point(int(key), 0) for key in keys]
+        return make_entry({"unom": list(keys), "value": list(values)}, geometries, file="dir/layer.shp",
+                          signature={"format": 2, ".shp": [mtime, 1], ".dbf": [mtime, 1]})
+    return make
+
+
+V1 = [("1", "a"), ("2", "b"), ("3", "c")]
+# 2 изменён, 3 удалён, 4 добавлен; 1 переехал на другую позицию, но не изменился
+V2 = [("4", "d"), ("2", "B"), ("1", "a")]
+
+
+def test_versions(history, layer):
+    assert history.record(layer(V1, 1), "unom") == 1
+    # та же подпись исходника - номер версии без пересчёта
+    assert history.record(layer(V1, 1), "unom") == 1
+    # исходник перезаписан теми же объектами - версия не растёт
+    assert history.record(layer(V1, 2), "unom") == 1
+    assert history.record(layer(V2, 3), "unom") == 2
+    assert history.stored("dir/layer.shp", 1) and history.stored("dir/layer.shp", 2)
+    assert not history.stored("dir/layer.shp", 3)
+
+
+def test_delta(history, layer):
+    history.record(layer(V1, 1), "unom")
+    entry = layer(V2, 2)
+    version = history.record(entry, "unom")
+    delta = history.delta(entry, version, 1)
+    assert (delta.version, delta.since, delta.reset) == (2, 1, False)
+    # позиции в текущей версии слоя
+    assert delta.added.tolist() == [0]
+    assert delta.changed.tolist() == [1]
+    assert delta.removed == ["3"]
+
+
+def test_delta_from_current_version(history, layer):
+    entry = layer(V1, 1)
+    version = history.record(entry, "unom")
+    delta = history.delta(entry, version, version)
+    assert not delta.reset
+    assert delta.added.tolist() == [] and delta.changed.tolist() == [] and delta.removed == []
+
+
+def test_delta_from_scratch(history, layer):
+    entry = layer(V1, 1)
+    version = history.record(entry, "unom")
+    delta = history.delta(entry, version, 0)
+    assert (delta.since, delta.reset) == (0, False)
+    assert delta.added.tolist() == [0, 1, 2]
+
+
+def test_pruned_since_resets(history, layer):
+    history.record(layer(V1, 1), "unom")
+    history.record(layer(V2, 2), "unom")
+    entry = layer(V2 + [("5", "e")], 3)
+    version = history.record(entry, "unom")
+    # хранятся только size=2 последних снимка: версия 1 удалена
+    assert version == 3 and not history.stored("dir/layer.shp", 1)
+    for since in (1, 42):
+        delta = history.delta(entry, version, since)
+        assert (delta.since, delta.reset) == (0, True)
+        assert delta.added.tolist() == [0, 1, 2, 3]
+        assert delta.removed == []
+
+
+def test_duplicate_keys(history, layer):
+    history.record(layer([("1", "a"), ("1", "b")], 1), "unom")
+    entry = layer([("1", "a"), ("1", "c")], 2)
+    version = history.record(entry, "unom")
+    # повторы ключа адресуются суффиксом #2 по порядку позиций
+    assert history.delta(entry, version, 1).changed.tolist() == [1]
@@ -0,0 +1,164 @@
+"""Векторные тайлы: тайл декодируется обратно по спецификации MVT 2.1 и сверяется с исходными геометриями."""
+import struct
+
+import numpy as np
+import pytest
+import shapely
+
+from app.services.mvt import EXTENT, encode_layer, prepare_geometries, tile_bounds
+
+
+def read_varint(data, i):
+    value = shift = 0
+    while True:
+        byte = data[i]
+        i += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, i
+
+
+def read_message(data):
+    """Поля protobuf: список (номер, значение); length-delimited - bytes, fixed64 - 8 байт."""
+    fields, i = [], 0
+    while i < len(data):
+        key, i = read_varint(data, i)
+        number, wire = key >> 3, key & 7
+        if wire == 0:
+            value, i = read_varint(data, i)
+        elif wire == 1:
+            value, i = data[i:i + 8], i + 8
+        elif wire == 2:
+            length, i = read_varint(data, i)
+            value, i = data[i:i + length], i + length
+        else:
+            raise ValueError(f"unexpected wire type {wire}")
+        fields.append((number, value))
+    return fields
+
+
+def read_packed(data):
+    values, i = [], 0
+    while i < len(data):
+        value, i = read_varint(data, i)
+        values.append(value)
+    return values
+
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def decode_geometry(commands):
+    """Пути геометрии: список списков точек (x, y); кольца замкнуты, как в shapely."""
+    paths, x, y, i = [], 0, 0, 0
+    while i < len(commands):
+        command, count = commands[i] & 7, commands[i] >> 3
+        i += 1
+        if command == 7:
+            paths[-1].append(paths[-1][0])
+            continue
+        for _ in range(count):
+            x += unzigzag(commands[i])
+            y += unzigzag(commands[i + 1])
+            i += 2
+            if command == 1:
+                paths.append([(x, y)])
+            else:
+                paths[-1].append((x, y))
+    return paths
+
+
+def decode_tile(tile):
+    (number, layer), = read_message(tile)
+    assert number == 3
+    fields = read_message(layer)
+    keys = [value.decode() for number, value in fields if number == 3]
+    values = []
+    for number, value in fields:
+        if number == 4:
+            (kind, raw), = read_message(value)
+            values.append({1: lambda v: v.decode(), 3: lambda v: struct.unpack("<d", v)[0], 5: int,
+                           6: unzigzag, 7: bool}[kind](raw))
+    features = []
+    for number, value in fields:
+        if number != 2:
+            continue
+        feature = dict(read_message(value))
+        tags = read_packed(feature.get(2, b""))
+        features.append({
+            "id": feature[1],
+            "type": feature[3],
+            "paths": decode_geometry(read_packed(feature[4])),
+            "properties": {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])},
+        })
+    return {
+        "version": dict(fields)[15],
+        "name": dict(fields)[1].decode(),
+        "extent": dict(fields)[5],
+        "features": features,
+    }
+
+
+def signed_area(path):
+    coords = np.asarray(path, dtype=float)
+    return np.sum(coords[:-1, 0] * coords[1:, 1] - coords[1:, 0] * coords[:-1, 1]) / 2
+
+
+def test_roundtrip():
+    geometries = np.array([
+        shapely.Polygon([(10, 10), (100, 10), (100, 100), (10, 100)], [[(20, 20), (20, 40), (40, 40), (40, 20)]]),
+        shapely.LineString([(0, 0), (50, 60), (70, 60)]),
+        shapely.MultiPoint([(5, 5), (4090, 4000)]),
+        None,
+    ], dtype=object)
+    properties = {"name": ["a", "b", "c", "d"], "size": [1.5, 2, -3, None], "flag": [True, False, True, True]}
+    tile = decode_tile(encode_layer("zones", geometries, properties, ids=[10, 11, 12, 13]))
+
+    assert (tile["version"], tile["name"], tile["extent"]) == (2, "zones", EXTENT)
+    # объект без геометрии в тайл не попадает
+    assert [f["id"] for f in tile["features"]] == [10, 11, 12]
+    assert [f["type"] for f in tile["features"]] == [3, 2, 1]
+    assert tile["features"][0]["properties"] == {"name": "a", "size": 1.5, "flag": True}
+    assert tile["features"][1]["properties"] == {"name": "b", "size": 2, "flag": False}
+    assert tile["features"][2]["properties"]["size"] == -3
+
+    exterior, hole = tile["features"][0]["paths"]
+    decoded = shapely.Polygon(exterior, [hole])
+    assert decoded.equals(geometries[0])
+    # внешнее кольцо и дырка обходятся в разные стороны
+    assert signed_area(exterior) * signed_area(hole) < 0
+    assert tile["features"][1]["paths"] == [[(0, 0), (50, 60), (70, 60)]]
+    assert tile["features"][2]["paths"] == [[(5, 5)], [(4090, 4000)]]
+
+
+def test_collapsed_exterior_drops_its_holes():
+    kept = shapely.Polygon([(0, 0), (90, 0), (90, 90), (0, 90)], [[(10, 10), (10, 20), (20, 20), (20, 10)]])
+    # у второго полигона внешнее кольцо после квантования выродилось в отрезок, а дырка - нет
+    collapsed = shapely.Polygon([(300, 300), (300, 300), (300, 310), (300, 310)], [[(300, 301), (305, 309), (300, 309)]])
+    tile = decode_tile(encode_layer("zones", np.array([shapely.MultiPolygon([kept, collapsed])], dtype=object), {}))
+    paths = tile["features"][0]["paths"]
+    # дырка выпавшего полигона не прицепилась к предыдущему
+    assert len(paths) == 2
+    assert shapely.Polygon(paths[0], [paths[1]]).equals(kept)
+
+
+def test_prepared_tile_geometries():
+    minx, miny, maxx, maxy = tile_bounds(10, 619, 320)
+    # полигон во всю ширину тайла и ещё на столько же за его правым краем
+    polygon = shapely.box(minx, miny + (maxy - miny) / 4, maxx + (maxx - minx), maxy - (maxy - miny) / 4)
+    prepared = prepare_geometries(np.array([polygon, shapely.Point(minx - 1, miny)], dtype=object), 10, 619, 320)
+    # объект за пределами тайла и буфера - None
+    assert prepared[1] is None
+    xmin, ymin, xmax, ymax = shapely.bounds(prepared[0])
+    # обрезан по буферу, координаты целые
+    assert (xmin, xmax) == (0, EXTENT + 64)
+    assert 1000 < ymin < 1100 and 3000 < ymax < 3100
+    assert np.array_equal(shapely.get_coordinates(prepared[0]), np.round(shapely.get_coordinates(prepared[0])))
+    tile = decode_tile(encode_layer("zones", prepared, {}))
+    assert len(tile["features"]) == 1
+
+
+def test_empty_tile():
+    assert encode_layer("zones", np.array([None], dtype=object), {}) == b""
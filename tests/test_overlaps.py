@@ -0,0 +1,54 @@
+"""Таблица пересечений слоёв (OverlapTable): CSR по объектам базового слоя."""
+import numpy as np
+import pytest
+import shapely
+
+from app.services.overlaps import OverlapTable
+
+# около Москвы, чтобы метрическая проекция (UTM 37N) была корректной
+X, Y, D = 37.6, 55.7, 0.001
+
+
+@pytest.fixture
+def table(make_entry):
+    base = make_entry({"id": [0, 1, 2]}, [
+        shapely.box(X, Y, X + D, Y + D),
+        shapely.box(X + 10 * D, Y, X + 11 * D, Y + D),
+        shapely.box(X + 2 * D, Y, X + 3 * D, Y + D),
+    ], file="base.shp")
+    other = make_entry({"id": [0, 1, 2, 3]}, [
+        # четверть первого участка
+        shapely.box(X, Y, X + D / 2, Y + D / 2),
+        # вне всех участков
+        shapely.box(X + 20 * D, Y, X + 21 * D, Y + D),
+        # три четверти первого участка и касание третьего по границе (площадь 0)
+        shapely.box(X + D / 4, Y, X + 2 * D, Y + D),
+        None,
+    ], file="other.shp")
+    return OverlapTable.build(base, other, chunk_size=2)
+
+
+def test_csr_layout(table):
+    assert table.offsets.tolist() == [0, 2, 2, 2]
+    assert len(table) == 2
+    assert table.positions.dtype == np.int32 and table.areas.dtype == np.float32
+
+
+def test_lookup_sorted_by_area(table):
+    positions, areas = table.lookup(0)
+    # по убыванию площади пересечения; касание по границе не считается пересечением
+    assert positions.tolist() == [2, 0]
+    assert areas[0] == pytest.approx(0.75 * table.base_areas[0], rel=1e-3)
+    assert areas[1] == pytest.approx(0.25 * table.base_areas[0], rel=1e-3)
+
+
+def test_no_overlaps(table):
+    for position in (1, 2):
+        positions, areas = table.lookup(position)
+        assert positions.tolist() == [] and areas.tolist() == []
+
+
+def test_base_areas_in_square_meters(table):
+    # 0.001° по долготе на широте 55.7° - около 63 м, по широте - около 111 м
+    assert table.base_areas[0] == pytest.approx(63 * 111, rel=0.02)
+    assert table.nbytes == table.offsets.nbytes + table.positions.nbytes + table.areas.nbytes + table.base_areas.nbytes
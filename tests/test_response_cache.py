@@ -0,0 +1,139 @@
+"""ETag, условные запросы и сжатие в ResponseCache.respond."""
+import gzip
+import threading
+
+import pytest
+
+from app.services.response_cache import MIN_COMPRESS_SIZE, ResponseCache, brotli, http_date, make_etag
+
+BODY = b'{"type":"FeatureCollection","features":[' + b'{"a":1},' * 500 + b'{"a":1}]}'
+MODIFIED = 1718000000.0
+
+
+def respond(cache, headers=None, etag=None, body=BODY, store=True):
+    calls = []
+
+    def build():
+        calls.append(1)
+        return body
+
+    response = cache.respond(headers or {}, etag or make_etag("layer", 1), build, last_modified=MODIFIED, store=store)
+    return response, len(calls)
+
+
+def test_etag_and_validators():
+    response, built = respond(ResponseCache())
+    assert response.status_code == 200 and built == 1
+    assert response.body == BODY
+    assert response.headers["etag"] == make_etag("layer", 1)
+    assert response.headers["last-modified"] == http_date(MODIFIED)
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert make_etag("layer", 1) != make_etag("layer", 2)
+
+
+def test_second_request_is_cached():
+    cache = ResponseCache()
+    respond(cache)
+    response, built = respond(cache)
+    assert built == 0 and response.body == BODY
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("headers", [
+    {"if-none-match": make_etag("layer", 1)},
+    {"if-none-match": 'W/' + make_etag("layer", 1)},
+    {"if-none-match": '"other", ' + make_etag("layer", 1)},
+    {"if-none-match": "*"},
+    {"if-modified-since": http_date(MODIFIED)},
+])
+def test_not_modified(headers):
+    cache = ResponseCache()
+    response, built = respond(cache, headers)
+    assert response.status_code == 304 and built == 0
+    assert response.body == b""
+    assert response.headers["etag"] == make_etag("layer", 1)
+
+
+def test_if_none_match_takes_precedence():
+    # при If-None-Match дата не проверяется
+    headers = {"if-none-match": '"other"', "if-modified-since": http_date(MODIFIED)}
+    response, _ = respond(ResponseCache(), headers)
+    assert response.status_code == 200
+
+
+def test_gzip_on_request():
+    cache = ResponseCache()
+    response, _ = respond(cache, {"accept-encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    identity_bytes = cache.stats()["bytes"]
+
+    response, built = respond(cache, {"accept-encoding": "gzip, deflate"})
+    assert built == 0
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(response.body) == BODY
+    # сжатый вариант добавился к размеру кэша
+    assert cache.stats()["bytes"] == identity_bytes + len(response.body)
+
+
+@pytest.mark.parametrize("accept", ["gzip;q=0", "deflate", ""])
+def test_no_acceptable_encoding(accept):
+    response, _ = respond(ResponseCache(), {"accept-encoding": accept})
+    assert "content-encoding" not in response.headers
+    assert response.body == BODY
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli is not installed")
+def test_brotli_preferred():
+    response, _ = respond(ResponseCache(), {"accept-encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert brotli.decompress(response.body) == BODY
+
+
+def test_small_body_not_compressed():
+    body = b"{}"
+    assert len(body) < MIN_COMPRESS_SIZE
+    response, _ = respond(ResponseCache(), {"accept-encoding": "gzip"}, body=body)
+    assert "content-encoding" not in response.headers
+
+
+def test_not_stored_but_compressed():
+    cache = ResponseCache()
+    response, built = respond(cache, {"accept-encoding": "gzip"}, store=False)
+    assert response.headers["content-encoding"] == "gzip"
+    assert respond(cache, store=False)[1] == 1
+    assert cache.stats()["size"] == 0 and built == 1
+
+
+def test_bounded_by_bytes():
+    cache = ResponseCache(maxbytes=len(BODY) * 2)
+    for version in range(3):
+        respond(cache, etag=make_etag("layer", version))
+    stats = cache.stats()
+    assert stats["size"] == 2 and stats["bytes"] <= stats["maxbytes"]
+    # самый давний ответ вытеснен
+    assert respond(cache, etag=make_etag("layer", 0))[1] == 1
+
+
+def test_concurrent_misses_build_once():
+    cache = ResponseCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def build():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return BODY
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.respond({}, '"x"', build))) for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert [r.body for r in results] == [BODY] * 4
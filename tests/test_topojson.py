@@ -0,0 +1,103 @@
+"""TopoJSON: документ декодируется по спецификации (квантование, дельта-дуги) и сверяется с исходными геометриями."""
+import json
+
+import numpy as np
+import pytest
+import shapely
+
+from app.services.topojson import Topology
+
+STEP = 1e-6
+
+
+def decode(document: bytes):
+    """Геометрии объекта документа и их атрибуты."""
+    topology = json.loads(document)
+    scale, translate = np.asarray(topology["transform"]["scale"]), np.asarray(topology["transform"]["translate"])
+    arcs = [np.cumsum(np.asarray(arc, dtype=np.int64), axis=0) * scale + translate for arc in topology["arcs"]]
+
+    def line(indexes):
+        pieces = [arcs[i] if i >= 0 else arcs[~i][::-1] for i in indexes]
+        # соседние дуги делят конечную точку
+        return np.concatenate([pieces[0]] + [piece[1:] for piece in pieces[1:]])
+
+    def polygon(rings):
+        return shapely.Polygon(line(rings[0]), [line(ring) for ring in rings[1:]])
+
+    def point(coords):
+        return np.asarray(coords) * scale + translate
+
+    builders = {
+        "Point": lambda g: shapely.Point(point(g["coordinates"])),
+        "MultiPoint": lambda g: shapely.MultiPoint(point(g["coordinates"])),
+        "LineString": lambda g: shapely.LineString(line(g["arcs"])),
+        "MultiLineString": lambda g: shapely.MultiLineString([line(part) for part in g["arcs"]]),
+        "Polygon": lambda g: polygon(g["arcs"]),
+        "MultiPolygon": lambda g: shapely.MultiPolygon([polygon(part) for part in g["arcs"]]),
+    }
+    (name, collection), = topology["objects"].items()
+    geometries = [builders[g["type"]](g) if g["type"] is not None else None for g in collection["geometries"]]
+    return topology, name, geometries, [g["properties"] for g in collection["geometries"]]
+
+
+@pytest.fixture
+def geometries():
+    return np.array([
+        # соседние квадраты с общей стороной и квадрат с дыркой
+        shapely.box(37.0, 55.0, 37.01, 55.01),
+        shapely.box(37.01, 55.0, 37.02, 55.01),
+        shapely.Polygon([(37.03, 55.0), (37.06, 55.0), (37.06, 55.03), (37.03, 55.03)],
+                        [[(37.04, 55.01), (37.05, 55.01), (37.05, 55.02), (37.04, 55.02)]]),
+        shapely.MultiPolygon([shapely.box(37.1, 55.1, 37.11, 55.11), shapely.box(37.2, 55.2, 37.21, 55.21)]),
+        shapely.LineString([(37.0, 55.0), (37.005, 55.0005), (37.02, 55.01)]),
+        shapely.MultiLineString([[(37.3, 55.3), (37.31, 55.31)], [(37.4, 55.4), (37.41, 55.4)]]),
+        shapely.Point(37.5, 55.5),
+        shapely.MultiPoint([(37.6, 55.6), (37.61, 55.61)]),
+        None,
+    ], dtype=object)
+
+
+def properties(n):
+    return np.array(['{"id":%d}' % i for i in range(n)], dtype=object)
+
+
+def test_roundtrip(geometries):
+    topology = Topology.build(geometries, STEP)
+    document, name, decoded, props = decode(topology.encode("zones", properties(len(geometries)), members={"v": [1, 2]}))
+
+    assert document["type"] == "Topology" and name == "zones"
+    assert document["v"] == [1, 2]
+    assert props == [{"id": i} for i in range(len(geometries))]
+    assert decoded[-1] is None
+    for original, result in zip(geometries[:-1], decoded[:-1]):
+        assert result.geom_type == original.geom_type
+        # координаты совпадают с точностью до шага сетки; кольцо может начинаться с другой вершины (стыка дуг)
+        assert shapely.equals_exact(shapely.normalize(result), shapely.normalize(original), STEP), (original, result)
+
+
+def test_shared_border_is_one_arc(geometries):
+    topology = Topology.build(geometries[:2], STEP)
+    document = json.loads(topology.encode("zones", properties(2)))
+    first, second = (set(abs(a) if a >= 0 else ~a for a in g["arcs"][0]) for g in document["objects"]["zones"]["geometries"])
+    # общая сторона соседних квадратов - одна дуга, на которую ссылаются оба объекта
+    assert len(first & second) == 1
+
+
+def test_selection_renumbers_arcs(geometries):
+    topology = Topology.build(geometries, STEP)
+    document, _, decoded, props = decode(topology.encode("zones", properties(2), np.array([2, 6])))
+    assert props == [{"id": 0}, {"id": 1}]
+    # в документе только дуги выбранных объектов
+    assert len(document["arcs"]) == len(geometries[2].interiors) + 1
+    assert shapely.equals_exact(shapely.normalize(decoded[0]), shapely.normalize(geometries[2]), STEP)
+    assert shapely.equals_exact(decoded[1], geometries[6], STEP)
+
+
+def test_simplified_levels_keep_neighbours_joined(geometries):
+    # на уровне пирамиды общие границы упрощаются один раз - соседи остаются без щели
+    wavy = shapely.LineString([(37.0 + i * 0.001, 55.005 + (0.0002 if i % 2 else 0)) for i in range(11)])
+    below = shapely.Polygon(list(wavy.coords) + [(37.01, 55.0), (37.0, 55.0)])
+    above = shapely.Polygon(list(wavy.coords) + [(37.01, 55.01), (37.0, 55.01)])
+    shapes = Topology.build(np.array([below, above], dtype=object), 0.0001, tolerance=3).shapes(lambda p: None)
+    assert shapely.area(shapely.intersection(shapes[0], shapes[1])) == pytest.approx(0, abs=1e-12)
+    assert shapely.union(shapes[0], shapes[1]).equals(shapely.box(37.0, 55.0, 37.01, 55.01))
@@ -0,0 +1,80 @@
+"""Выборка /visualize/*: область просмотра (bbox), limit и набор атрибутов (fields)."""
+import json
+
+import numpy as np
+import pytest
+import shapely
+from fastapi import HTTPException
+
+from app.routers.main_func import ColorOutput, LayerFormat, VisualizeParams, layer_response, select_positions
+
+
+def params(bbox=None, limit=None, fields=None, output=ColorOutput.color, format=LayerFormat.geojson):
+    return VisualizeParams(bbox=bbox, limit=limit, zoom=None, stream=False, fields=fields, output=output, format=format)
+
+
+@pytest.fixture
+def entry(make_entry):
+    # квадраты 1x1 по диагонали: объект i занимает [i, i + 1]
+    geometries = [shapely.box(i, i, i + 1, i + 1) for i in range(5)] + [None]
+    return make_entry({
+        "kind": ["a", "b", "a", "c", "b", "a"],
+        "name": [f"n{i}" for i in range(6)],
+        "size": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+    }, geometries)
+
+
+def features(response):
+    return json.loads(response.body)["features"]
+
+
+def test_without_params_whole_layer(entry):
+    assert select_positions(entry, None) is None
+    assert select_positions(entry, params()) is None
+    assert len(features(layer_response(entry, "kind", params()))) == 6
+
+
+def test_bbox_selects_intersecting_in_layer_order(entry):
+    # касание границы - тоже пересечение; объект без геометрии в выборку не попадает
+    assert select_positions(entry, params(bbox="1.5,1.5,3.0,3.2")).tolist() == [1, 2, 3]
+    assert select_positions(entry, params(bbox="10,10,11,11")).tolist() == []
+
+
+def test_limit_after_bbox(entry):
+    assert select_positions(entry, params(limit=2)).tolist() == [0, 1]
+    assert select_positions(entry, params(bbox="1.5,1.5,3.0,3.2", limit=2)).tolist() == [1, 2]
+
+
+def test_bbox_response_keeps_layer_colors(entry):
+    whole = {f["properties"]["name"]: f["properties"]["color"] for f in features(layer_response(entry, "kind", params()))}
+    part = features(layer_response(entry, "kind", params(bbox="1.5,1.5,3.0,3.2")))
+    # палитра считается по всему слою, поэтому цвет объекта не зависит от выборки
+    assert [f["properties"]["name"] for f in part] == ["n1", "n2", "n3"]
+    assert all(f["properties"]["color"] == whole[f["properties"]["name"]] for f in part)
+
+
+def test_invalid_bbox():
+    with pytest.raises(HTTPException) as error:
+        params(bbox="3,3,1,1")
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException):
+        params(bbox="1,2,3")
+
+
+def test_fields_projection(entry):
+    result = features(layer_response(entry, "kind", params(fields="name, size")))
+    assert list(result[0]["properties"]) == ["name", "size", "color"]
+    assert result[2]["properties"]["size"] == 3.0
+
+
+def test_unknown_field(entry):
+    with pytest.raises(HTTPException) as error:
+        layer_response(entry, "kind", params(fields="name,missing"))
+    assert error.value.status_code == 400
+
+
+def test_cache_key_distinguishes_selection():
+    keys = {params().cache_key(), params(bbox="0,0,1,1").cache_key(), params(limit=1).cache_key(),
+            params(fields="name").cache_key(), params(output=ColorOutput.category).cache_key()}
+    assert len(keys) == 5
+    assert params(fields="name, size").cache_key() == params(fields="name,size").cache_key()